@@ -10,8 +10,8 @@ from czsc import utils
 from czsc import traders
 from czsc import sensors
 from czsc import aphorism
-from czsc.analyze import CZSC
-from czsc.objects import Freq, Operate, Direction, Signal, Factor, Event, RawBar, NewBar, Position, ZS
+from czsc.analyze import CZSC, ColumnarCZSC
+from czsc.objects import Freq, Operate, Direction, Signal, Factor, Event, RawBar, NewBar, Position, ZS, SignalsMatcher
 from czsc.strategies import CzscStrategyBase, CzscJsonStrategy
 from czsc.sensors import holds_concepts_effect, CTAResearch, EventMatchSensor
 from czsc.sensors.feature import FixedNumberSelector
@@ -54,7 +54,9 @@ from czsc.utils import (
     WordWriter,
     BarGenerator,
     freq_end_time,
+    freq_end_times,
     resample_bars,
+    resample_bars_multi,
     is_trading_time,
     get_intraday_times,
     check_freq_and_market,
@@ -63,6 +65,7 @@ from czsc.utils import (
     dill_load,
     read_json,
     save_json,
+    save_parquet,
     get_sub_elements,
     get_py_namespace,
     freqs_sorted,
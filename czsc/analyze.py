@@ -7,12 +7,16 @@ describe: 缠论分型、笔的识别
 """
 import os
 import webbrowser
+import numpy as np
 from loguru import logger
 from typing import List
 from collections import OrderedDict
-from czsc.enum import Mark, Direction
+from bisect import bisect_left, bisect_right
+from collections.abc import Sequence
+from czsc.enum import Mark, Direction, Freq
 from czsc.objects import BI, FX, RawBar, NewBar
 from czsc.utils.echarts_plot import kline_pro
+from czsc.utils.columnar import ColumnBuffer, IndicatorStore, BarCache
 from czsc import envs
 
 logger.disable('czsc.analyze')
@@ -180,6 +184,142 @@ def check_bi(bars: List[NewBar], **kwargs):
         return None, bars
 
 
+def _replay_bi(high: List[float], low: List[float], max_bi_num: int, min_bi_len: int):
+    """按照 CZSC.update 的逻辑逐根K线重放去除包含、分型识别和笔识别，只使用数值列表，不创建K线、分型和笔对象
+
+    无包含K线用全局序号表示，bars_ubi 始终是连续的一段 [u0, N)，笔由 fx_a、fx_b 所在的序号确定。
+    除了最后一根，无包含K线在追加新K线之后不再变化，所以只需要记录笔创建时最后一根无包含K线包含的原始K线数量，
+    重放结束后就可以还原出与逐根K线调用 update 完全一致的对象，见 CZSC._load_replay
+
+    :param high: 原始K线的最高价
+    :param low: 原始K线的最低价
+    :param max_bi_num: 最大允许保留的笔数量
+    :param min_bi_len: 一笔的最小长度
+    :return: dict，重放结束时的状态；bars_ubi 无法表示为连续的一段时返回 None
+
+        H / L / R0 / RD: 无包含K线的最高价、最低价、第一根原始K线的位置、dt 所在原始K线的位置
+        u0: bars_ubi 第一根无包含K线的序号
+        bis: 笔列表，每一笔为 [pa, pb, 方向, 笔内分型 [(序号, 标记)], (当时最后一根无包含K线的序号, 包含的原始K线数量), high 是否已缓存]
+        raw_start: bars_raw 第一根原始K线的位置
+    """
+    H, L, R0, RD = [], [], [], []
+    dpos, dmark = [], []  # 全部分型的序号和标记，1 为顶分型，-1 为底分型
+    fpos, fmark, fbest = [], [], []  # bars_ubi 中按 check_fxs 规则过滤后的分型，以及笔结束分型的候选
+    u0, bis, trim_bi, raw_start = 0, [], None, 0
+
+    def append_fx(pos, mark):
+        # 与 CZSC._append_fx 一致
+        if len(fpos) >= 2 and mark == fmark[-1]:
+            return
+        best = fbest[-1] if fpos else -1
+        if fpos:
+            a = fpos[0]
+            if fmark[0] < 0 < mark and H[pos] > L[a]:
+                if best == -1 or H[pos] > H[fpos[best]]:
+                    best = len(fpos)
+            elif fmark[0] > 0 > mark and L[pos] < H[a]:
+                if best == -1 or L[pos] < L[fpos[best]]:
+                    best = len(fpos)
+        fpos.append(pos)
+        fmark.append(mark)
+        fbest.append(best)
+
+    def set_ubi(start):
+        # bars_ubi 从 start 开始，第一根K线不是分型，重建其后的分型序列
+        nonlocal u0
+        u0 = start
+        del fpos[:], fmark[:], fbest[:]
+        for k in range(bisect_right(dpos, start), len(dpos)):
+            append_fx(dpos[k], dmark[k])
+
+    def check_bi(i):
+        # 与 CZSC._check_bi 一致
+        if len(fpos) < 2 or fbest[-1] == -1:
+            return None
+        pa, pb = fpos[0], fpos[fbest[-1]]
+        if (H[pa] > H[pb] and L[pa] < L[pb]) or (H[pa] < H[pb] and L[pa] > L[pb]) or pb - pa + 3 < min_bi_len:
+            return None
+        k, g = bisect_right(fpos, pb + 1), len(H) - 1
+        return [pa, pb, 1 if fmark[0] < 0 else -1, list(zip(fpos[:k], fmark[:k])), (g, i - R0[g] + 1), False]
+
+    for i, (h, lo) in enumerate(zip(high, low)):
+        # 去除包含关系，与 remove_include 一致
+        if len(H) >= 2 and H[-2] != H[-1] and ((H[-1] <= h and L[-1] >= lo) or (H[-1] >= h and L[-1] <= lo)):
+            h2, l2 = H[-1], L[-1]
+            if H[-2] < h2:
+                H[-1], L[-1] = max(h2, h), max(l2, lo)
+                if h2 <= h:
+                    RD[-1] = i
+            else:
+                H[-1], L[-1] = min(h2, h), min(l2, lo)
+                if l2 >= lo:
+                    RD[-1] = i
+        else:
+            H.append(h)
+            L.append(lo)
+            R0.append(i)
+            RD.append(i)
+
+        # 只有倒数第二根无包含K线是否为分型会发生变化
+        n = len(H)
+        p = n - 2
+        if dpos and dpos[-1] >= p:
+            dpos.pop(), dmark.pop()
+        if fpos and fpos[-1] >= p:
+            fpos.pop(), fmark.pop(), fbest.pop()
+        if p >= 1:
+            mark = 0
+            if H[p - 1] < H[p] > H[p + 1] and L[p - 1] < L[p] > L[p + 1]:
+                mark = 1
+            elif L[p - 1] > L[p] < L[p + 1] and H[p - 1] > H[p] < H[p + 1]:
+                mark = -1
+            if mark:
+                dpos.append(p)
+                dmark.append(mark)
+                if p > u0:
+                    append_fx(p, mark)
+
+        # 更新笔，与 CZSC.__update_bi 一致
+        if n - u0 >= 3:
+            if not bis:
+                if fpos:
+                    pa, ma = fpos[0], fmark[0]
+                    for pos, mark in zip(fpos, fmark):
+                        if mark == ma and ((ma < 0 and L[pos] <= L[pa]) or (ma > 0 and H[pos] >= H[pa])):
+                            pa = pos
+                    if pa - u0 > 1:
+                        set_ubi(pa - 1)
+                    bi = check_bi(i)
+                    if bi:
+                        bis.append(bi)
+                        set_ubi(bi[1] - 1)
+            else:
+                bi = check_bi(i)
+                if bi:
+                    bis.append(bi)
+                    set_ubi(bi[1] - 1)
+
+                # 当前笔被破坏，将当前笔的K线与 bars_ubi 合并；只有向上笔会读取并缓存 bi.high
+                last = bis[-1]
+                pa, pb = last[0], last[1]
+                if last[2] > 0:
+                    last[5] = True
+                if (last[2] > 0 and H[-1] > max(H[pa], H[pb])) or (last[2] < 0 and L[-1] < min(L[pa], L[pb])):
+                    bis.pop()
+                    if u0 > pb:
+                        return None
+                    set_ubi(pa - 1)
+
+        # 与 CZSC.update 一致，控制笔的数量，并根据第一笔裁剪 bars_raw
+        if len(bis) > max_bi_num:
+            bis = bis[-max_bi_num:]
+        if bis and bis[0] is not trim_bi:
+            trim_bi = bis[0]
+            raw_start = max(raw_start, RD[trim_bi[0] - 1])
+
+    return {"H": H, "L": L, "R0": R0, "RD": RD, "u0": u0, "bis": bis, "raw_start": raw_start}
+
+
 class CZSC:
     def __init__(self,
                  bars: List[RawBar],
@@ -192,24 +332,358 @@ class CZSC:
         :param max_bi_num: 最大允许保留的笔数量
         :param get_signals: 自定义的信号计算函数
         """
+        self._init_state(bars[0].symbol, bars[0].freq, get_signals, max_bi_num)
+        for bar in bars:
+            self.update(bar)
+
+    def _init_state(self, symbol, freq, get_signals, max_bi_num):
+        """初始化空的分析状态"""
         self.verbose = envs.get_verbose()
         self.max_bi_num = max_bi_num
         self.bars_raw: List[RawBar] = []  # 原始K线序列
         self.bars_ubi: List[NewBar] = []  # 未完成笔的无包含K线序列
         self.bi_list: List[BI] = []
-        self.symbol = bars[0].symbol
-        self.freq = bars[0].freq
+        self.symbol = symbol
+        self.freq = freq
         self.get_signals = get_signals
         self.signals = None
         # cache 是信号计算过程的缓存容器，需要信号计算函数自行维护
         self.cache = OrderedDict()
+        # indicators 是按缓存 key 组织的列式指标存储，与 bars_raw 对齐，通过 bar.cache 读写
+        self.indicators = self._create_indicator_store()
+        self._trim_bi = None  # 上次裁剪 bars_raw 时 bi_list 的第一笔
+        self._reset_ubi_state()
+
+    @classmethod
+    def from_arrays(cls, dt, open, close, high, low, vol, amount=None, symbol: str = "", freq=Freq.F1,
+                    get_signals=None, max_bi_num=envs.get_max_bi_num(), **kwargs):
+        """使用列式数据（numpy 数组、list、pd.Series）批量创建 CZSC 对象
+
+        与 CZSC(bars) 逐根K线调用 update 相比：
+
+        1. 去除包含、分型识别和笔识别在 _replay_bi 中一次遍历完成，只使用数值列表，不创建中间对象
+        2. 只为最终保留的原始K线、无包含K线、分型和笔创建对象，不再为被裁剪掉的历史K线创建 RawBar
+        3. 历史K线不计算信号，只在最后一根K线上调用一次 get_signals
+        4. 返回的对象与 CZSC(bars) 的 bars_raw、bars_ubi、bi_list 完全一致，可以继续调用 update 增量更新
+
+        自定义了 update / _update_bars / _trim_bars 的子类（如 ColumnarCZSC）以及传入了 kwargs 时，仍然逐根K线构造。
+
+        :param dt: K线时间序列，要求严格递增
+        :param open: 开盘价序列
+        :param close: 收盘价序列
+        :param high: 最高价序列
+        :param low: 最低价序列
+        :param vol: 成交量序列
+        :param amount: 成交额序列，默认为 None，表示全部为 0
+        :param symbol: 标的代码
+        :param freq: K线级别，Freq 对象或者其取值，如 "1分钟"
+        :param get_signals: 自定义的信号计算函数
+        :param max_bi_num: 最大允许保留的笔数量
+        :param kwargs: 传递给类构造函数的其他参数
+        :return: CZSC 对象
+        """
+        import pandas as pd
 
-        for bar in bars:
-            self.update(bar)
+        dt = pd.DatetimeIndex(pd.to_datetime(dt))
+        assert len(dt) > 0, "K线数据不能为空"
+        assert dt.is_monotonic_increasing and dt.is_unique, "K线时间必须严格递增"
+
+        n = len(dt)
+        amount = np.zeros(n) if amount is None else amount
+        columns = [np.asarray(x, dtype=np.float64).tolist() for x in (open, close, high, low, vol, amount)]
+        assert all(len(x) == n for x in columns), "K线数据的各列长度必须一致"
+
+        freq = Freq(freq)
+        opens, closes, highs, lows, vols, amounts = columns
+
+        def raw_bar(i):
+            return RawBar(symbol=symbol, id=i, dt=dt[i], freq=freq, open=opens[i], close=closes[i],
+                          high=highs[i], low=lows[i], vol=vols[i], amount=amounts[i])
+
+        state = None
+        if not kwargs and all(getattr(cls, k) is getattr(CZSC, k) for k in ("update", "_update_bars", "_trim_bars")):
+            state = _replay_bi(highs, lows, max_bi_num, envs.get_min_bi_len())
+
+        if state is None:
+            czsc = cls([raw_bar(i) for i in range(n)], max_bi_num=max_bi_num, **kwargs)
+        else:
+            czsc = cls.__new__(cls)
+            czsc._init_state(symbol, freq, None, max_bi_num)
+            czsc._load_replay(state, raw_bar, n)
+        czsc.get_signals = get_signals
+        czsc.signals = get_signals(c=czsc) if get_signals else OrderedDict()
+        return czsc
+
+    @classmethod
+    def from_dataframe(cls, df, freq=None, get_signals=None, max_bi_num=envs.get_max_bi_num(), **kwargs):
+        """使用标准K线数据批量创建 CZSC 对象，参数说明见 from_arrays
+
+        :param df: 标准K线数据，必须包含 symbol, dt, open, close, high, low, vol, amount 列；只能有一个标的
+        :param freq: K线级别；默认为 None，表示读取 df 中的 freq 列
+        :return: CZSC 对象
+        """
+        assert df["symbol"].nunique() == 1, "df 中只能有一个标的的K线数据"
+        if freq is None:
+            assert "freq" in df.columns, "df 中没有 freq 列，必须指定 freq 参数"
+            freq = df["freq"].iloc[0]
+
+        df = df.sort_values("dt")
+        amount = df["amount"] if "amount" in df.columns else None
+        return cls.from_arrays(df["dt"], df["open"], df["close"], df["high"], df["low"], df["vol"], amount=amount,
+                               symbol=df["symbol"].iloc[0], freq=freq, get_signals=get_signals,
+                               max_bi_num=max_bi_num, **kwargs)
+
+    def _load_replay(self, state: dict, raw_bar, n: int):
+        """根据 _replay_bi 的重放结果创建最终保留的K线、分型和笔对象，状态与逐根K线调用 update 完全一致
+
+        :param state: _replay_bi 的返回结果
+        :param raw_bar: 函数，输入原始K线的位置，返回 RawBar 对象
+        :param n: 原始K线的数量
+        """
+        H, L, R0, u0, bis = state["H"], state["L"], state["R0"], state["u0"], state["bis"]
+        g0 = bis[0][0] - 1 if bis else u0
+        r0 = min(R0[g0], state["raw_start"])
+        raws = [raw_bar(i) for i in range(r0, n)]
+        ends = R0[1:] + [n]
+
+        def new_bar(g, k, k1):
+            # 第 g 根无包含K线包含前 k 根原始K线时的状态，与 _update_bars 一样逐根调用 remove_include 合并
+            bar = raws[R0[g] - r0]
+            k2 = NewBar(symbol=bar.symbol, id=bar.id, freq=bar.freq, dt=bar.dt, open=bar.open, close=bar.close,
+                        amount=bar.amount, high=bar.high, low=bar.low, vol=bar.vol, elements=[bar])
+            for r in range(R0[g] + 1, R0[g] + k):
+                has_include, k2 = remove_include(k1, k2, raws[r - r0])
+                assert has_include, f"{raws[r - r0].dt} 去除包含关系的结果与重放不一致"
+            return k2
+
+        # 合并时 k1 只用于判断方向，g0 之前的无包含K线只需要最高价
+        k1 = NewBar(symbol=self.symbol, id=-1, dt=None, freq=self.freq, open=0, close=0,
+                    high=H[g0 - 1] if g0 else 0, low=L[g0 - 1] if g0 else 0, vol=0, amount=0)
+        finals = []
+        for g in range(g0, len(H)):
+            k1 = new_bar(g, ends[g] - R0[g], k1)
+            finals.append(k1)
+
+        bi_list = []
+        for pa, pb, direction, fxs, (g, k), high_cached in bis:
+            # 笔创建时最后一根无包含K线可能还没有完成，使用当时的状态
+            last = new_bar(g, k, finals[g - 1 - g0]) if k < ends[g] - R0[g] else finals[g - g0]
+
+            def get_bar(x):
+                return last if x == g else finals[x - g0]
+
+            fx_list = []
+            for pos, mark in fxs:
+                k1, k2, k3 = get_bar(pos - 1), get_bar(pos), get_bar(pos + 1)
+                mark = Mark.G if mark > 0 else Mark.D
+                fx_list.append(FX(symbol=k1.symbol, dt=k2.dt, mark=mark, high=k2.high, low=k2.low,
+                                  fx=k2.high if mark == Mark.G else k2.low, elements=[k1, k2, k3]))
+            fx_a = fx_list[0]
+            fx_b = next(fx for (pos, _), fx in zip(fxs, fx_list) if pos == pb)
+            cache = {"high": max(fx_a.high, fx_b.high)} if high_cached else None
+            bi_list.append(BI(symbol=fx_a.symbol, fx_a=fx_a, fx_b=fx_b, fxs=fx_list,
+                              direction=Direction.Up if direction > 0 else Direction.Down,
+                              bars=[get_bar(x) for x in range(pa - 1, pb + 2)], cache=cache))
+
+        self.bi_list = bi_list
+        self.bars_ubi = finals[u0 - g0:]
+        self._trim_bi = bi_list[0] if bi_list else None
+        bars_raw = raws[state["raw_start"] - r0:]
+        store = self.indicators
+        if store is not None:
+            bars_raw = [self._bind_cache(bar, store.append(bar)) for bar in bars_raw]
+        self.bars_raw = bars_raw
 
     def __repr__(self):
         return "<CZSC~{}~{}>".format(self.symbol, self.freq.value)
 
+    def _reset_ubi_state(self):
+        """重置 bars_ubi 的增量计算状态，下次读取时全量重算"""
+        # bars_ubi 只会在尾部发生变化（追加、替换、删除最后一根），记录第一根发生变化的K线位置即可增量更新
+        self._ubi_dirty = 0
+
+        # 分型序列：与 check_fxs(bars_ubi) 的结果一致
+        self._fxs_ref = None  # 上次同步时的 bars_ubi 列表对象
+        self._fxs_n = 0  # 上次同步时 bars_ubi 的长度
+        self._fxs: List[FX] = []
+        self._fxs_pos: List[int] = []  # 分型中间K线在 bars_ubi 中的位置
+        self._fxs_best: List[int] = []  # fxs[1: i + 1] 中可以作为笔结束分型的最极端分型序号，没有则为 -1
+        self._dets: List[tuple] = []  # check_fx 识别出的全部分型 (pos, fx)，包括因顶底不交替而被丢弃的分型
+        self._dets_pos: List[int] = []
+        self._bi_dets: List[tuple] = []  # 与 bi_list 一一对应的 (bi, dets)，dets 为笔内部分型，用于笔被破坏后的恢复
+
+        # 原始K线序列：仅在读取 ubi 属性时同步
+        self._raw_ref = None
+        self._raw_n = 0
+        self._raw_dirty = 0
+        self._ubi_raw: List[RawBar] = []
+        self._ubi_raw_offsets: List[int] = []  # bars_ubi 中每根K线的第一根原始K线在 _ubi_raw 中的位置
+        self._ubi_raw_high: List[int] = []  # _ubi_raw[: i + 1] 中最高价K线的位置
+        self._ubi_raw_low: List[int] = []  # _ubi_raw[: i + 1] 中最低价K线的位置
+
+        self._fx_list_cache = None
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.__dict__.setdefault("_trim_bi", None)
+        self.__dict__.setdefault("indicators", None)
+        if "_ubi_dirty" not in state:
+            # 兼容旧版本序列化的对象
+            self._reset_ubi_state()
+
+    def _append_fx(self, fx: FX, pos: int):
+        """按照 check_fxs 的规则追加分型，并更新笔结束分型的候选"""
+        self._dets.append((pos, fx))
+        self._dets_pos.append(pos)
+        fxs, fxs_best = self._fxs, self._fxs_best
+
+        # 默认情况下，fxs本身是顶底交替的，但是对于一些特殊情况下不是这样; 临时强制要求fxs序列顶底交替
+        if len(fxs) >= 2 and fx.mark == fxs[-1].mark:
+            logger.error(f"check_fxs错误: {fx.dt}，{fx.mark}，{fxs[-1].mark}")
+            return
+
+        best = fxs_best[-1] if fxs else -1
+        if fxs:
+            fx_a = fxs[0]
+            if fx_a.mark == Mark.D and fx.mark == Mark.G and fx.fx > fx_a.fx:
+                if best == -1 or fx.high > fxs[best].high:
+                    best = len(fxs)
+            elif fx_a.mark == Mark.G and fx.mark == Mark.D and fx.fx < fx_a.fx:
+                if best == -1 or fx.low < fxs[best].low:
+                    best = len(fxs)
+        fxs.append(fx)
+        self._fxs_pos.append(pos)
+        fxs_best.append(best)
+
+    def _rebuild_fxs(self, bars: List[NewBar], dets):
+        """使用已经识别出的分型 (pos, fx) 重建 bars 的分型序列，不需要重新调用 check_fx"""
+        self._fxs, self._fxs_pos, self._fxs_best = [], [], []
+        self._dets, self._dets_pos = [], []
+        for pos, fx in dets:
+            self._append_fx(fx, pos)
+        self._fxs_ref = bars
+        self._fxs_n = len(bars)
+        self._ubi_dirty = len(bars)
+
+    def _sync_fxs(self):
+        """增量同步 bars_ubi 中的分型序列；如果 bars_ubi 被整体替换，则全量重算"""
+        bars = self.bars_ubi
+        if bars is not self._fxs_ref:
+            self._fxs_ref = bars
+            self._fxs_n = 0
+
+        n = len(bars)
+        p = min(self._ubi_dirty, self._fxs_n, n)
+        if p == self._fxs_n == n:
+            return
+
+        # 第 i 个位置的分型由 bars[i-1: i+2] 决定，位置 p 的K线发生变化会影响 p - 1 及之后的分型
+        k = bisect_left(self._fxs_pos, p - 1)
+        del self._fxs[k:], self._fxs_pos[k:], self._fxs_best[k:]
+        k = bisect_left(self._dets_pos, p - 1)
+        del self._dets[k:], self._dets_pos[k:]
+        for i in range(max(p - 1, 1), n - 1):
+            fx = check_fx(bars[i - 1], bars[i], bars[i + 1])
+            if isinstance(fx, FX):
+                self._append_fx(fx, i)
+
+        self._fxs_n = n
+        self._ubi_dirty = n
+
+    def _is_fxs_synced(self) -> bool:
+        return self._fxs_ref is self.bars_ubi and self._fxs_n == len(self.bars_ubi) == self._ubi_dirty
+
+    def _set_ubi_suffix(self, start: int):
+        """bars_ubi 只保留 start 及之后的K线，复用已经识别出的分型"""
+        bars = self.bars_ubi[start:]
+        if self._is_fxs_synced():
+            # 位置 start 成为第一根K线，不再是分型；其后的分型只与相邻三根K线有关，平移位置即可
+            k = bisect_left(self._dets_pos, start + 1)
+            self._rebuild_fxs(bars, [(pos - start, fx) for pos, fx in self._dets[k:]])
+        self.bars_ubi = bars
+
+    def _merge_last_bi(self):
+        """当前笔被破坏，将当前笔的bars与bars_ubi进行合并，并丢弃"""
+        last_bi = self.bi_list.pop(-1)
+        last_dets = self._bi_dets.pop(-1) if self._bi_dets else (None, None)
+        bars_ubi = self.bars_ubi
+
+        # 这里容易出错，多一根K线就可能导致错误；必须是 -2，因为最后一根无包含K线有可能是未完成的
+        m = len(last_bi.bars)
+        if last_dets[0] is last_bi and self._is_fxs_synced() and len(bars_ubi) >= 2 \
+                and bars_ubi[0] is last_bi.bars[-3] and bars_ubi[1].dt >= last_bi.bars[-2].dt:
+            # bars_ubi 从当前笔的倒数第三根K线开始，合并后的序列为 last_bi.bars[:-3] + bars_ubi
+            bars = last_bi.bars[:-2] + bars_ubi[1:]
+            dets = list(last_dets[1])
+            fx = check_fx(bars[m - 4], bars[m - 3], bars[m - 2])
+            if isinstance(fx, FX):
+                dets.append((m - 3, fx))
+            dets.extend((pos + m - 3, fx) for pos, fx in self._dets if pos >= 1)
+            self._rebuild_fxs(bars, dets)
+            self.bars_ubi = bars
+        else:
+            self.bars_ubi = last_bi.bars[:-2] + [x for x in bars_ubi if x.dt >= last_bi.bars[-2].dt]
+
+    def _sync_ubi_raw(self):
+        """增量同步 bars_ubi 中的原始K线序列，以及最高价、最低价所在位置"""
+        bars = self.bars_ubi
+        if bars is not self._raw_ref:
+            self._raw_ref = bars
+            self._raw_n = 0
+
+        n = len(bars)
+        p = min(self._raw_dirty, self._raw_n, n)
+        raw, offsets = self._ubi_raw, self._ubi_raw_offsets
+        raw_high, raw_low = self._ubi_raw_high, self._ubi_raw_low
+        if p < len(offsets):
+            del raw[offsets[p]:], raw_high[offsets[p]:], raw_low[offsets[p]:], offsets[p:]
+
+        for i in range(p, n):
+            offsets.append(len(raw))
+            for bar in bars[i].raw_bars:
+                if raw:
+                    h, lo = raw_high[-1], raw_low[-1]
+                    raw_high.append(len(raw) if bar.high > raw[h].high else h)
+                    raw_low.append(len(raw) if bar.low < raw[lo].low else lo)
+                else:
+                    raw_high.append(0)
+                    raw_low.append(0)
+                raw.append(bar)
+
+        self._raw_n = n
+        self._raw_dirty = n
+
+    def _check_bi(self):
+        """基于增量维护的分型序列，在 bars_ubi 中查找一笔，逻辑与 check_bi 完全一致
+
+        :return: bi, bars_b 在 bars_ubi 中的开始位置；如果没有找到笔，返回 None, None
+        """
+        self._sync_fxs()
+        fxs, fxs_pos = self._fxs, self._fxs_pos
+        if len(fxs) < 2 or self._fxs_best[-1] == -1:
+            return None, None
+
+        b = self._fxs_best[-1]
+        fx_a, fx_b = fxs[0], fxs[b]
+        pa, pb = fxs_pos[0], fxs_pos[b]
+        direction = Direction.Up if fx_a.mark == Mark.D else Direction.Down
+
+        # 判断fx_a和fx_b价格区间是否存在包含关系
+        ab_include = (fx_a.high > fx_b.high and fx_a.low < fx_b.low) or (fx_a.high < fx_b.high and fx_a.low > fx_b.low)
+
+        # 成笔的条件：1）顶底分型之间没有包含关系；2）笔长度大于等于min_bi_len
+        if ab_include or pb - pa + 3 < envs.get_min_bi_len():
+            return None, None
+
+        fxs_ = fxs[:bisect_right(fxs_pos, pb + 1)]
+        bars_a = self.bars_ubi[pa - 1: pb + 2]
+        bi = BI(symbol=fx_a.symbol, fx_a=fx_a, fx_b=fx_b, fxs=fxs_, direction=direction, bars=bars_a)
+
+        # 记录笔内部 fx_b 之前的分型，位置以 bars_a 的第一根K线为起点
+        dets = [(pos - pa + 1, fx) for pos, fx in self._dets[:bisect_right(self._dets_pos, pb - 2)] if pos >= pa]
+        self._bi_dets.append((bi, dets))
+        return bi, pb - 1
+
     def __update_bi(self):
         bars_ubi = self.bars_ubi
         if len(bars_ubi) < 3:
@@ -218,53 +692,104 @@ class CZSC:
         # 查找笔
         if not self.bi_list:
             # 第一笔的查找
-            fxs = check_fxs(bars_ubi)
+            self._sync_fxs()
+            fxs = self._fxs
             if not fxs:
                 return
 
-            fx_a = fxs[0]
-            fxs_a = [x for x in fxs if x.mark == fx_a.mark]
-            for fx in fxs_a:
+            fx_a, pa = fxs[0], self._fxs_pos[0]
+            for fx, pos in zip(fxs, self._fxs_pos):
+                if fx.mark != fx_a.mark:
+                    continue
                 if (fx_a.mark == Mark.D and fx.low <= fx_a.low) \
                         or (fx_a.mark == Mark.G and fx.high >= fx_a.high):
-                    fx_a = fx
-            bars_ubi = [x for x in bars_ubi if x.dt >= fx_a.elements[0].dt]
+                    fx_a, pa = fx, pos
+            if pa > 1:
+                self._set_ubi_suffix(pa - 1)
 
-            bi, bars_ubi_ = check_bi(bars_ubi)
+            bi, start = self._check_bi()
             if isinstance(bi, BI):
                 self.bi_list.append(bi)
-            self.bars_ubi = bars_ubi_
+                self._set_ubi_suffix(start)
             return
 
         if self.verbose and len(bars_ubi) > 100:
             logger.info(f"{self.symbol} - {self.freq} - {bars_ubi[-1].dt} 未完成笔延伸数量: {len(bars_ubi)}")
 
-        bi, bars_ubi_ = check_bi(bars_ubi)
-        self.bars_ubi = bars_ubi_
+        bi, start = self._check_bi()
         if isinstance(bi, BI):
             self.bi_list.append(bi)
+            self._set_ubi_suffix(start)
 
         # 后处理：如果当前笔被破坏，将当前笔的bars与bars_ubi进行合并，并丢弃
         last_bi = self.bi_list[-1]
         bars_ubi = self.bars_ubi
         if (last_bi.direction == Direction.Up and bars_ubi[-1].high > last_bi.high) \
                 or (last_bi.direction == Direction.Down and bars_ubi[-1].low < last_bi.low):
-            # 当前笔被破坏，将当前笔的bars与bars_ubi进行合并，并丢弃，这里容易出错，多一根K线就可能导致错误
-            # 必须是 -2，因为最后一根无包含K线有可能是未完成的
-            self.bars_ubi = last_bi.bars[:-2] + [x for x in bars_ubi if x.dt >= last_bi.bars[-2].dt]
-            self.bi_list.pop(-1)
+            self._merge_last_bi()
 
     def update(self, bar: RawBar):
         """更新分析结果
 
         :param bar: 单根K线对象
         """
-        # 更新K线序列
+        # 更新K线序列，并去除包含关系；bars_ubi 只有最后两根K线可能发生变化
+        dirty = max(len(self.bars_ubi) - 2, 0)
+        self._ubi_dirty = min(self._ubi_dirty, dirty)
+        self._raw_dirty = min(self._raw_dirty, dirty)
+        self._update_bars(bar)
+
+        # 更新笔
+        self.__update_bi()
+
+        # 根据最大笔数量限制完成 bi_list, bars_raw 序列的数量控制
+        if len(self.bi_list) > self.max_bi_num:
+            self.bi_list = self.bi_list[-self.max_bi_num:]
+            self._bi_dets = self._bi_dets[-self.max_bi_num:]
+        self._trim_bars()
+
+        # 如果有信号计算函数，则进行信号计算
+        self.signals = self.get_signals(c=self) if self.get_signals else OrderedDict()
+
+    def _create_indicator_store(self):
+        return IndicatorStore()
+
+    def _bind_cache(self, bar: RawBar, index: int) -> RawBar:
+        """将K线的 cache 绑定到 indicators 中绝对索引为 index 的行
+
+        传入K线的 cache 为空、或者已经绑定到本对象的同一行时，直接绑定并使用传入的K线对象，不做复制；
+        只有K线已经被其他 CZSC 对象（或本对象的其他行）使用时才复制一份，新K线只复制未注册的 key，避免指标缓存串用。
+
+        注意：已注册的 key 存储在 indicators 中，值为 dict 的 key（如 MACD、KDJ）每次读取 ``bar.cache[key]``
+        返回的都是新的字典，``bar.cache[key][field] = value`` 不会写回缓存，需要整体赋值 ``bar.cache[key] = {...}``
+        """
+        store = self.indicators
+        cache = bar._cache
+        if isinstance(cache, BarCache):
+            if cache.store is store and cache.index == index:
+                return bar
+            # K线已经被其他 CZSC 对象使用，复制一份
+            return RawBar(symbol=bar.symbol, id=bar.id, dt=bar.dt, freq=bar.freq, open=bar.open, close=bar.close,
+                          high=bar.high, low=bar.low, vol=bar.vol, amount=bar.amount,
+                          cache=BarCache(store, index, dict(cache.extra) if cache.extra else None))
+
+        bar._cache = BarCache(store, index, cache)
+        return bar
+
+    def _update_bars(self, bar: RawBar):
+        """更新原始K线序列，并对 bars_ubi 去除包含关系"""
+        store = self.indicators
         if not self.bars_raw or bar.dt != self.bars_raw[-1].dt:
+            if store is not None:
+                bar = self._bind_cache(bar, store.append(bar))
             self.bars_raw.append(bar)
             last_bars = [bar]
         else:
-            # 当前 bar 是上一根 bar 的时间延伸
+            # 当前 bar 是上一根 bar 的时间延伸，已有的指标缓存失效
+            if store is not None:
+                store.invalidate(store.tail - 1)
+                store.set_bar(store.tail - 1, bar)
+                bar = self._bind_cache(bar, store.tail - 1)
             self.bars_raw[-1] = bar
             last_bars = self.bars_ubi.pop(-1).raw_bars
             assert bar.dt == last_bars[-1].dt, f"{bar.dt} != {last_bars[-1].dt}，时间错位"
@@ -286,12 +811,11 @@ class CZSC:
                     bars_ubi.append(k3)
         self.bars_ubi = bars_ubi
 
-        # 更新笔
-        self.__update_bi()
-
-        # 根据最大笔数量限制完成 bi_list, bars_raw 序列的数量控制
-        self.bi_list = self.bi_list[-self.max_bi_num:]
-        if self.bi_list:
+    def _trim_bars(self):
+        """根据 bi_list 的第一笔，裁剪 bars_raw 序列"""
+        # bars_raw 只在尾部追加，第一笔不变时不需要重复裁剪
+        if self.bi_list and self.bi_list[0] is not self._trim_bi:
+            self._trim_bi = self.bi_list[0]
             sdt = self.bi_list[0].fx_a.elements[0].dt
             s_index = 0
             for i, bar in enumerate(self.bars_raw):
@@ -299,9 +823,8 @@ class CZSC:
                     s_index = i
                     break
             self.bars_raw = self.bars_raw[s_index:]
-
-        # 如果有信号计算函数，则进行信号计算
-        self.signals = self.get_signals(c=self) if self.get_signals else OrderedDict()
+            if self.indicators is not None:
+                self.indicators.discard_before(self.indicators.tail - len(self.bars_raw))
 
     def to_echarts(self, width: str = "1400px", height: str = '580px', bs=[]):
         """绘制K线分析图
@@ -329,7 +852,7 @@ class CZSC:
         from czsc.utils.plotly_plot import KlineChart
 
         bi_list = self.bi_list
-        df = pd.DataFrame(self.bars_raw)
+        df = pd.DataFrame([x.__dict__ for x in self.bars_raw])
         kline = KlineChart(n_rows=3, title="{}-{}".format(self.symbol, self.freq.value))
         kline.add_kline(df, name="")
         kline.add_sma(df, ma_seq=(5, 10, 21), row=1, visible=True, line_width=1.2)
@@ -386,8 +909,8 @@ class CZSC:
         """bars_ubi 中的分型"""
         if not self.bars_ubi:
             return []
-        else:
-            return check_fxs(self.bars_ubi)
+        self._sync_fxs()
+        return list(self._fxs)
 
     @property
     def ubi(self):
@@ -396,10 +919,12 @@ class CZSC:
         if not self.bars_ubi or not self.bi_list or not ubi_fxs:
             return None
 
-        bars_raw = [y for x in self.bars_ubi for y in x.raw_bars]
+        # _ubi_raw 是增量维护的内部列表，返回副本，调用方修改 raw_bars 不会影响增量状态
+        self._sync_ubi_raw()
+        bars_raw = list(self._ubi_raw)
         # 获取最高点和最低点，以及对应的时间
-        high_bar = max(bars_raw, key=lambda x: x.high)
-        low_bar = min(bars_raw, key=lambda x: x.low)
+        high_bar = bars_raw[self._ubi_raw_high[-1]]
+        low_bar = bars_raw[self._ubi_raw_low[-1]]
         direction = Direction.Up if self.bi_list[-1].direction == Direction.Down else Direction.Down
 
         bi = {
@@ -419,11 +944,326 @@ class CZSC:
     @property
     def fx_list(self) -> List[FX]:
         """分型列表，包括 bars_ubi 中的分型"""
-        fxs = []
-        for bi_ in self.bi_list:
-            fxs.extend(bi_.fxs[1:])
+        # bi_list 只会在尾部追加、删除，在头部裁剪；首尾两笔和数量不变，则已完成笔的分型不变
+        bi_list = self.bi_list
+        cache = self._fx_list_cache
+        if bi_list and cache and cache[0] is bi_list[0] and cache[1] is bi_list[-1] and cache[2] == len(bi_list):
+            fxs = list(cache[3])
+        else:
+            fxs = []
+            for bi_ in bi_list:
+                fxs.extend(bi_.fxs[1:])
+            if bi_list:
+                self._fx_list_cache = (bi_list[0], bi_list[-1], len(bi_list), list(fxs))
+
         ubi = self.ubi_fxs
         for x in ubi:
             if not fxs or x.dt > fxs[-1].dt:
                 fxs.append(x)
         return fxs
+
+
+def _column_property(buffer: str, name: str, dtype=None):
+    """创建读取列式缓冲区中指定列的只读属性"""
+
+    def fget(self):
+        value = getattr(self._c, buffer).get(name, self._i)
+        return dtype(value) if dtype else value
+
+    return property(fget, doc=f"{name}，从列式缓冲区中读取")
+
+
+class RawBarView:
+    """ColumnarCZSC 中原始K线的轻量视图，属性与 RawBar 保持一致"""
+
+    __slots__ = ("_c", "_i")
+
+    def __init__(self, c, i: int):
+        self._c = c
+        self._i = i
+
+    id = _column_property("_raw", "id", int)
+    dt = _column_property("_raw", "dt")
+    open = _column_property("_raw", "open")
+    close = _column_property("_raw", "close")
+    high = _column_property("_raw", "high")
+    low = _column_property("_raw", "low")
+    vol = _column_property("_raw", "vol")
+    amount = _column_property("_raw", "amount")
+
+    @property
+    def symbol(self):
+        return self._c.symbol
+
+    @property
+    def freq(self):
+        return self._c.freq
+
+    @property
+    def cache(self):
+        return self._c._raw_caches.setdefault(self._i, {})
+
+    @cache.setter
+    def cache(self, value):
+        self._c._raw_caches[self._i] = value
+
+    @property
+    def upper(self):
+        """上影"""
+        return self.high - max(self.open, self.close)
+
+    @property
+    def lower(self):
+        """下影"""
+        return min(self.open, self.close) - self.low
+
+    @property
+    def solid(self):
+        """实体"""
+        return abs(self.open - self.close)
+
+    @property
+    def __dict__(self):
+        keys = ["symbol", "id", "dt", "freq", "open", "close", "high", "low", "vol", "amount", "cache"]
+        return {k: getattr(self, k) for k in keys}
+
+    def __reduce__(self):
+        return RawBarView, (self._c, self._i)
+
+    def __eq__(self, other):
+        return isinstance(other, RawBarView) and self._c is other._c and self._i == other._i
+
+    def __hash__(self):
+        return hash((id(self._c), self._i))
+
+    def __repr__(self):
+        return (f"RawBarView(symbol={self.symbol}, id={self.id}, dt={self.dt}, open={self.open}, "
+                f"close={self.close}, high={self.high}, low={self.low}, vol={self.vol})")
+
+
+class NewBarView:
+    """ColumnarCZSC 中无包含关系K线的轻量视图，属性与 NewBar 保持一致"""
+
+    __slots__ = ("_c", "_i")
+
+    def __init__(self, c, i: int):
+        self._c = c
+        self._i = i
+
+    id = _column_property("_new", "id", int)
+    dt = _column_property("_new", "dt")
+    open = _column_property("_new", "open")
+    close = _column_property("_new", "close")
+    high = _column_property("_new", "high")
+    low = _column_property("_new", "low")
+    vol = _column_property("_new", "vol")
+    amount = _column_property("_new", "amount")
+
+    @property
+    def symbol(self):
+        return self._c.symbol
+
+    @property
+    def freq(self):
+        return self._c.freq
+
+    @property
+    def elements(self) -> List[RawBarView]:
+        """存入具有包含关系的原始K线，与 remove_include 保持一致：最多保留前 100 根和最后 1 根"""
+        r0 = int(self._c._new.get("r0", self._i))
+        r1 = int(self._c._new.get("r1", self._i))
+        if r1 - r0 > 100:
+            index = list(range(r0, r0 + 100)) + [r1]
+        else:
+            index = range(r0, r1 + 1)
+        return [RawBarView(self._c, i) for i in index]
+
+    @property
+    def raw_bars(self):
+        return self.elements
+
+    @property
+    def cache(self):
+        return self._c._new_caches.setdefault(self._i, {})
+
+    @cache.setter
+    def cache(self, value):
+        self._c._new_caches[self._i] = value
+
+    @property
+    def __dict__(self):
+        keys = ["symbol", "id", "dt", "freq", "open", "close", "high", "low", "vol", "amount", "elements", "cache"]
+        return {k: getattr(self, k) for k in keys}
+
+    def __reduce__(self):
+        return NewBarView, (self._c, self._i)
+
+    def __eq__(self, other):
+        return isinstance(other, NewBarView) and self._c is other._c and self._i == other._i
+
+    def __hash__(self):
+        return hash((id(self._c), self._i))
+
+    def __repr__(self):
+        return (f"NewBarView(symbol={self.symbol}, id={self.id}, dt={self.dt}, open={self.open}, "
+                f"close={self.close}, high={self.high}, low={self.low}, vol={self.vol})")
+
+
+class BarsView(Sequence):
+    """ColumnarCZSC.bars_raw 的只读序列视图，支持 len、下标、切片和迭代"""
+
+    def __init__(self, c, start: int, end: int):
+        self._c = c
+        self._start = start
+        self._end = end
+
+    def __len__(self):
+        return self._end - self._start
+
+    def __getitem__(self, item):
+        if isinstance(item, slice):
+            return [RawBarView(self._c, self._start + i) for i in range(*item.indices(len(self)))]
+
+        n = len(self)
+        if item < 0:
+            item += n
+        if not 0 <= item < n:
+            raise IndexError("bars_raw index out of range")
+        return RawBarView(self._c, self._start + item)
+
+    def __iter__(self):
+        c = self._c
+        return (RawBarView(c, i) for i in range(self._start, self._end))
+
+    def __add__(self, other):
+        return list(self) + list(other)
+
+    def __repr__(self):
+        return f"<BarsView~{self._c.symbol}~{self._c.freq.value}~{len(self)}>"
+
+
+class ColumnarCZSC(CZSC):
+    """列式存储的 CZSC 分析对象
+
+    与 CZSC 的笔识别逻辑完全一致，区别在于存储方式：
+
+    1. 原始K线和无包含K线都存放在预分配的 numpy 列式缓冲区中（ColumnBuffer），不再为每根K线创建 dataclass 对象
+    2. bars_raw 是 BarsView 序列视图，元素为 RawBarView；bars_ubi、笔和分型中的K线为 NewBarView
+    3. bars_raw 的裁剪只移动缓冲区的头部指针，单根K线更新的时间复杂度为 O(1)
+
+    注意：RawBarView / NewBarView 只是对缓冲区的引用，笔被 max_bi_num 移出 bi_list 后，其K线视图不再保证有效。
+    """
+
+    _raw_dtypes = {"id": np.int64, "dt": object, "open": np.float64, "close": np.float64, "high": np.float64,
+                   "low": np.float64, "vol": np.float64, "amount": np.float64}
+    _new_dtypes = dict(_raw_dtypes, r0=np.int64, r1=np.int64, rd=np.int64)
+
+    def __init__(self, bars: List[RawBar], get_signals=None, max_bi_num=envs.get_max_bi_num(), capacity=1024):
+        """
+
+        :param bars: K线数据
+        :param get_signals: 自定义的信号计算函数
+        :param max_bi_num: 最大允许保留的笔数量
+        :param capacity: 列式缓冲区的初始容量
+        """
+        self._raw = ColumnBuffer(self._raw_dtypes, capacity=capacity)
+        self._new = ColumnBuffer(self._new_dtypes, capacity=capacity)
+        self._raw_caches = {}
+        self._new_caches = {}
+        self._raw_start = 0  # bars_raw 第一根K线在原始K线缓冲区中的绝对索引
+        super().__init__(bars, get_signals=get_signals, max_bi_num=max_bi_num)
+
+    def __repr__(self):
+        return "<ColumnarCZSC~{}~{}>".format(self.symbol, self.freq.value)
+
+    def _create_indicator_store(self):
+        # RawBarView 的 cache 由 _raw_caches 管理，不使用 IndicatorStore
+        return None
+
+    @property
+    def bars_raw(self) -> BarsView:
+        """原始K线序列"""
+        return BarsView(self, max(self._raw_start, self._raw.head), self._raw.tail)
+
+    @bars_raw.setter
+    def bars_raw(self, value):
+        # CZSC.__init__ 中的初始化赋值，列式存储不需要处理
+        assert not value, "ColumnarCZSC.bars_raw 不支持直接赋值"
+
+    def _append_new(self, r: int) -> NewBarView:
+        """将绝对索引为 r 的原始K线作为一根新的无包含K线追加到缓冲区"""
+        raw = self._raw
+        i = self._new.append(id=raw.get("id", r), dt=raw.get("dt", r), open=raw.get("open", r),
+                             close=raw.get("close", r), high=raw.get("high", r), low=raw.get("low", r),
+                             vol=raw.get("vol", r), amount=raw.get("amount", r), r0=r, r1=r, rd=r)
+        return NewBarView(self, i)
+
+    def _remove_include(self, k1: NewBarView, k2: NewBarView, r: int):
+        """去除包含关系，逻辑与 remove_include 完全一致，结果直接写入列式缓冲区"""
+        raw, new = self._raw, self._new
+        h1, h2 = k1.high, k2.high
+        l2 = new.get("low", k2._i)
+        h3, l3 = raw.get("high", r), raw.get("low", r)
+
+        if h1 == h2 or not ((h2 <= h3 and l2 >= l3) or (h2 >= h3 and l2 <= l3)):
+            return False, self._append_new(r)
+
+        if h1 < h2:
+            high, low = max(h2, h3), max(l2, l3)
+            rd = int(new.get("rd", k2._i)) if h2 > h3 else r
+        else:
+            high, low = min(h2, h3), min(l2, l3)
+            rd = int(new.get("rd", k2._i)) if l2 < l3 else r
+
+        open_, close = (high, low) if raw.get("open", r) > raw.get("close", r) else (low, high)
+        i = new.append(id=new.get("id", k2._i), dt=raw.get("dt", rd), open=open_, close=close, high=high, low=low,
+                       vol=new.get("vol", k2._i) + raw.get("vol", r),
+                       amount=new.get("amount", k2._i) + raw.get("amount", r),
+                       r0=new.get("r0", k2._i), r1=r, rd=rd)
+        return True, NewBarView(self, i)
+
+    def _update_bars(self, bar: RawBar):
+        """更新原始K线缓冲区，并对 bars_ubi 去除包含关系"""
+        raw = self._raw
+        values = dict(id=bar.id, dt=bar.dt, open=bar.open, close=bar.close, high=bar.high,
+                      low=bar.low, vol=bar.vol, amount=bar.amount)
+        if len(raw) == 0 or bar.dt != raw.get("dt", raw.tail - 1):
+            last_bars = [raw.append(**values)]
+        else:
+            # 当前 bar 是上一根 bar 的时间延伸
+            raw.set_last(**values)
+            self._raw_caches.pop(raw.tail - 1, None)
+            last_bars = [x._i for x in self.bars_ubi.pop(-1).raw_bars]
+            assert last_bars[-1] == raw.tail - 1, f"{bar.dt} 时间错位"
+
+        # 去除包含关系
+        bars_ubi = self.bars_ubi
+        for r in last_bars:
+            if len(bars_ubi) < 2:
+                bars_ubi.append(self._append_new(r))
+            else:
+                has_include, k3 = self._remove_include(bars_ubi[-2], bars_ubi[-1], r)
+                if has_include:
+                    bars_ubi[-1] = k3
+                else:
+                    bars_ubi.append(k3)
+
+    def _trim_bars(self):
+        """根据 bi_list 的第一笔，移动 bars_raw 的起点，并释放缓冲区中不再被引用的数据"""
+        if not self.bi_list:
+            return
+
+        k0 = self.bi_list[0].fx_a.elements[0]
+        self._raw_start = max(self._raw_start, int(self._new.get("rd", k0._i)))
+
+        r0 = int(self._new.get("r0", k0._i))
+        if r0 - self._raw.head > 256:
+            self._raw.discard_before(r0)
+            self._new.discard_before(k0._i)
+            self._raw_caches = {k: v for k, v in self._raw_caches.items() if k >= r0}
+            self._new_caches = {k: v for k, v in self._new_caches.items() if k >= k0._i}
+
+    @property
+    def nbytes(self) -> int:
+        """列式缓冲区占用的字节数"""
+        return self._raw.nbytes + self._new.nbytes
@@ -8,7 +8,7 @@ describe: 用于探索性分析的函数
 import loguru
 import pandas as pd
 import numpy as np
-from sklearn.linear_model import Ridge, LinearRegression, Lasso
+from sklearn.linear_model import Lasso
 
 
 def vwap(price: np.array, volume: np.array, **kwargs) -> float:
@@ -30,9 +30,37 @@ def twap(price: np.array, **kwargs) -> float:
     return np.average(price)
 
 
+def _beta_residuals(codes, x, y, alpha=0.0):
+    """按截面批量计算 y 对 x 回归（带截距）后的残差，codes 为截面编号，要求已排序且连续
+
+    所有截面的正规方程 X'X w = X'y 通过 np.add.reduceat 分段归约一次得到，再批量求解；
+    alpha > 0 时为岭回归，与 sklearn 的 Ridge(alpha) 一致；alpha = 0 时为最小二乘，用伪逆求解，与 LinearRegression 一致。
+    """
+    p = x.shape[1]
+    starts = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]])
+    count = np.diff(np.r_[starts, len(codes)])
+    x = np.asfortranarray(x)
+    xc = np.asfortranarray(x - (np.add.reduceat(x, starts, axis=0) / count[:, None])[codes])
+    yc = y - (np.add.reduceat(y, starts) / count)[codes]
+
+    xtx = np.empty((len(starts), p, p))
+    for i in range(p):
+        for j in range(i, p):
+            xtx[:, i, j] = xtx[:, j, i] = np.add.reduceat(xc[:, i] * xc[:, j], starts)
+    xty = np.stack([np.add.reduceat(xc[:, i] * yc, starts) for i in range(p)], axis=1)
+
+    if alpha > 0:
+        w = np.linalg.solve(xtx + alpha * np.eye(p), xty[:, :, None])[:, :, 0]
+    else:
+        w = np.einsum("kij,kj->ki", np.linalg.pinv(xtx, rcond=1e-12, hermitian=True), xty)
+    return yc - np.einsum("ij,ij->i", xc, w[codes])
+
+
 def remove_beta_effects(df, **kwargs):
     """去除 beta 对因子的影响
 
+    ridge、linear 模型在所有截面上用正规方程批量求解，不再逐个截面拟合 sklearn 模型；lasso 模型逐个截面拟合。
+
     :param df: DataFrame, 数据, 必须包含 dt、symbol、factor 和 betas 列
     :param kwargs:
 
@@ -44,13 +72,7 @@ def remove_beta_effects(df, **kwargs):
     """
 
     linear_model = kwargs.get("linear_model", "ridge")
-    linear = {
-        "ridge": Ridge(),
-        "linear": LinearRegression(),
-        "lasso": Lasso(),
-    }
-    assert linear_model in linear.keys(), "linear_model 参数必须为 ridge、linear 或 lasso"
-    Model = linear[linear_model]
+    assert linear_model in ["ridge", "linear", "lasso"], "linear_model 参数必须为 ridge、linear 或 lasso"
 
     factor = kwargs.get("factor")
     betas = kwargs.get("betas")
@@ -63,19 +85,33 @@ def remove_beta_effects(df, **kwargs):
 
     logger.info(f"去除 beta 对因子 {factor} 的影响, 使用 {linear_model} 模型, betas: {betas}")
 
-    rows = []
-    for dt, dfg in df.groupby("dt"):
-        dfg = dfg.copy().dropna(subset=[factor] + betas)
-        if dfg.empty:
-            continue
-
-        x = dfg[betas].values
-        y = dfg[factor].values
-        model = Model().fit(x, y)
-        dfg[factor] = y - model.predict(x)
-        rows.append(dfg)
-
-    dfr = pd.concat(rows, ignore_index=True)
+    if linear_model == "lasso":
+        rows = []
+        for dt, dfg in df.groupby("dt"):
+            dfg = dfg.copy().dropna(subset=[factor] + betas)
+            if dfg.empty:
+                continue
+
+            x = dfg[betas].values
+            y = dfg[factor].values
+            model = Lasso().fit(x, y)
+            dfg[factor] = y - model.predict(x)
+            rows.append(dfg)
+
+        dfr = pd.concat(rows, ignore_index=True)
+        return dfr
+
+    # 按 dt 稳定排序，行的顺序与逐个截面处理后拼接的结果一致
+    dfr = df.dropna(subset=["dt", factor] + betas)
+    codes = pd.factorize(dfr["dt"], sort=True)[0]
+    order = np.argsort(codes, kind="stable")
+    dfr = dfr.iloc[order].reset_index(drop=True)
+    if dfr.empty:
+        raise ValueError(f"去除空值后没有数据，无法去除 beta 对因子 {factor} 的影响")
+
+    x = dfr[betas].to_numpy(dtype=float)
+    y = dfr[factor].to_numpy(dtype=float)
+    dfr[factor] = _beta_residuals(codes[order], x, y, alpha=1.0 if linear_model == "ridge" else 0.0)
     return dfr
 
 
@@ -105,15 +141,28 @@ def cross_sectional_strategy(df, factor, **kwargs):
     if factor_direction == "negative":
         df[factor] = -df[factor]
 
-    df['weight'] = 0
-    for dt, dfg in df.groupby("dt"):
-        if len(dfg) < long_num + short_num:
-            logger.warning(f"{dt} 截面数据量过小，跳过；仅有 {len(dfg)} 条数据，需要 {long_num + short_num} 条数据")
-            continue
-
-        dfa = dfg.sort_values(factor, ascending=False).head(long_num)
-        dfb = dfg.sort_values(factor, ascending=True).head(short_num)
-        df.loc[dfa.index, "weight"] = 1 / long_num
-        df.loc[dfb.index, "weight"] = -1 / short_num
-
+    # 按 (dt, 因子值) 排序一次，得到每个截面内的多头、空头排名；因子值为空的排在最后，与 sort_values 一致
+    codes, dts = pd.factorize(df["dt"], sort=True)
+    codes = codes.astype(np.int64)
+    x = df[factor].to_numpy(dtype=float)
+
+    def __rank(key):
+        # 因子值转换为整数排名（空值排在最后）后与截面编号合成一个排序键，稳定排序保证并列时按原始顺序
+        key = np.unique(key, return_inverse=True)[1].reshape(-1)
+        order = np.argsort(codes * (len(df) + 1) + key, kind="stable")
+        sorted_codes = codes[order]
+        rank = np.empty(len(df), dtype=int)
+        rank[order] = np.arange(len(df)) - np.searchsorted(sorted_codes, sorted_codes)
+        return rank
+
+    count = np.bincount(codes[codes >= 0], minlength=len(dts))
+    for i in np.flatnonzero(count < long_num + short_num):
+        logger.warning(f"{dts[i]} 截面数据量过小，跳过；仅有 {count[i]} 条数据，需要 {long_num + short_num} 条数据")
+
+    valid = codes >= 0
+    valid[valid] = count[codes[valid]] >= long_num + short_num
+    weight = np.zeros(len(df))
+    weight[valid & (__rank(-x) < long_num)] = 1 / long_num
+    weight[valid & (__rank(x) < short_num)] = -1 / short_num
+    df["weight"] = weight if valid.any() else 0
     return df
@@ -8,6 +8,15 @@ describe: 时序特征因子库
 因子函数编写规范：https://s0cqcxuy3p.feishu.cn/wiki/A9yawT6o1il9SrkUoBNchtXjnBK
 """
 
+from .factory import (
+    FEATURES,
+    FeatureSpec,
+    FeatureContext,
+    register_feature,
+    register_intermediate,
+    compute_features,
+)
+
 from .ret import (
     RET001,
     RET002,
@@ -0,0 +1,184 @@
+# -*- coding: utf-8 -*-
+"""
+author: zengbin93
+email: zeng_bin8888@163.com
+create_dt: 2024/10/20 14:30
+describe: 因子注册表与批量计算
+
+因子函数通过 register_feature 注册，声明输入列、参数及其默认值、字段标记的生成规则；
+因子之间共享的中间变量（如 high + low、收益率）通过 register_intermediate 注册，在 FeatureContext 中只计算一次；
+compute_features 在一次遍历中计算多个因子、多组参数，并将结果一次性拼接到原始数据上。
+"""
+import functools
+import itertools
+import numpy as np
+import pandas as pd
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Tuple, Union
+
+
+FEATURES: Dict[str, "FeatureSpec"] = {}  # 因子名称 -> 因子定义
+INTERMEDIATES: Dict[str, Callable] = {}  # 中间变量名称 -> 计算函数
+
+
+@dataclass
+class FeatureSpec:
+    """因子定义
+
+    :param name: 因子名称，如 VPF001
+    :param func: 因子计算函数，签名为 func(ctx: FeatureContext, **params)，返回与 ctx 等长的序列
+    :param inputs: 因子计算需要的原始数据列
+    :param params: 参数及其默认值
+    :param tag: 字段标记，支持用参数格式化，如 "N{num}"
+    """
+
+    name: str
+    func: Callable
+    inputs: Tuple[str, ...] = ("close",)
+    params: Dict = field(default_factory=dict)
+    tag: str = "A"
+
+    def resolve(self, kwargs: dict) -> Tuple[dict, str]:
+        """根据传入的参数得到完整参数与因子字段名，不在参数空间中的 key 会被忽略"""
+        params = {k: kwargs.get(k, v) for k, v in self.params.items()}
+        tag = kwargs.get("tag", self.tag.format(**params))
+        return params, f"F#{self.name}#{tag}"
+
+
+class FeatureContext:
+    """因子计算的上下文，缓存原始数据列与中间变量，保证同一批因子计算中共享的中间变量只计算一次"""
+
+    def __init__(self, df: pd.DataFrame):
+        self.df = df
+        self.index = df.index
+        self.cache = {}
+
+    def __len__(self):
+        return len(self.df)
+
+    def __getitem__(self, col) -> pd.Series:
+        """读取原始数据列"""
+        return self.df[col]
+
+    def get(self, name: str, **params) -> pd.Series:
+        """读取中间变量，首次读取时计算并缓存
+
+        :param name: 中间变量名称，必须先通过 register_intermediate 注册
+        :param params: 中间变量的参数
+        """
+        key = (name, tuple(sorted(params.items())))
+        if key not in self.cache:
+            assert name in INTERMEDIATES, f"中间变量 {name} 未注册"
+            self.cache[key] = INTERMEDIATES[name](self, **params)
+        return self.cache[key]
+
+
+def register_intermediate(name: str):
+    """注册中间变量的计算函数，函数签名为 func(ctx: FeatureContext, **params)
+
+    中间变量的计算函数内可以通过 ctx.get 读取其他中间变量，依赖关系在读取时自动处理
+    """
+
+    def decorator(func):
+        INTERMEDIATES[name] = func
+        return func
+
+    return decorator
+
+
+def register_feature(inputs=("close",), params=None, tag="A", name=None):
+    """注册因子计算函数
+
+    被装饰的函数签名为 func(ctx: FeatureContext, **params)，返回因子值；装饰后得到的函数签名为 func(df, **kwargs)，
+    与原有的因子函数一致，直接在 df 上新增因子列。
+
+    :param inputs: 因子计算需要的原始数据列
+    :param params: 参数及其默认值
+    :param tag: 字段标记，支持用参数格式化，如 "N{num}"
+    :param name: 因子名称，默认为函数名
+    """
+
+    def decorator(func):
+        spec = FeatureSpec(name=name or func.__name__, func=func, inputs=tuple(inputs), params=dict(params or {}), tag=tag)
+
+        @functools.wraps(func)
+        def wrapper(df, **kwargs):
+            p, col = spec.resolve(kwargs)
+            df[col] = spec.func(FeatureContext(df), **p)
+
+        wrapper.spec = spec
+        FEATURES[spec.name] = spec
+        return wrapper
+
+    return decorator
+
+
+@register_intermediate("hl_sum")
+def _hl_sum(ctx: FeatureContext):
+    """最高价与最低价之和"""
+    return ctx["high"] + ctx["low"]
+
+
+@register_intermediate("hl_range")
+def _hl_range(ctx: FeatureContext):
+    """K线振幅：最高价与最低价之差"""
+    return ctx["high"] - ctx["low"]
+
+
+@register_intermediate("ret")
+def _ret(ctx: FeatureContext):
+    """逐K收益率"""
+    return ctx["close"] / ctx["close"].shift(1) - 1
+
+
+def _expand_features(features) -> List[Tuple[FeatureSpec, dict]]:
+    """展开因子配置，参数值为 list 时按参数网格展开"""
+    if not FEATURES:
+        import czsc.features  # noqa: F401，导入内置因子，完成注册
+
+    rows = []
+    for item in features:
+        name, kwargs = (item, {}) if not isinstance(item, (tuple, list)) else item
+        spec = name.spec if hasattr(name, "spec") else FEATURES.get(name)
+        assert spec is not None, f"因子 {name} 未注册"
+
+        grid = {k: v if isinstance(v, list) else [v] for k, v in kwargs.items()}
+        combos = [dict(zip(grid.keys(), values)) for values in itertools.product(*grid.values())]
+
+        # 参数网格展开为多组参数、且字段标记与参数无关时（如 RET 因子的 tag 默认为 A），按变化的参数生成字段标记，如 N5
+        varying = [k for k, v in grid.items() if len(v) > 1 and k in spec.params]
+        if len(combos) > 1 and "tag" not in grid and len({spec.resolve(x)[1] for x in combos}) < len(combos):
+            for x in combos:
+                x["tag"] = "".join(f"{k.upper()}{x[k]}" for k in varying)
+        rows.extend((spec, x) for x in combos)
+    return rows
+
+
+def compute_features(df: pd.DataFrame, features: List[Union[str, Callable, tuple]]) -> pd.DataFrame:
+    """批量计算因子，共享的中间变量只计算一次，结果一次性拼接到原始数据上
+
+    :param df: 标准K线数据，DataFrame结构
+    :param features: 因子配置列表，元素可以是：
+
+        - 因子名称或因子函数，如 "VPF001"、VPF001，使用默认参数
+        - (因子名称或因子函数, 参数) 元组，参数值为 list 时展开为参数网格，如 ("VPF004", {"n": [5, 7, 9]})；
+          因子的字段标记与参数无关时（如 RET001 默认为 A），网格中每组参数的字段标记由变化的参数生成，
+          如 ("RET001", {"n": [5, 10]}) 得到 F#RET001#N5、F#RET001#N10
+
+    :return: pd.DataFrame, 原始数据 + 因子列；原始数据中已有的同名因子列会被替换；
+        不同的因子配置得到相同的字段名时（如参数网格中指定了固定的 tag）抛出 ValueError
+    """
+    rows = _expand_features(features)
+    missing = {c for spec, _ in rows for c in spec.inputs} - set(df.columns)
+    assert not missing, f"缺少因子计算需要的列：{missing}"
+
+    ctx = FeatureContext(df)
+    block = {}
+    for spec, kwargs in rows:
+        params, col = spec.resolve(kwargs)
+        if col in block:
+            raise ValueError(f"因子字段 {col} 重复，请检查因子配置或为不同的参数指定不同的 tag")
+        block[col] = np.asarray(spec.func(ctx, **params))
+
+    dff = pd.DataFrame(block, index=df.index)
+    return pd.concat([df.drop(columns=[c for c in dff.columns if c in df.columns]), dff], axis=1)
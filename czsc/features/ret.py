@@ -4,9 +4,11 @@
 """
 import numpy as np
 import pandas as pd
+from czsc.features.factory import FeatureContext, register_feature
 
 
-def RET001(df, **kwargs):
+@register_feature(inputs=('close',), params={'n': 5}, tag='A')
+def RET001(ctx: FeatureContext, n=5):
     """用 close 价格计算未来 N 根K线的收益率
 
     参数空间：
@@ -18,15 +20,11 @@ def RET001(df, **kwargs):
 
     :return: None
     """
-    tag = kwargs.get('tag', 'A')
-    n = kwargs.get('n', 5)
+    return (ctx['close'].shift(-n) / ctx['close'] - 1).fillna(0)
 
-    col = f'F#RET001#{tag}'
-    df[col] = df['close'].shift(-n) / df['close'] - 1
-    df[col] = df[col].fillna(0)
 
-
-def RET002(df, **kwargs):
+@register_feature(inputs=('open',), params={'n': 5}, tag='A')
+def RET002(ctx: FeatureContext, n=5):
     """用 open 价格计算未来 N 根K线的收益率
 
     参数空间：
@@ -38,15 +36,11 @@ def RET002(df, **kwargs):
 
     :return: None
     """
-    tag = kwargs.get('tag', 'A')
-    n = kwargs.get('n', 5)
-
-    col = f'F#RET002#{tag}'
-    df[col] = df['open'].shift(-n - 1) / df['open'].shift(-1) - 1
-    df[col] = df[col].fillna(0)
+    return (ctx['open'].shift(-n - 1) / ctx['open'].shift(-1) - 1).fillna(0)
 
 
-def RET003(df, **kwargs):
+@register_feature(inputs=('close',), params={'n': 5}, tag='A')
+def RET003(ctx: FeatureContext, n=5):
     """未来 N 根K线的收益波动率
 
     参数空间：
@@ -59,17 +53,11 @@ def RET003(df, **kwargs):
 
     :return: None
     """
-    tag = kwargs.get('tag', 'A')
-    n = kwargs.get('n', 5)
+    return ctx.get('ret').rolling(n).std().shift(-n).fillna(0)
 
-    col = f'F#RET003#{tag}'
-    df['tmp'] = df['close'].pct_change()
-    df[col] = df['tmp'].rolling(n).std().shift(-n)
-    df[col] = df[col].fillna(0)
-    df.drop(columns=['tmp'], inplace=True)
 
-
-def RET004(df, **kwargs):
+@register_feature(inputs=('close',), params={'n': 5}, tag='A')
+def RET004(ctx: FeatureContext, n=5):
     """未来 N 根K线的最大收益盈亏比
 
     注意：
@@ -84,19 +72,14 @@ def RET004(df, **kwargs):
 
     :return: None
     """
-    tag = kwargs.get('tag', 'A')
-    n = kwargs.get('n', 5)
-
-    col = f'F#RET004#{tag}'
-    df['max_ret'] = df['close'].rolling(n).apply(lambda x: x.max() / x[0] - 1, raw=True)
-    df['min_ret'] = df['close'].rolling(n).apply(lambda x: x.min() / x[0] - 1, raw=True)
-    df[col] = (df['max_ret'] / df['min_ret'].abs()).shift(-n)
-    df[col] = df[col].fillna(0)
-    df[col] = df[col].clip(0, 10)
-    df.drop(columns=['max_ret', 'min_ret'], inplace=True)
+    close = ctx['close']
+    max_ret = close.rolling(n).max() / close.shift(n - 1) - 1
+    min_ret = close.rolling(n).min() / close.shift(n - 1) - 1
+    return (max_ret / min_ret.abs()).shift(-n).fillna(0).clip(0, 10)
 
 
-def RET005(df, **kwargs):
+@register_feature(inputs=('close',), params={'n': 5}, tag='A')
+def RET005(ctx: FeatureContext, n=5):
     """未来 N 根K线的逐K胜率
 
     :param df: 标准K线数据，DataFrame结构
@@ -107,17 +90,14 @@ def RET005(df, **kwargs):
 
     :return: None
     """
-    tag = kwargs.get('tag', 'A')
-    n = kwargs.get('n', 5)
+    ret = ctx.get('ret')
+    win = (ret > 0).astype(float).rolling(n).sum() / n
+    win = win.where(ret.rolling(n).count() == n)
+    return win.shift(-n).fillna(0)
 
-    col = f'F#RET005#{tag}'
-    df['ret'] = df['close'].pct_change()
-    df[col] = df['ret'].rolling(n).apply(lambda x: np.sum(x > 0) / n).shift(-n)
-    df[col] = df[col].fillna(0)
-    df.drop(columns=['ret'], inplace=True)
 
-
-def RET006(df, **kwargs):
+@register_feature(inputs=('close',), params={'n': 5}, tag='A')
+def RET006(ctx: FeatureContext, n=5):
     """未来 N 根K线的逐K盈亏比
 
     注意：
@@ -131,20 +111,14 @@ def RET006(df, **kwargs):
 
     :return: None
     """
-    tag = kwargs.get('tag', 'A')
-    n = kwargs.get('n', 5)
-
-    col = f'F#RET006#{tag}'
-    df['ret'] = df['close'].pct_change()
-    df['mean_win'] = df['ret'].rolling(n).apply(lambda x: np.sum(x[x > 0]) / np.sum(x > 0))
-    df['mean_loss'] = df['ret'].rolling(n).apply(lambda x: np.sum(x[x < 0]) / np.sum(x < 0))
-    df[col] = (df['mean_win'] / df['mean_loss'].abs()).shift(-n)
-    df[col] = df[col].fillna(0)
-    df[col] = df[col].clip(0, 10)
-    df.drop(columns=['ret', 'mean_win', 'mean_loss'], inplace=True)
+    ret = ctx.get('ret')
+    mean_win = ret.rolling(n).apply(lambda x: np.sum(x[x > 0]) / np.sum(x > 0), raw=True)
+    mean_loss = ret.rolling(n).apply(lambda x: np.sum(x[x < 0]) / np.sum(x < 0), raw=True)
+    return (mean_win / mean_loss.abs()).shift(-n).fillna(0).clip(0, 10)
 
 
-def RET007(df, **kwargs):
+@register_feature(inputs=('close',), params={'n': 5}, tag='A')
+def RET007(ctx: FeatureContext, n=5):
     """未来 N 根K线的最大跌幅
 
     :param df: 标准K线数据，DataFrame结构
@@ -155,15 +129,12 @@ def RET007(df, **kwargs):
 
     :return: None
     """
-    tag = kwargs.get('tag', 'A')
-    n = kwargs.get('n', 5)
+    close = ctx['close']
+    return (close.rolling(n).min() / close.shift(n - 1) - 1).shift(-n).fillna(0)
 
-    col = f'F#RET007#{tag}'
-    df[col] = df['close'].rolling(n).apply(lambda x: np.min(x) / x[0] - 1, raw=True).shift(-n)
-    df[col] = df[col].fillna(0)
 
-
-def RET008(df, **kwargs):
+@register_feature(inputs=('close',), params={'n': 5}, tag='A')
+def RET008(ctx: FeatureContext, n=5):
     """未来 N 根K线的最大涨幅
 
     :param df: 标准K线数据，DataFrame结构
@@ -174,12 +145,8 @@ def RET008(df, **kwargs):
 
     :return: None
     """
-    tag = kwargs.get('tag', 'A')
-    n = kwargs.get('n', 5)
-
-    col = f'F#RET008#{tag}'
-    df[col] = df['close'].rolling(n).apply(lambda x: np.max(x) / x[0] - 1, raw=True).shift(-n)
-    df[col] = df[col].fillna(0)
+    close = ctx['close']
+    return (close.rolling(n).max() / close.shift(n - 1) - 1).shift(-n).fillna(0)
 
 
 def test_ret_functions():
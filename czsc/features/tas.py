@@ -1,7 +1,6 @@
 """
 技术指标因子
 """
-import inspect
 import hashlib
 import pandas as pd
 
@@ -35,8 +34,7 @@ def CCF(df, **kwargs):
     assert czsc_factor is not None and isinstance(czsc_factor, dict), "factor 参数必须指定"
     tag = kwargs.get('tag', hashlib.sha256(f"{czsc_factor}_{freq}".encode()).hexdigest().upper()[:6])
 
-    factor_name = inspect.stack()[0][3]
-    factor_col = f'F#{factor_name}#{tag}'
+    factor_col = f'F#CCF#{tag}'
 
     czsc_factor = Factor.load(czsc_factor)
     signals_seq = czsc_factor.signals_all + czsc_factor.signals_any + czsc_factor.signals_not
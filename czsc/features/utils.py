@@ -1,7 +1,7 @@
 # 工具函数
+import bisect
 import numpy as np
 import pandas as pd
-from sklearn.linear_model import LinearRegression
 from sklearn.preprocessing import minmax_scale, scale, maxabs_scale, robust_scale
 from loguru import logger
 
@@ -18,6 +18,89 @@ def is_event_feature(df, col, **kwargs):
     return all([x in [0, 1, -1] for x in unique_values])
 
 
+def _nan_in_window(sr: pd.Series, window) -> np.ndarray:
+    """判断每个滚动窗口内是否存在空值"""
+    return sr.isna().astype(float).rolling(window=window, min_periods=1).sum().to_numpy() > 0
+
+
+def _rolling_scale_last(sr: pd.Series, window, min_periods) -> pd.Series:
+    """滚动计算窗口内最后一个值的 z-score，等价于 rolling(...).apply(lambda x: scale(x)[-1])
+
+    使用 pandas 的 O(n) 滚动均值、标准差（ddof=0）；与 sklearn 的 scale 一致，空值不参与计算，标准差为 0 时不缩放
+    """
+    roll = sr.rolling(window=window, min_periods=min_periods)
+    std = roll.std(ddof=0)
+    return (sr - roll.mean()) / std.mask(std == 0, 1)
+
+
+def _handle_zeros_in_scale(sr: pd.Series) -> pd.Series:
+    """与 sklearn 的 _handle_zeros_in_scale 一致，接近 0 的缩放系数置为 1"""
+    return sr.mask(sr < 10 * np.finfo(np.float64).eps, 1)
+
+
+def _quantile_index(m: int, quantiles: np.ndarray):
+    """与 np.quantile 的线性插值（method="linear"）一致，计算 m 个有序值的分位点所在的前后位置和插值权重"""
+    virtual = (m - 1) * quantiles
+    prev = np.floor(virtual)
+    gamma = virtual - np.where(virtual >= m - 1, -1, prev)
+    prev = np.clip(np.where(virtual >= m - 1, m - 1, prev), 0, None).astype(int)
+    nxt = np.clip(np.where(virtual >= m - 1, m - 1, prev + 1), 0, None).astype(int)
+    return prev.tolist(), nxt.tolist(), gamma
+
+
+def _rolling_qcut_last(x: np.ndarray, window, min_periods, q) -> np.ndarray:
+    """滚动计算窗口内最后一个值的分位数分组，等价于 rolling(...).apply(lambda x: pd.qcut(x, q, labels=False, duplicates="drop")[-1])
+
+    用 bisect 维护窗口内非空值的有序列表，窗口滑动时插入新值、删除移出的值，每个位置按 np.quantile 的线性插值公式
+    从有序列表中取出分位点，再统计最后一个值所在的分组。每个位置的插入、删除是 O(log w) 次比较加一次列表内存移动，
+    取分位点是 O(q)，整体为 O(n (log w + q))，不再对每个窗口重新排序或计算分位数。
+    """
+    n = len(x)
+    valid = pd.Series(x).rolling(window=window, min_periods=1).count().to_numpy() >= max(min_periods, 1)
+    rows = np.flatnonzero(valid)
+    quantiles = np.linspace(0, 1, q + 1)
+    lo = np.empty((len(rows), q + 1))
+    hi = np.empty((len(rows), q + 1))
+    gamma = np.empty((len(rows), q + 1))
+
+    values, valid_ = x.tolist(), valid.tolist()
+    window_sorted, index_cache, k = [], {}, 0
+    for i in range(n):
+        v = values[i]
+        if v == v:
+            bisect.insort(window_sorted, v)
+        if i >= window:
+            old = values[i - window]
+            if old == old:
+                del window_sorted[bisect.bisect_left(window_sorted, old)]
+        if valid_[i]:
+            m = len(window_sorted)
+            if m not in index_cache:
+                index_cache[m] = _quantile_index(m, quantiles)
+            prev, nxt, gamma[k] = index_cache[m]
+            lo[k] = [window_sorted[j] for j in prev]
+            hi[k] = [window_sorted[j] for j in nxt]
+            k += 1
+
+    # 与 np.quantile 的 _lerp 一致：权重不小于 0.5 时从右端点反向插值
+    diff = hi - lo
+    bins = np.where(gamma >= 0.5, hi - diff * (1 - gamma), lo + diff * gamma).T
+    last = x[rows]
+
+    # 重复的分位点只保留一个，与 duplicates="drop" 一致
+    uniq = np.ones(bins.shape, dtype=bool)
+    if len(quantiles) != 2:
+        uniq[1:] = bins[1:] != bins[:-1]
+    ids = (uniq & (bins < last)).sum(axis=0)
+    ids[last == bins[0]] = 1
+    labels = (ids - 1).astype(float)
+    labels[(ids == uniq.sum(axis=0)) | (ids == 0)] = np.nan
+
+    res = np.full(n, np.nan)
+    res[rows] = labels
+    return res
+
+
 def rolling_corr(df, col1, col2, window=300, min_periods=100, **kwargs):
     """滚动计算两个序列的相关系数
 
@@ -73,10 +156,10 @@ def rolling_norm(df: pd.DataFrame, col, window=300, min_periods=100, new_col=Non
 
     min_periods = kwargs.get("min_periods", 2)
     new_col = new_col if new_col else f"{col}_norm"
-    df[new_col] = (
-        df[col].rolling(window=window, min_periods=min_periods).apply(lambda x: (x[-1] - x.mean()) / x.std(), raw=True)
-    )
-    df[new_col] = df[new_col].fillna(0)
+    roll = df[col].rolling(window=window, min_periods=min_periods)
+    std = roll.std(ddof=0)
+    norm = (df[col] - roll.mean()) / std.mask(std == 0)
+    df[new_col] = norm.mask(_nan_in_window(df[col], window)).fillna(0)
     return df
 
 
@@ -96,10 +179,8 @@ def rolling_qcut(df: pd.DataFrame, col, window=300, min_periods=100, new_col=Non
     min_periods = kwargs.get("min_periods", q)
     new_col = new_col if new_col else f"{col}_qcut"
 
-    def __qcut_func(x):
-        return pd.qcut(x, q=q, labels=False, duplicates="drop")[-1]
-
-    df[new_col] = df[col].rolling(window=window, min_periods=min_periods).apply(__qcut_func, raw=True)
+    x = df[col].to_numpy(dtype=np.float64)
+    df[new_col] = _rolling_qcut_last(x, window, min_periods, q)
     df[new_col] = df[new_col].fillna(-1)
     return df
 
@@ -132,33 +213,26 @@ def rolling_compare(df, col1, col2, window=300, min_periods=100, new_col=None, *
         "lr_coef",
     ], "method 必须为 sub, divide, lr_intercept, lr_coef 中的一种"
 
-    for i in range(len(df)):
-        dfi = df.loc[i - window + 1 : i, [col1, col2]]
-        dfi = dfi.copy()
-        if i < min_periods:
-            df.loc[i, new_col] = 0
-            continue
-
-        if method == "sub":
-            df.loc[i, new_col] = dfi[col1].sub(dfi[col2]).mean()
-
-        elif method == "divide":
-            df.loc[i, new_col] = dfi[col1].divide(dfi[col2]).mean()
+    if method == "sub":
+        res = df[col1].sub(df[col2]).rolling(window=window, min_periods=1).mean()
 
-        elif method == "lr_intercept":
-            x = dfi[col2].values.reshape(-1, 1)
-            y = dfi[col1].values.reshape(-1, 1)
-            reg = LinearRegression().fit(x, y)
-            df.loc[i, new_col] = reg.intercept_[0]
-
-        elif method == "lr_coef":
-            x = dfi[col2].values.reshape(-1, 1)
-            y = dfi[col1].values.reshape(-1, 1)
-            reg = LinearRegression().fit(x, y)
-            df.loc[i, new_col] = reg.coef_[0][0]
+    elif method == "divide":
+        res = df[col1].divide(df[col2]).rolling(window=window, min_periods=1).mean()
 
+    else:
+        # 一元线性回归 col1 = coef * col2 + intercept，用滚动协方差、方差计算；col2 方差为 0 时 coef 为 0
+        x, y = df[col2], df[col1]
+        var = x.rolling(window=window, min_periods=1).var()
+        coef = (x.rolling(window=window, min_periods=1).cov(y) / var.mask(var == 0)).where(var != 0, 0)
+        if method == "lr_coef":
+            res = coef
         else:
-            raise ValueError(f"method {method} not support")
+            res = y.rolling(window=window, min_periods=1).mean() - coef * x.rolling(window=window, min_periods=1).mean()
+
+    res = res.to_numpy(dtype=np.float64, copy=True)
+    res[:min_periods] = 0
+    df[new_col] = res
+    return df
 
 
 def rolling_scale(df: pd.DataFrame, col: str, window=300, min_periods=100, new_col=None, **kwargs):
@@ -186,14 +260,21 @@ def rolling_scale(df: pd.DataFrame, col: str, window=300, min_periods=100, new_c
     assert method in method_map, f"method must be one of {list(method_map.keys())}"
     scale_method = method_map[method]
 
-    if method == "minmax_scale":
-        df[new_col] = (
-            df[col]
-            .rolling(window=window, min_periods=min_periods)
-            .apply(lambda x: minmax_scale(x, feature_range=(-1, 1))[-1])
-        )
+    # 与 sklearn 对应方法作用在每个窗口上、取最后一个值的结果一致，全部使用 pandas 的滚动统计量计算
+    sr = df[col]
+    roll = sr.rolling(window=window, min_periods=min_periods)
+    if scale_method is scale:
+        df[new_col] = _rolling_scale_last(sr, window, min_periods)
+    elif scale_method is minmax_scale:
+        data_min = roll.min()
+        scale_ = 2 / _handle_zeros_in_scale(roll.max() - data_min)
+        df[new_col] = sr * scale_ + (-1 - data_min * scale_)
+    elif scale_method is maxabs_scale:
+        max_abs = sr.abs().rolling(window=window, min_periods=min_periods).max()
+        df[new_col] = sr / _handle_zeros_in_scale(max_abs)
     else:
-        df[new_col] = df[col].rolling(window=window, min_periods=min_periods).apply(lambda x: scale_method(x)[-1])
+        iqr = roll.quantile(0.75) - roll.quantile(0.25)
+        df[new_col] = (sr - roll.median()) / _handle_zeros_in_scale(iqr)
 
     df[new_col] = df[new_col].fillna(0)
     return df
@@ -214,7 +295,7 @@ def rolling_tanh(df: pd.DataFrame, col: str, window=300, min_periods=100, new_co
         df = df.copy()
     new_col = new_col if new_col else f"{col}_tanh"
     df = df.sort_values("dt", ascending=True).reset_index(drop=True)
-    df[new_col] = df[col].rolling(window=window, min_periods=min_periods).apply(lambda x: np.tanh(scale(x))[-1])  # type: ignore
+    df[new_col] = np.tanh(_rolling_scale_last(df[col], window, min_periods))
     df[new_col] = df[new_col].fillna(0)
     return df
 
@@ -242,11 +323,24 @@ def rolling_slope(df: pd.DataFrame, col: str, window=300, min_periods=100, new_c
     new_col = new_col if new_col else f"{col}_slope_{method}"
 
     if method == "linear":
-        # 使用线性回归计算斜率
-        def __lr_slope(x):
-            return LinearRegression().fit(list(range(len(x))), x).coef_[0]
-
-        df[new_col] = df[col].rolling(window=window, min_periods=min_periods).apply(__lr_slope, raw=True)
+        # 使用线性回归计算斜率：以窗口内的序号 t = 0, 1, ..., m-1 为自变量，
+        # slope = (sum(t * y) - mean(t) * sum(y)) / sum((t - mean(t)) ** 2)
+        y = df[col].to_numpy(dtype=np.float64)
+        n, m = len(y), np.minimum(np.arange(1, len(y) + 1), window)
+        sum_y = df[col].rolling(window=window, min_periods=1).sum().to_numpy()
+        sum_y[_nan_in_window(df[col], window)] = np.nan
+
+        # 窗口不完整时序号与行号相同，用累加和计算；窗口完整时用相关运算计算
+        sum_ty = np.cumsum(np.arange(n) * y)
+        if n >= window:
+            sum_ty[window - 1 :] = np.correlate(y, np.arange(window, dtype=np.float64), mode="valid")
+
+        ss_t = m * (m * m - 1) / 12
+        slope = (sum_ty - (m - 1) / 2 * sum_y) / np.where(ss_t == 0, np.nan, ss_t)
+        slope[m == 1] = 0
+        count = df[col].rolling(window=window, min_periods=1).count().to_numpy()
+        slope[count < min_periods] = np.nan
+        df[new_col] = slope
 
     elif method == "std/mean":
         # 用 window 内 std 的变化率除以 mean 的变化率，来衡量序列的斜率
@@ -425,10 +519,11 @@ def feature_to_weight(df, factor, positive, **kwargs):
     df[factor] = df[factor].clip(lower=df["lower"], upper=df["upper"])
 
     # scale 缩放，均值为0
-    df["norm"] = df[factor].rolling(window, min_periods).apply(lambda x: scale(x)[-1])
+    df["norm"] = _rolling_scale_last(df[factor], window, min_periods)
 
     # maxabs_scale 缩放至 [-1, 1]
-    df["weight"] = df["norm"].rolling(window, min_periods).apply(lambda x: maxabs_scale(x)[-1])
+    max_abs = df["norm"].abs().rolling(window, min_periods).max()
+    df["weight"] = df["norm"] / _handle_zeros_in_scale(max_abs)
     df["weight"] = df["weight"].fillna(0)
     if not positive:
         df["weight"] = -df["weight"]
@@ -449,25 +544,15 @@ def feature_returns(df, factor, target="n1b", **kwargs):
 
     :return: pd.DataFrame, 新增 returns 列
     """
-    from sklearn.linear_model import LinearRegression
+    from czsc.utils.corr import _cross_sectional_stats
 
-    df = df.copy()
     fit_intercept = kwargs.get("fit_intercept", False)
+    dfs = _cross_sectional_stats(df, factor, target, dt_col="dt", fit_intercept=fit_intercept)
+    dfs["returns"] = np.where(dfs["count"] < 5, 0, dfs["beta"])
+    for dt, count in dfs.loc[dfs["count"] < 5, ["dt", "count"]].values:
+        logger.warning(f"{dt} has no enough data, only {count} rows")
 
-    ret = []
-    for dt, dfg in df.groupby("dt"):
-        dfg = dfg.copy().dropna(subset=[factor, target])
-        if dfg.empty or len(dfg) < 5:
-            ret.append([dt, 0])
-            logger.warning(f"{dt} has no enough data, only {len(dfg)} rows")
-            continue
-
-        x = dfg[factor].values.reshape(-1, 1)
-        y = dfg[target].values.reshape(-1, 1)
-        model = LinearRegression(fit_intercept=fit_intercept).fit(x, y)
-        ret.append([dt, model.coef_[0][0]])
-
-    dft = pd.DataFrame(ret, columns=["dt", "returns"])
+    dft = dfs[["dt", "returns"]].copy()
     return dft
 
 
@@ -484,23 +569,33 @@ def feature_sectional_corr(df, factor, target="n1b", method="pearson", **kwargs)
             * spearman : Spearman rank correlation
             * callable: callable with input two 1d ndarrays and returning a float
 
-    :return：df，res: 前者是每日相关系数结果，后者是每日相关系数的统计结果
+        pearson、spearman 按截面批量计算，kendall、callable 逐个截面计算
+
+    :return：df，res: 前者是每日相关系数结果（ic 列），后者是每日相关系数的统计结果
     """
     from czsc.utils import single_linear
+    from czsc.utils.corr import _cross_sectional_stats
 
-    df = df.copy()
-    corr = []
-    for dt, dfg in df.groupby("dt"):
-        dfg = dfg.copy().dropna(subset=[factor, target])
+    if method in ["pearson", "spearman"]:
+        dfs = _cross_sectional_stats(df, factor, target, dt_col="dt", method=method)
+        dfs["ic"] = np.where(dfs["count"] < 5, 0, dfs["ic"])
+        for dt, count in dfs.loc[dfs["count"] < 5, ["dt", "count"]].values:
+            logger.warning(f"{dt} has no enough data, only {count} rows")
+        dft = dfs[["dt", "ic"]].copy()
 
-        if dfg.empty or len(dfg) < 5:
-            corr.append([dt, 0])
-            logger.warning(f"{dt} has no enough data, only {len(dfg)} rows")
-        else:
-            c = dfg[factor].corr(dfg[target], method=method)
-            corr.append([dt, c])
-
-    dft = pd.DataFrame(corr, columns=["dt", "corr"])
+    else:
+        corr = []
+        for dt, dfg in df.groupby("dt"):
+            dfg = dfg.dropna(subset=[factor, target])
+
+            if dfg.empty or len(dfg) < 5:
+                corr.append([dt, 0])
+                logger.warning(f"{dt} has no enough data, only {len(dfg)} rows")
+            else:
+                c = dfg[factor].corr(dfg[target], method=method)
+                corr.append([dt, c])
+
+        dft = pd.DataFrame(corr, columns=["dt", "ic"])
 
     res = {
         "factor": factor,
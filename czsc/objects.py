@@ -28,8 +28,70 @@ class Tick:
     vol: float = 0
 
 
-@dataclass
-class RawBar:
+class _SlotsObject:
+    """使用 __slots__ 的轻量对象基类，行为与 dataclass 保持一致
+
+    1. 没有实例字典，cache 等用户缓存只在第一次访问时创建
+    2. 保留 ``__dict__`` 属性（只读，返回字段字典），兼容 ``pd.DataFrame([x.__dict__ for x in bars])`` 等用法
+    3. 序列化时只保存字段值元组，同时兼容旧版本 dataclass 对象的序列化结果
+    """
+
+    __slots__ = ()
+    _fields: tuple = ()
+
+    def _values(self):
+        return tuple(getattr(self, k) if k != "cache" else (self._cache or {}) for k in self._fields)
+
+    @property
+    def __dict__(self):
+        return dict(zip(self._fields, self._values()))
+
+    def __repr__(self):
+        items = ", ".join(f"{k}={v!r}" for k, v in zip(self._fields, self._values()))
+        return f"{self.__class__.__name__}({items})"
+
+    def __eq__(self, other):
+        if other.__class__ is not self.__class__:
+            return NotImplemented
+        return self._values() == other._values()
+
+    __hash__ = None
+
+    def __getstate__(self):
+        return tuple(getattr(self, k) for k in self.__slots__)
+
+    def __setstate__(self, state):
+        if isinstance(state, tuple) and len(state) == 2 and (state[0] is None or isinstance(state[0], dict)):
+            # 兼容旧版本 dataclass 对象的序列化结果：(__dict__, None) 或者 __dict__
+            state = dict(state[0] or {}, **(state[1] or {}))
+        if isinstance(state, dict):
+            state = dict(state)
+            state["_cache"] = state.pop("cache", None) or None
+            for k in self.__slots__:
+                setattr(self, k, state.get(k))
+        else:
+            for k, v in zip(self.__slots__, state):
+                setattr(self, k, v)
+
+    @property
+    def cache(self):
+        """cache 用户缓存，一个最常见的场景是缓存技术指标计算结果"""
+        if self._cache is None:
+            self._cache = {}
+        return self._cache
+
+    @cache.setter
+    def cache(self, value):
+        from czsc.utils.columnar import BarCache
+
+        if isinstance(self._cache, BarCache) and not isinstance(value, BarCache):
+            self._cache.reset(value or {})
+        else:
+            self._cache = value
+
+
+@dataclass(init=False, repr=False, eq=False)
+class RawBar(_SlotsObject):
     """原始K线元素"""
 
     symbol: str
@@ -42,7 +104,24 @@ class RawBar:
     low: float
     vol: float
     amount: float
-    cache: dict = field(default_factory=dict)  # cache 用户缓存，一个最常见的场景是缓存技术指标计算结果
+    cache: dict  # cache 用户缓存，一个最常见的场景是缓存技术指标计算结果
+
+    __slots__ = ("symbol", "id", "dt", "freq", "open", "close", "high", "low", "vol", "amount", "_cache")
+    _fields = ("symbol", "id", "dt", "freq", "open", "close", "high", "low", "vol", "amount", "cache")
+
+    def __init__(self, symbol: str, id: int, dt: datetime, freq: Freq, open: float, close: float,
+                 high: float, low: float, vol: float, amount: float, cache: dict = None):
+        self.symbol = symbol
+        self.id = id
+        self.dt = dt
+        self.freq = freq
+        self.open = open
+        self.close = close
+        self.high = high
+        self.low = low
+        self.vol = vol
+        self.amount = amount
+        self._cache = cache
 
     @property
     def upper(self):
@@ -60,8 +139,8 @@ class RawBar:
         return abs(self.open - self.close)
 
 
-@dataclass
-class NewBar:
+@dataclass(init=False, repr=False, eq=False)
+class NewBar(_SlotsObject):
     """去除包含关系后的K线元素"""
 
     symbol: str
@@ -74,24 +153,56 @@ class NewBar:
     low: float
     vol: float
     amount: float
-    elements: List = field(default_factory=list)  # 存入具有包含关系的原始K线
-    cache: dict = field(default_factory=dict)  # cache 用户缓存
+    elements: List  # 存入具有包含关系的原始K线
+    cache: dict  # cache 用户缓存
+
+    __slots__ = ("symbol", "id", "dt", "freq", "open", "close", "high", "low", "vol", "amount", "elements", "_cache")
+    _fields = ("symbol", "id", "dt", "freq", "open", "close", "high", "low", "vol", "amount", "elements", "cache")
+
+    def __init__(self, symbol: str, id: int, dt: datetime, freq: Freq, open: float, close: float,
+                 high: float, low: float, vol: float, amount: float, elements: List = None, cache: dict = None):
+        self.symbol = symbol
+        self.id = id
+        self.dt = dt
+        self.freq = freq
+        self.open = open
+        self.close = close
+        self.high = high
+        self.low = low
+        self.vol = vol
+        self.amount = amount
+        self.elements = elements if elements is not None else []
+        self._cache = cache
 
     @property
     def raw_bars(self):
         return self.elements
 
 
-@dataclass
-class FX:
+@dataclass(init=False, repr=False, eq=False)
+class FX(_SlotsObject):
     symbol: str
     dt: datetime
     mark: Mark
     high: float
     low: float
     fx: float
-    elements: List = field(default_factory=list)
-    cache: dict = field(default_factory=dict)  # cache 用户缓存
+    elements: List
+    cache: dict  # cache 用户缓存
+
+    __slots__ = ("symbol", "dt", "mark", "high", "low", "fx", "elements", "_cache")
+    _fields = ("symbol", "dt", "mark", "high", "low", "fx", "elements", "cache")
+
+    def __init__(self, symbol: str, dt: datetime, mark: Mark, high: float, low: float, fx: float,
+                 elements: List = None, cache: dict = None):
+        self.symbol = symbol
+        self.dt = dt
+        self.mark = mark
+        self.high = high
+        self.low = low
+        self.fx = fx
+        self.elements = elements if elements is not None else []
+        self._cache = cache
 
     @property
     def new_bars(self):
@@ -197,19 +308,34 @@ def create_fake_bis(fxs: List[FX]) -> List[FakeBI]:
     return fake_bis
 
 
-@dataclass
-class BI:
+@dataclass(init=False, repr=False, eq=False)
+class BI(_SlotsObject):
     symbol: str
-    fx_a: FX    # 笔开始的分型
-    fx_b: FX    # 笔结束的分型
-    fxs: List   # 笔内部的分型列表
+    fx_a: FX  # 笔开始的分型
+    fx_b: FX  # 笔结束的分型
+    fxs: List  # 笔内部的分型列表
     direction: Direction
-    bars: List[NewBar] = field(default_factory=list)
-    cache: dict = field(default_factory=dict)  # cache 用户缓存
+    bars: List[NewBar]
+    cache: dict  # cache 用户缓存
 
-    def __post_init__(self):
-        self.sdt = self.fx_a.dt
-        self.edt = self.fx_b.dt
+    __slots__ = ("symbol", "fx_a", "fx_b", "fxs", "direction", "bars", "_cache", "sdt", "edt")
+    _fields = ("symbol", "fx_a", "fx_b", "fxs", "direction", "bars", "cache")
+
+    def __init__(self, symbol: str, fx_a: FX, fx_b: FX, fxs: List, direction: Direction,
+                 bars: List[NewBar] = None, cache: dict = None):
+        self.symbol = symbol
+        self.fx_a = fx_a
+        self.fx_b = fx_b
+        self.fxs = fxs
+        self.direction = direction
+        self.bars = bars if bars is not None else []
+        self._cache = cache
+        self.sdt = fx_a.dt
+        self.edt = fx_b.dt
+
+    @property
+    def __dict__(self):
+        return dict(zip(self._fields, self._values()), sdt=self.sdt, edt=self.edt)
 
     def __repr__(self):
         return (
@@ -750,6 +876,257 @@ class Event:
         return e
 
 
+class SignalsMatcher:
+    """信号匹配引擎：将 Event / Factor 中的信号编译为整数编号，在每根K线上共享匹配结果
+
+    1. 相同的信号只编译一次，信号名称、信号取值和得分阈值在编译时解析，任意 记为 None；
+    2. 信号构成相同的事件只编译一次，不同持仓策略中的相同事件共用同一个编号；
+    3. 同一个信号字典中，每个信号名称的取值只解析一次，每个信号、每个事件的匹配结果只计算一次，
+        在所有事件和持仓策略之间共享；
+    4. 匹配逻辑与 Signal.is_match、Factor.is_match、Event.is_match 完全一致。
+    """
+
+    def __init__(self):
+        self.slots = {}  # 信号 -> 编号
+        self.keys = []  # 信号编号 -> 信号名称
+        self.rules = []  # 信号编号 -> (v1, v2, v3, score)
+        self.event_slots = {}  # 事件结构 -> 编号
+        self.event_rules = []  # 事件编号 -> (signals_not, signals_all, signals_any, factors)
+        self._values = {}
+        self._reset(None)
+        self._reset_frame(None)
+
+    def __getstate__(self):
+        return self.slots, self.keys, self.rules, self.event_slots, self.event_rules
+
+    def __setstate__(self, state):
+        self.slots, self.keys, self.rules, self.event_slots, self.event_rules = state
+        self._values = {}
+        self._reset(None)
+        self._reset_frame(None)
+
+    def _reset(self, s):
+        self._s = s
+        self._dt = s.get("dt") if s is not None else None
+        self._results = [None] * len(self.keys)
+        self._event_results = [None] * len(self.event_rules)
+        self._tokens = {}
+        if len(self._values) > 100000:
+            self._values = {}
+
+    def add_signal(self, signal: Signal) -> int:
+        """编译单个信号，返回信号编号"""
+        i = self.slots.get(signal.signal)
+        if i is None:
+            i = len(self.keys)
+            self.slots[signal.signal] = i
+            self.keys.append(signal.key)
+            values = [None if v == "任意" else v for v in (signal.v1, signal.v2, signal.v3)]
+            self.rules.append((*values, signal.score))
+            self._results.append(None)
+        return i
+
+    def add_event(self, event: Event) -> tuple:
+        """编译事件，返回 (事件编号, event)"""
+
+        def __signals(signals):
+            return tuple(self.add_signal(x) for x in signals or [])
+
+        factors = tuple(
+            (__signals(f.signals_not), __signals(f.signals_all), __signals(f.signals_any), f.name)
+            for f in event.factors
+        )
+        rule = (__signals(event.signals_not), __signals(event.signals_all), __signals(event.signals_any), factors)
+        i = self.event_slots.get(rule)
+        if i is None:
+            i = len(self.event_rules)
+            self.event_slots[rule] = i
+            self.event_rules.append(rule)
+            self._event_results.append(None)
+        return i, event
+
+    def _match(self, i: int) -> bool:
+        r = self._results[i]
+        if r is None:
+            key = self.keys[i]
+            tokens = self._tokens.get(key)
+            if tokens is None:
+                v = self._s.get(key, None)
+                if not v:
+                    raise ValueError(f"{key} 不在信号列表中")
+                tokens = self._values.get(v)
+                if tokens is None:
+                    v1, v2, v3, score = v.split("_")
+                    tokens = self._values[v] = (v1, v2, v3, int(score))
+                self._tokens[key] = tokens
+
+            v1, v2, v3, score = self.rules[i]
+            r = (
+                tokens[3] >= score
+                and (v1 is None or v1 == tokens[0])
+                and (v2 is None or v2 == tokens[1])
+                and (v3 is None or v3 == tokens[2])
+            )
+            self._results[i] = r
+        return r
+
+    def _check(self, signals_not, signals_all, signals_any) -> bool:
+        for i in signals_not:
+            if self._match(i):
+                return False
+        for i in signals_all:
+            if not self._match(i):
+                return False
+        if signals_any:
+            for i in signals_any:
+                if self._match(i):
+                    return True
+            return False
+        return True
+
+    def _match_event(self, i: int):
+        """返回事件满足的因子名称，事件不满足时返回空字符串"""
+        r = self._event_results[i]
+        if r is None:
+            r = ""
+            signals_not, signals_all, signals_any, factors = self.event_rules[i]
+            if self._check(signals_not, signals_all, signals_any):
+                for f_not, f_all, f_any, name in factors:
+                    if self._check(f_not, f_all, f_any):
+                        r = name
+                        break
+            self._event_results[i] = r
+        return r
+
+    def _reset_frame(self, df):
+        self._df = df
+        self._frame_tokens = {}
+        self._frame_results = {}
+        self._frame_event_results = {}
+
+    def _frame_match(self, i: int) -> np.ndarray:
+        r = self._frame_results.get(i)
+        if r is None:
+            key = self.keys[i]
+            tokens = self._frame_tokens.get(key)
+            if tokens is None:
+                if key not in self._df.columns:
+                    raise ValueError(f"{key} 不在信号列表中")
+                # 每个信号名称只解析不重复的信号值
+                codes, uniques = pd.factorize(self._df[key])
+                if (codes < 0).any() or any(not v for v in uniques):
+                    raise ValueError(f"{key} 不在信号列表中")
+                values = [v.split("_") for v in uniques]
+                tokens = (
+                    codes,
+                    np.array([v[0] for v in values], dtype=object),
+                    np.array([v[1] for v in values], dtype=object),
+                    np.array([v[2] for v in values], dtype=object),
+                    np.array([int(v[3]) for v in values]),
+                )
+                self._frame_tokens[key] = tokens
+
+            codes, v1s, v2s, v3s, scores = tokens
+            v1, v2, v3, score = self.rules[i]
+            m = scores >= score
+            if v1 is not None:
+                m &= v1s == v1
+            if v2 is not None:
+                m &= v2s == v2
+            if v3 is not None:
+                m &= v3s == v3
+            r = self._frame_results[i] = m[codes]
+        return r
+
+    def _frame_check(self, signals_not, signals_all, signals_any) -> np.ndarray:
+        m = np.ones(len(self._df), dtype=bool)
+        for i in signals_not:
+            m &= ~self._frame_match(i)
+        for i in signals_all:
+            m &= self._frame_match(i)
+        if signals_any:
+            m_any = np.zeros(len(self._df), dtype=bool)
+            for i in signals_any:
+                m_any |= self._frame_match(i)
+            m &= m_any
+        return m
+
+    def _frame_match_event(self, i: int) -> np.ndarray:
+        """返回每一行满足的第一个因子的序号，不满足时为 -1"""
+        r = self._frame_event_results.get(i)
+        if r is None:
+            signals_not, signals_all, signals_any, factors = self.event_rules[i]
+            r = np.full(len(self._df), -1, dtype=int)
+            left = self._frame_check(signals_not, signals_all, signals_any)
+            for k, (f_not, f_all, f_any, _) in enumerate(factors):
+                if not left.any():
+                    break
+                m = left & self._frame_check(f_not, f_all, f_any)
+                r[m] = k
+                left &= ~m
+            self._frame_event_results[i] = r
+        return r
+
+    def frame_columns(self, columns: List[str]) -> List[list]:
+        """以 Python 列表的形式返回当前信号 DataFrame 中的列，结果在所有持仓策略之间共享"""
+        res = []
+        for col in columns:
+            values = self._frame_tokens.get(("column", col))
+            if values is None:
+                values = self._frame_tokens[("column", col)] = self._df[col].tolist()
+            res.append(values)
+        return res
+
+    def match_frame(self, events: List[tuple], df: pd.DataFrame):
+        """在信号 DataFrame 上按列批量匹配编译后的事件，每一行的结果与 match_events 一致
+
+        :param events: add_event 返回的编译结果列表
+        :param df: 信号 DataFrame，每一行是一个信号字典
+        :return: (event_index, factor_index)，分别是每一行满足的第一个事件在 events 中的序号、
+            该事件满足的第一个因子的序号，不满足时为 -1
+        """
+        if df is not self._df:
+            self._reset_frame(df)
+
+        event_index = np.full(len(df), -1, dtype=int)
+        factor_index = np.full(len(df), -1, dtype=int)
+        for j, (i, _) in enumerate(events):
+            left = event_index < 0
+            if not left.any():
+                break
+            fi = self._frame_match_event(i)
+            m = left & (fi >= 0)
+            event_index[m] = j
+            factor_index[m] = fi[m]
+        return event_index, factor_index
+
+    def match_frame_each(self, events: List[tuple], df: pd.DataFrame) -> List[np.ndarray]:
+        """在信号 DataFrame 上按列批量匹配编译后的事件，每个事件独立匹配，结果与 Event.is_match 一致
+
+        :param events: add_event 返回的编译结果列表
+        :param df: 信号 DataFrame，每一行是一个信号字典
+        :return: 与 events 一一对应的列表，元素是每一行满足的第一个因子的序号，不满足时为 -1
+        """
+        if df is not self._df:
+            self._reset_frame(df)
+        return [self._frame_match_event(i) for i, _ in events]
+
+    def match_events(self, events: List[tuple], s: dict):
+        """按顺序匹配编译后的事件，返回第一个满足的事件及其满足的因子名称；都不满足时返回 (None, None)
+
+        :param events: add_event 返回的编译结果列表
+        :param s: 信号字典
+        """
+        if s is not self._s or s.get("dt") != self._dt:
+            self._reset(s)
+
+        for i, event in events:
+            name = self._match_event(i)
+            if name:
+                return event, name
+        return None, None
+
+
 def cal_break_even_point(seq: List[float]) -> float:
     """计算单笔收益序列的盈亏平衡点
 
@@ -826,12 +1203,25 @@ class Position:
         self.last_so_dt = None  # 最近一次开空交易的时间
         self.end_dt = None  # 最近一次信号传入的时间
 
+        # 编译后的事件，在第一次 update 时编译
+        self._matcher = None
+        self._compiled_events = None
+
     def __repr__(self):
         return (
             f"Position(name={self.name}, symbol={self.symbol}, opens={[x.name for x in self.opens]}, "
             f"timeout={self.timeout}, stop_loss={self.stop_loss}BP, T0={self.T0}, interval={self.interval}s)"
         )
 
+    def compile(self, matcher: SignalsMatcher = None):
+        """编译所有事件的信号匹配逻辑
+
+        :param matcher: 信号匹配引擎，多个持仓策略共用同一个 matcher 时，每根K线上相同信号只匹配一次；
+            默认为 None，表示创建一个新的 matcher
+        """
+        self._matcher = matcher if matcher is not None else SignalsMatcher()
+        self._compiled_events = [self._matcher.add_event(event) for event in self.events]
+
     @property
     def unique_signals(self) -> List[str]:
         """获取所有事件的唯一信号列表"""
@@ -1025,7 +1415,8 @@ class Position:
 
         - 首先，检查最新信号的时间是否在上次信号之前，如果是则打印警告信息并返回。
         - 初始化一些变量，包括操作类型（op）和操作描述（op_desc）。
-        - 遍历所有的事件，检查是否与最新信号匹配。如果匹配，则记录操作类型和操作描述，并跳出循环。
+        - 遍历所有的事件，检查是否与最新信号匹配。如果匹配，则记录操作类型和操作描述，并跳出循环；
+          事件的匹配使用编译后的 SignalsMatcher 完成，结果与 Event.is_match 一致。
         - 提取最新信号的相关信息，包括交易对符号、时间、价格和成交量。
         - 更新持仓状态的结束时间为最新信号的时间。
         - 如果操作类型是开仓（LO或SO），更新最后一个事件的信息。
@@ -1053,17 +1444,63 @@ class Position:
             logger.warning(f"请检查信号传入：最新信号时间{s['dt']}在上次信号时间{self.end_dt}之前")
             return
 
-        self.pos_changed = False
         op = Operate.HO
         op_desc = ""
-        for event in self.events:
-            m, f = event.is_match(s)
-            if m:
-                op = event.operate
-                op_desc = f"{event.name}@{f}"
-                break
+        if getattr(self, "_compiled_events", None) is None:
+            self.compile()
+        event, f = self._matcher.match_events(self._compiled_events, s)
+        if event is not None:
+            op = event.operate
+            op_desc = f"{event.name}@{f}"
+
+        self.__update_state(op, op_desc, s["symbol"], s["dt"], s["close"], s["id"])
 
-        symbol, dt, price, bid = s["symbol"], s["dt"], s["close"], s["id"]
+    def update_frame(self, sigs: pd.DataFrame):
+        """使用信号 DataFrame 批量更新持仓状态，结果与逐行调用 update 一致
+
+        事件的匹配在整个 DataFrame 上按列完成，逐行执行的只有仓位状态的更新（interval、T0、止损、超时等）。
+
+        :param sigs: 信号 DataFrame，必须包含 symbol, dt, close, id 列以及事件用到的全部信号列，按 dt 升序排列
+        """
+        if getattr(self, "_compiled_events", None) is None:
+            self.compile()
+        event_index, factor_index = self._matcher.match_frame(self._compiled_events, sigs)
+
+        descs = {}
+        holds = self.holds
+        symbols, dts, prices, bids = self._matcher.frame_columns(["symbol", "dt", "close", "id"])
+        for symbol, dt, price, bid, ei, fi in zip(symbols, dts, prices, bids, event_index.tolist(), factor_index.tolist()):
+            if self.end_dt and dt <= self.end_dt:
+                logger.warning(f"请检查信号传入：最新信号时间{dt}在上次信号时间{self.end_dt}之前")
+                continue
+
+            if ei < 0:
+                # 没有事件触发，并且不会触发止损、超时的情况下，仓位状态不会发生变化
+                pos = self.pos
+                if pos != 0:
+                    last_price, last_bid = self.last_event["price"], self.last_event["bid"]
+                    if pos == 1:
+                        stop = price / last_price - 1 < -self.stop_loss / 10000
+                    else:
+                        stop = 1 - price / last_price < -self.stop_loss / 10000
+                    if stop or bid - last_bid > self.timeout:
+                        self.__update_state(Operate.HO, "", symbol, dt, price, bid)
+                        continue
+
+                self.pos_changed = False
+                self.end_dt = dt
+                holds.append({"dt": dt, "pos": pos, "price": price})
+                continue
+
+            op_desc = descs.get((ei, fi))
+            if op_desc is None:
+                i, event = self._compiled_events[ei]
+                op_desc = descs[(ei, fi)] = f"{event.name}@{self._matcher.event_rules[i][3][fi][3]}"
+            self.__update_state(self._compiled_events[ei][1].operate, op_desc, symbol, dt, price, bid)
+
+    def __update_state(self, op: Operate, op_desc: str, symbol, dt, price, bid):
+        """根据事件匹配的结果更新仓位状态"""
+        self.pos_changed = False
         self.end_dt = dt
 
         # 当有新的开仓 event 发生，更新 last_event
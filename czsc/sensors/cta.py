@@ -6,13 +6,12 @@ create_dt: 2023/5/27 22:42
 describe: CTA研究模块
 """
 import os
-import czsc
-import glob
 import hashlib
 import pandas as pd
 from loguru import logger
 from tqdm import tqdm
 from czsc.traders.dummy import DummyBacktest
+from czsc.utils.io import save_parquet, save_pkl, read_pkl
 from concurrent.futures import ProcessPoolExecutor, as_completed
 
 pd.set_option('expand_frame_repr', False)
@@ -88,20 +87,41 @@ class CTAResearch:
                             strategy=self.strategy, read_bars=self.read_bars, sdt=sdt, edt=edt)
         bot.execute(symbols=symbols, n_jobs=max_workers, **kwargs)
 
-    def _symbol_backtest(self, symbol, trader_path, bar_sdt='20180101', sdt='20200101', edt='20220101'):
+    def _symbol_backtest(self, symbol, path, bar_sdt='20180101', sdt='20200101', edt='20220101'):
+        """单品种 on bar 回测，结果写入 path 下按品种分区的文件
+
+        - pairs/{symbol}.parquet: 所有策略的交易对，用 pos_name 列区分策略
+        - holds/{symbol}.parquet: 所有策略的持仓，用 pos_name 列区分策略
+        - stats/{symbol}.pkl: 所有策略的 pos.evaluate() 结果，最后写入，作为该品种回测完成的标记
+        """
         try:
             tactic = self.strategy(symbol=symbol, **self.kwargs)
             bars = self.read_bars(symbol, tactic.base_freq, bar_sdt, edt, fq='后复权')
             _trader = tactic.backtest(bars, sdt=sdt)
+            stats, pairs, holds = [], [], []
             for _pos in _trader.positions:
-                logger.info(f"{symbol} {_pos.name} {_pos.evaluate()}")
-            czsc.dill_dump(_trader, os.path.join(trader_path, f"{symbol}.trader"))
+                p = _pos.evaluate()
+                logger.info(f"{symbol} {_pos.name} {p}")
+                stats.append(p)
+                pairs.append(pd.DataFrame(_pos.pairs).assign(pos_name=_pos.name))
+                holds.append(pd.DataFrame(_pos.holds).assign(symbol=symbol, pos_name=_pos.name))
+
+            pairs = [x for x in pairs if len(x) > 0]
+            if pairs:
+                save_parquet(pd.concat(pairs, ignore_index=True), os.path.join(path, 'pairs', f"{symbol}.parquet"))
+            holds = [x for x in holds if len(x) > 0]
+            if holds:
+                save_parquet(pd.concat(holds, ignore_index=True), os.path.join(path, 'holds', f"{symbol}.parquet"))
+            save_pkl(stats, os.path.join(path, 'stats', f"{symbol}.pkl"))
         except Exception as e:
             logger.exception(e)
 
     def backtest(self, symbols, max_workers=3, **kwargs):
         """多进程执行 on bar 回测
 
+        每个品种回测完成后立即将交易对、持仓和绩效评估结果写入按品种分区的文件，不再保存 CzscTrader 对象；
+        中断后使用相同的参数重新运行，已完成的品种直接跳过，绩效汇总直接读取分区文件得到。
+
         :param symbols: 标的代码列表
         :param max_workers: 最大进程数
         :return: None
@@ -112,24 +132,25 @@ class CTAResearch:
         msg = f"回测时间范围：{sdt} - {edt}, bar_sdt={bar_sdt}, max_workers={max_workers}, symbols={symbols}"
         path = os.path.join(self.results_path, f'backtest_{hashlib.sha256(msg.encode()).hexdigest()[:8].upper()}')
         logger.info(f"回测结果保存路径：{path}, 回测配置：{msg}")
-        trader_path = os.path.join(path, 'traders')
-        os.makedirs(trader_path, exist_ok=True)
+        for name in ['pairs', 'holds', 'stats']:
+            os.makedirs(os.path.join(path, name), exist_ok=True)
 
+        todo = [x for x in symbols if not os.path.exists(os.path.join(path, 'stats', f"{x}.pkl"))]
+        logger.info(f"共有{len(symbols)}个品种，已完成{len(symbols) - len(todo)}个，待回测{len(todo)}个")
         if max_workers <= 1:
-            for _symbol in tqdm(symbols, desc="On Bar 回测进度"):
-                self._symbol_backtest(_symbol, trader_path, bar_sdt, sdt, edt)
+            for _symbol in tqdm(todo, desc="On Bar 回测进度"):
+                self._symbol_backtest(_symbol, path, bar_sdt, sdt, edt)
         else:
             with ProcessPoolExecutor(max_workers=max_workers) as executor:
-                tasks = [executor.submit(self._symbol_backtest, symbol, trader_path, bar_sdt, sdt, edt)
-                         for symbol in symbols]
+                tasks = [executor.submit(self._symbol_backtest, symbol, path, bar_sdt, sdt, edt) for symbol in todo]
                 for future in tqdm(as_completed(tasks), desc="On Bar 回测进度", total=len(tasks)):
                     future.result()
 
         stats = []
-        for file in glob.glob(f"{trader_path}/*.trader"):
-            trader = czsc.dill_load(file)
-            for pos in trader.positions:
-                stats.append(pos.evaluate())
+        for symbol in symbols:
+            file = os.path.join(path, 'stats', f"{symbol}.pkl")
+            if os.path.exists(file):
+                stats.extend(read_pkl(file))
 
         dfs = pd.DataFrame(stats)
         file_stats = os.path.join(path, f"{self.strategy.__name__}回测绩效汇总.xlsx")
@@ -7,14 +7,15 @@ describe: Event 相关的传感器
 """
 import os
 import shutil
+import numpy as np
 import pandas as pd
 from copy import deepcopy
 from loguru import logger
-from czsc.objects import Event
+from czsc.objects import Event, SignalsMatcher
 from typing import List, Dict, Callable, Any, Union
 from czsc.traders.sig_parse import get_signals_freqs
 from czsc.traders.base import generate_czsc_signals
-from czsc.utils.io import save_json
+from czsc.utils.io import save_json, read_json, save_parquet
 from concurrent.futures import ProcessPoolExecutor, as_completed
 
 
@@ -36,6 +37,10 @@ class EventMatchSensor:
             - max_workers: 读取K线数据的函数的最大进程数
             - signals_module: 信号解析模块，如：czsc.signals
             - results_path: 事件匹配结果的保存路径
+            - refresh: 是否清空 results_path 重新计算，默认为 False
+
+        每个标的的匹配结果在完成后立即写入 results_path/data/{symbol}.parquet，不在内存中合并所有标的的数据；
+        中断后重新运行时，已有结果的标的直接跳过；截面匹配次数从分区文件中逐个标的累加得到。
 
         """
         self.symbols = symbols
@@ -49,7 +54,14 @@ class EventMatchSensor:
             shutil.rmtree(self.results_path)
             logger.warning(f"文件夹 {self.results_path} 已存在，程序将覆盖该文件夹下的所有文件")
         os.makedirs(self.results_path, exist_ok=True)
-        save_json({e.name: e.dump() for e in self.events}, os.path.join(self.results_path, "events.json"))
+        self.data_path = os.path.join(self.results_path, "data")
+        file_events = os.path.join(self.results_path, "events.json")
+        events_dump = {e.name: e.dump() for e in self.events}
+        if os.path.exists(file_events) and read_json(file_events) != events_dump and os.path.exists(self.data_path):
+            shutil.rmtree(self.data_path)
+            logger.warning(f"事件配置发生变化，已删除 {self.data_path} 下的历史匹配结果")
+        os.makedirs(self.data_path, exist_ok=True)
+        save_json(events_dump, file_events)
 
         logger.add(os.path.join(self.results_path, "event_match_sensor.log"), rotation="1 day", encoding="utf-8")
         logger.info(f"事件匹配传感器初始化，共有{len(self.events)}个事件，{len(self.symbols)}个标的")
@@ -69,13 +81,8 @@ class EventMatchSensor:
 
         self.kwargs = kwargs
         logger.info(f"事件匹配传感器初始化完成，共有{len(self.events)}个事件，{len(self.symbols)}个标的")
-        file_data = os.path.join(self.results_path, "data.feather")
-        if os.path.exists(file_data):
-            self.data = pd.read_feather(file_data)
-            logger.info(f"读取事件匹配数据：{file_data}")
-        else:
-            self.data = self._multi_symbols(self.symbols, max_workers=self.kwargs.pop("max_workers", 1))
-            self.data.to_feather(os.path.join(self.results_path, "data.feather"))
+        self._multi_symbols(self.symbols, max_workers=self.kwargs.pop("max_workers", 1))
+        self.counts = self._cross_section_counts()
 
         _res = []
         for event_name in self.events_name:
@@ -121,49 +128,91 @@ class EventMatchSensor:
         2. 使用 generate_czsc_signals 函数生成 CZSC 信号。这里传入了 bars、复制后的
            signals_config（以防止修改原始配置）、开始时间（self.sdt）以及 df=False（表示返回一个字典列表而非 DataFrame 对象）。
         3. 将上一步生成的信号转换为 DataFrame 并保存到 sigs 变量中。
-        4. 创建一个新的 events 复制品（以防止修改原始事件列表），并创建一个空列表 new_cols，用于存储新添加的列名。
-        5. 遍历新的 events 列表，对于每个 event：
-            a. 获取 event 的名称 e_name。
-            b. 使用 apply 函数应用 is_match 方法来判断每行数据是否与该事件相匹配。
-                结果是一个布尔值和一个 float 值（表示匹配得分），它们分别被保存为 e_name 和 f'{e_name}_F' 列。
-            c. 将这两个新列名添加到 new_cols 列表中。
+        4. 使用 SignalsMatcher 编译所有事件，将信号值的精确匹配、任意 通配和得分阈值转换为信号列上的向量化比较，
+            一次性得到所有事件在所有行上的匹配结果，与逐行调用 Event.is_match 的结果一致。
+        5. 每个事件的匹配结果保存为两列：e_name 列为是否匹配（bool），f'{e_name}_F' 列为满足的第一个因子名称，不满足时为 None。
         6. 在 sigs 数据框中添加一列 n1b，表示涨跌幅。
-        7. 最后，重新组织 sigs 数据框的列顺序，使其包含以下列：symbol、dt、open、close、high、low、vol、amount、n1b 以及所有新添加的列。
+        7. 最后，重新组织 sigs 数据框的列顺序，使其包含以下列：symbol、dt、open、close、high、low、vol、amount、n1b 以及所有事件的匹配列。
 
         """
         try:
             bars = self.read_bars(symbol, freq=self.base_freq, sdt=self.bar_sdt, edt=self.edt, **self.kwargs)
             sigs = generate_czsc_signals(bars, deepcopy(self.signals_config), sdt=self.sdt, df=False)
             sigs = pd.DataFrame(sigs)
-            events = deepcopy(self.events)
-            new_cols = []
-            for event in events:
-                e_name = event.name
-                sigs[[e_name, f'{e_name}_F']] = sigs.apply(event.is_match, axis=1, result_type="expand")  # type: ignore
-                new_cols.extend([e_name, f'{e_name}_F'])
-            sigs['n1b'] = (sigs['close'].shift(-1) / sigs['close'] - 1) * 10000
-            sigs = sigs[['symbol', 'dt', 'open', 'close', 'high', 'low', 'vol', 'amount', 'n1b'] + new_cols]  # type: ignore
+
+            # 所有事件编译后按列批量匹配，相同的信号在所有事件之间只解析、比较一次
+            matcher = SignalsMatcher()
+            events = [matcher.add_event(event) for event in self.events]
+            block = {}
+            for (_, event), fi in zip(events, matcher.match_frame_each(events, sigs)):
+                names = np.array([factor.name for factor in event.factors] + [None], dtype=object)
+                block[event.name] = fi >= 0
+                block[f'{event.name}_F'] = names[fi]
+
+            cols = ['symbol', 'dt', 'open', 'close', 'high', 'low', 'vol', 'amount']
+            sigs = sigs[cols].assign(n1b=(sigs['close'].shift(-1) / sigs['close'] - 1) * 10000)
+            sigs = pd.concat([sigs, pd.DataFrame(block, index=sigs.index)], axis=1)
             return sigs
         except Exception as e:
             logger.error(f"{symbol} 事件匹配失败：{e}")
             return pd.DataFrame()
 
+    def _symbol_file(self, symbol):
+        return os.path.join(self.data_path, f"{symbol}.parquet")
+
+    def _save_single_symbol(self, symbol) -> int:
+        """单个symbol的事件匹配，结果写入分区文件，返回匹配结果的行数；匹配失败时不写入，下次运行时重新计算"""
+        df = self._single_symbol(symbol)
+        if df.empty:
+            return 0
+        for event_name in self.events_name:
+            df[event_name] = df[event_name].astype(int)
+        save_parquet(df, self._symbol_file(symbol))
+        return len(df)
+
     def _multi_symbols(self, symbols: List[str], max_workers=1):
-        """多个symbol的事件匹配"""
-        logger.info(f"开始事件匹配，共有{len(symbols)}个标的，max_workers={max_workers}")
-        dfs = []
+        """多个symbol的事件匹配，每个标的完成后立即写入分区文件，已有结果的标的直接跳过"""
+        todo = [symbol for symbol in symbols if not os.path.exists(self._symbol_file(symbol))]
+        logger.info(f"开始事件匹配，共有{len(symbols)}个标的，待匹配{len(todo)}个，max_workers={max_workers}")
         if max_workers == 1:
-            for symbol in symbols:
-                dfs.append(self._single_symbol(symbol))
+            for symbol in todo:
+                self._save_single_symbol(symbol)
         else:
             with ProcessPoolExecutor(max_workers) as executor:
-                futures = [executor.submit(self._single_symbol, symbol) for symbol in symbols]
+                futures = [executor.submit(self._save_single_symbol, symbol) for symbol in todo]
                 for future in as_completed(futures):
-                    dfs.append(future.result())
-        df = pd.concat(dfs, ignore_index=True)
-        for event_name in self.events_name:
-            df[event_name] = df[event_name].astype(int)
-        return df
+                    future.result()
+
+    @property
+    def files(self) -> List[str]:
+        """所有标的的匹配结果文件"""
+        files = [self._symbol_file(symbol) for symbol in self.symbols]
+        return [file for file in files if os.path.exists(file)]
+
+    @property
+    def data(self) -> pd.DataFrame:
+        """所有标的的事件匹配数据；每次访问都从分区文件中读取并合并，数据量较大时请使用 read_data 读取部分列"""
+        return self.read_data()
+
+    def read_data(self, columns=None) -> pd.DataFrame:
+        """从分区文件中读取所有标的的事件匹配数据
+
+        :param columns: 读取的列，默认读取所有列
+        """
+        dfs = [pd.read_parquet(file, columns=columns) for file in self.files]
+        return pd.concat(dfs, ignore_index=True) if dfs else pd.DataFrame(columns=columns)
+
+    def _cross_section_counts(self) -> pd.DataFrame:
+        """逐个标的读取分区文件，累加得到每个时间点上每个事件的匹配次数，index 为 dt，columns 为事件名称"""
+        counts = None
+        for file in self.files:
+            df = pd.read_parquet(file, columns=["dt"] + self.events_name)
+            df = df.groupby("dt")[self.events_name].sum()
+            counts = df if counts is None else counts.add(df, fill_value=0)
+
+        if counts is None:
+            return pd.DataFrame(columns=self.events_name, index=pd.DatetimeIndex([], name="dt"), dtype=int)
+        return counts.sort_index().astype(int)
 
     def get_event_csc(self, event_name: str):
         """获取事件的截面匹配次数
@@ -172,18 +221,11 @@ class EventMatchSensor:
 
         函数执行逻辑：
 
-        1. 创建一个 self.data 的副本 df。
-        2. 在 df 中筛选出 event_name 列等于 1 的行。
-        3. 使用 groupby 方法按 symbol 和 dt 对筛选后的数据进行分组，并计算 event_name 列的总和。
-            结果将形成一个新的 DataFrame，其中索引为 (symbol, dt) 组合，只有一个列 event_name，表示每个组合的匹配次数。
-        4. 再次使用 groupby 方法按 dt 对上一步的结果进行分组，并计算 event_name 列的总和。这次得到的新 DataFrame
-            只有一个列 event_name，表示在每个时间点所有标的的事件匹配总数。
+        1. 从 self.counts 中读取 event_name 列，self.counts 是逐个标的累加得到的每个时间点上每个事件的匹配次数。
+        2. 筛选出匹配次数大于 0 的时间点，返回 dt 和 event_name 两列，表示在每个时间点所有标的的事件匹配总数。
 
         :param event_name: 事件名称
         :return: DataFrame
         """
-        df = self.data.copy()
-        df = df[df[event_name] == 1]
-        df = df.groupby(["symbol", "dt"])[event_name].sum().reset_index()
-        df = df.groupby("dt")[event_name].sum().reset_index()
-        return df
+        df = self.counts[self.counts[event_name] > 0]
+        return df[[event_name]].reset_index()
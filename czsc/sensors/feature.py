@@ -6,6 +6,7 @@ create_dt: 2023/7/15 13:42
 describe: 特征分析相关的传感器
 """
 import os
+import numpy as np
 import pandas as pd
 from tqdm import tqdm
 from loguru import logger
@@ -17,6 +18,9 @@ from concurrent.futures import ProcessPoolExecutor, as_completed
 class FixedNumberSelector:
     """选择固定数量（等权）的交易品种
 
+    打分数据只在初始化时转换一次 dt × symbol 矩阵，每期的 topk 选择、调仓和手续费计算都在矩阵的行上用 NumPy 完成；
+    score 相同的品种按其在 dfs 中的先后顺序排序。
+
     可优化项：
     1. 传入 res_path, 将分析过程和分析结果保存下来
     2. 支持传入大盘择时信号，例如：大盘择时信号为空头时，多头只平不开
@@ -56,80 +60,147 @@ class FixedNumberSelector:
         self.operate_fee = kwargs.get('operate_fee', 15)  # 单边手续费+交易滑点，单位：BP
         self.holds = {}  # 每期持有的品种
         self.operates = {}  # 每期操作的品种
-        for dt in self.dts:
-            self.__deal_one_time(dt)
+
+        # 逐期调仓只在 dt × symbol 矩阵的行上计算，每期的持仓和操作记录最后统一生成 DataFrame
+        self._hold_cols, self._buy_cols, self._sell_cols, self._edges = [], [], [], []
+        for i in range(len(self.dts)):
+            self.__deal_one_time(i)
+        self.__build_results()
 
     def __preprocess(self):
+        """将打分数据转换为 dt × symbol 矩阵，矩阵元素为打分数据中的行号，不存在时为 -1"""
         assert 'dt' in self.dfs.columns, "必须包含dt列"
         assert 'n1b' in self.dfs.columns, "必须包含n1b列"
         assert 'symbol' in self.dfs.columns, "必须包含symbol列"
         assert 'score' in self.dfs.columns, "必须包含score列, 这是选择交易品种的依据"
 
-        self.dfs['dt'] = pd.to_datetime(self.dfs['dt']).dt.strftime("%Y-%m-%d %H:%M:%S")
+        # 只对不重复的时间做格式化
+        dt_codes, dt_uniques = pd.factorize(pd.to_datetime(self.dfs['dt']))
+        self.dfs['dt'] = dt_uniques.strftime("%Y-%m-%d %H:%M:%S").to_numpy(dtype=object)[dt_codes]
         dts = sorted(self.dfs['dt'].unique())
         last_dt_map = {dt: dts[i-1] for i, dt in enumerate(dts)}
         self.dts, self.last_dt_map = dts, last_dt_map
-        self.score_map = {dt: dfg[['symbol', 'dt', 'open', 'close', 'high', 'low', 'score', 'n1b']].copy() for dt, dfg in self.dfs.groupby('dt')}
 
-    def __deal_one_time(self, dt):
+        self._data = self.dfs[['symbol', 'dt', 'open', 'close', 'high', 'low', 'score', 'n1b']]
+        dt_codes = pd.Index(dts).get_indexer(self._data['dt'])
+        symbol_codes, self._symbols = pd.factorize(self._data['symbol'])
+        rows = np.full((len(dts), len(self._symbols)), -1, dtype=np.int64)
+        rows[dt_codes, symbol_codes] = np.arange(len(self._data))
+        assert (rows >= 0).sum() == len(self._data), "dt 和 symbol 的组合必须唯一"
+        self._rows = rows
+
+        self._score = self._data['score'].to_numpy(dtype=float)
+        self._close = self._data['close'].to_numpy()
+        self._n1b = self._data['n1b'].to_numpy()
+        if self.is_stocks:
+            o, c, h, l = [self._data[x].to_numpy() for x in ['open', 'close', 'high', 'low']]
+            self._zt_mask = (c == h) & (h >= o)
+            self._dt_mask = (c == l) & (l <= o)
+
+    def __sort(self, cols, rows, k=None):
+        """按 score 降序（空值排在最后）对品种排序，score 相同的品种按打分数据中的行号排序；k 不为空时用 argpartition 只取前 k 个
+
+        :param cols: 品种在矩阵中的列号
+        :param rows: 当期所有品种在打分数据中的行号
+        :param k: 返回的品种数量，默认返回全部
+        """
+        score = self._score[rows[cols]]
+        key = np.where(np.isnan(score), -np.inf, score)
+        if k is not None and k < len(cols):
+            if k <= 0:
+                return cols[:0]
+            # 只保留大于等于第 k 大的值的品种，并列的品种全部保留，排序后再截取
+            m = key >= np.partition(key, len(key) - k)[len(key) - k]
+            cols, score, key = cols[m], score[m], key[m]
+        order = np.lexsort((rows[cols], -key, np.isnan(score)))
+        return cols[order] if k is None else cols[order][:k]
+
+    def __deal_one_time(self, i):
         """单次调整记录"""
         k, d, is_stocks = self.k, self.d, self.is_stocks
+        dt = self.dts[i]
+        rows = self._rows[i]
+        present = rows >= 0
 
-        score = self.score_map[dt]
         if is_stocks:
-            zt_symbols = [x['symbol'] for _, x in score.iterrows() if x['close'] == x['high'] >= x['open']]
-            dt_symbols = [x['symbol'] for _, x in score.iterrows() if x['close'] == x['low'] <= x['open']]
-            score_a = score[~score.symbol.isin(zt_symbols + dt_symbols)].copy()
-            logger.info(f"A股今日{dt}涨停{len(zt_symbols)}个品种，跌停{len(dt_symbols)}个品种，已跳过")
+            zt = np.zeros(len(rows), dtype=bool)
+            zt[present] = self._zt_mask[rows[present]]
+            dt_ = np.zeros(len(rows), dtype=bool)
+            dt_[present] = self._dt_mask[rows[present]]
+            valid = present & ~zt & ~dt_
+            logger.info(f"A股今日{dt}涨停{zt.sum()}个品种，跌停{dt_.sum()}个品种，已跳过")
         else:
-            score_a = score.copy()
+            valid = present
+        cand = np.flatnonzero(valid)
 
-        if not self.holds:
+        if i == 0:
             logger.info(f"当前持仓为空，选择前{k}个品种")
-            assert not self.operates, "当holds是空的时候，操作记录必须为空"
-
-            _df = score_a.sort_values(by='score', ascending=False).head(k)
-            _df['edge'] = _df['n1b'] - self.operate_fee
-            self.holds[dt] = _df
-
-            _df_operates = [{'symbol': row['symbol'], 'dt': dt, 'action': 'buy', 'price': row['close']} for _, row in _df.iterrows()]
-            self.operates[dt] = pd.DataFrame(_df_operates)
+            hold = self.__sort(cand, rows, k)
+            self._hold_cols.append(hold)
+            self._buy_cols.append(hold)
+            self._sell_cols.append(hold[:0])
+            self._edges.append(self._n1b[rows[hold]] - self.operate_fee)
             return
 
         # 有持仓的情况
-        score = self.score_map[dt]
-        last_dt = self.last_dt_map[dt]
-        last_holds = self.holds[last_dt].copy()
-        last_symbols = last_holds['symbol'].tolist()
-        skip_symbols = [x for x in last_symbols if x not in score['symbol'].tolist()]
-        if skip_symbols:
-            logger.warning(f"【数据缺陷提示】上一期持仓中，有{len(skip_symbols)}个品种，本期{dt}不在交易品种中，已跳过: {skip_symbols}")
-
-        topk_symbols = score_a.sort_values(by='score', ascending=False).head(k)['symbol'].tolist()
-        sell_symbols = score_a[score_a.symbol.isin(last_symbols)].sort_values(by='score', ascending=False).tail(d)['symbol'].tolist()
-        sell_symbols = [x for x in sell_symbols if x not in topk_symbols] + skip_symbols
-        keep_symbols = [x for x in last_symbols if x not in sell_symbols]
-        if len(keep_symbols) != k - len(sell_symbols):
-            logger.warning(f"保持品种数量不对，当前只有{len(keep_symbols)}个品种")
-
-        buy_symbols = score_a[~score_a.symbol.isin(keep_symbols)].sort_values(by='score', ascending=False).head(len(sell_symbols))['symbol'].tolist()
-        assert len(buy_symbols) == len(sell_symbols), "买入品种数量必须等于卖出品种数量"
-        assert len(keep_symbols + buy_symbols) == k, "保持品种数量+买入品种数量必须等于k"
-        _df = score[score.symbol.isin(keep_symbols + buy_symbols)].sort_values(by='score', ascending=False)
-
-        if len(_df) != k:
-            logger.warning(f"选择的品种数量不等于{k}，当前只有{len(_df)}个品种")
-
-        _df['edge'] = _df.apply(lambda row: row['n1b'] - self.operate_fee if row['symbol'] in buy_symbols else row['n1b'], axis=1)
-        self.holds[dt] = _df
+        last = self._hold_cols[i - 1]
+        skip = last[~present[last]]
+        if len(skip):
+            logger.warning(f"【数据缺陷提示】上一期持仓中，有{len(skip)}个品种，本期{dt}不在交易品种中，已跳过: "
+                           f"{self._symbols[skip].tolist()}")
+
+        is_topk = np.zeros(len(rows), dtype=bool)
+        is_topk[self.__sort(cand, rows, k)] = True
+        sell = self.__sort(last[valid[last]], rows)
+        sell = sell[max(len(sell) - d, 0):] if d > 0 else sell[:0]
+        sell = np.concatenate([sell[~is_topk[sell]], skip])
+        is_sell = np.zeros(len(rows), dtype=bool)
+        is_sell[sell] = True
+        keep = last[~is_sell[last]]
+        if len(keep) != k - len(sell):
+            logger.warning(f"保持品种数量不对，当前只有{len(keep)}个品种")
+
+        is_keep = np.zeros(len(rows), dtype=bool)
+        is_keep[keep] = True
+        buy = self.__sort(cand[~is_keep[cand]], rows, len(sell))
+        assert len(buy) == len(sell), "买入品种数量必须等于卖出品种数量"
+        assert len(keep) + len(buy) == k, "保持品种数量+买入品种数量必须等于k"
+        hold = self.__sort(np.concatenate([keep, buy]), rows)
+
+        if len(hold) != k:
+            logger.warning(f"选择的品种数量不等于{k}，当前只有{len(hold)}个品种")
+
+        is_buy = np.zeros(len(rows), dtype=bool)
+        is_buy[buy] = True
+        n1b = self._n1b[rows[hold]]
+        self._edges.append(np.where(is_buy[hold], n1b - self.operate_fee, n1b))
 
         # 平仓扣费，在上一期的持仓中，卖出的品种，需要扣除手续费
-        last_holds['edge'] = last_holds.apply(lambda row: row['edge'] - self.operate_fee if row['symbol'] in sell_symbols else row['edge'], axis=1)
-        self.holds[last_dt] = last_holds
-
-        _sell_operates = [{'symbol': row['symbol'], 'dt': dt, 'action': 'sell', 'price': row['close']}
-                          for _, row in score[score.symbol.isin(sell_symbols)].iterrows()]
-        _buy_operates = [{'symbol': row['symbol'], 'dt': dt, 'action': 'buy', 'price': row['close']}
-                         for _, row in score[score.symbol.isin(buy_symbols)].iterrows()]
-        _df_operates = pd.DataFrame(_sell_operates + _buy_operates)
-        self.operates[dt] = _df_operates
+        last_edge = self._edges[i - 1]
+        self._edges[i - 1] = np.where(is_sell[last], last_edge - self.operate_fee, last_edge)
+
+        self._hold_cols.append(hold)
+        self._buy_cols.append(buy)
+        self._sell_cols.append(sell[present[sell]])
+
+    def __build_results(self):
+        """根据每期的持仓、买入、卖出品种，生成 holds 和 operates"""
+        for i, dt in enumerate(self.dts):
+            rows = self._rows[i]
+            dfh = self._data.take(rows[self._hold_cols[i]])
+            dfh['edge'] = self._edges[i]
+            self.holds[dt] = dfh
+
+            # 第一期按 score 降序买入；之后的操作记录按打分数据中的顺序，先卖后买
+            buy_rows = rows[self._buy_cols[i]] if i == 0 else np.sort(rows[self._buy_cols[i]])
+            sell_rows = np.sort(rows[self._sell_cols[i]])
+            op_rows = np.concatenate([sell_rows, buy_rows])
+            if len(op_rows) == 0:
+                self.operates[dt] = pd.DataFrame([])
+                continue
+            self.operates[dt] = pd.DataFrame({
+                'symbol': self._data['symbol'].to_numpy()[op_rows],
+                'dt': dt,
+                'action': ['sell'] * len(sell_rows) + ['buy'] * len(buy_rows),
+                'price': self._close[op_rows],
+            })
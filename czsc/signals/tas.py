@@ -26,6 +26,8 @@ from czsc.objects import Signal, Direction, BI, RawBar, FX, Mark, ZS
 from czsc.traders.base import CzscSignals
 from czsc.utils import get_sub_elements, fast_slow_cross, count_last_same, create_single_signal, single_linear
 from czsc.utils.sig import cross_zero_axis, cal_cross_num, down_cross_count
+from czsc.utils.columnar import update_bars_cache, get_indicator_store, get_bars_values
+from czsc.utils.ta import IncrementalSMA, IncrementalEMA, IncrementalMACD, IncrementalRSI, IncrementalKDJ
 
 
 def update_ma_cache(c: CZSC, **kwargs):
@@ -37,6 +39,16 @@ def update_ma_cache(c: CZSC, **kwargs):
         - timeperiod: 计算周期
     :return: cache_key
     """
+    timeperiod = int(kwargs["timeperiod"])
+    ma_type = kwargs.get("ma_type", "SMA").upper()
+    cache_key = f"{ma_type}#{timeperiod}"
+
+    store = get_indicator_store(c)
+    if store is not None and ma_type in ("SMA", "EMA"):
+        # 增量计算，每根K线只计算一次
+        indicator = IncrementalSMA if ma_type == "SMA" else IncrementalEMA
+        return store.ensure(indicator(timeperiod, key=cache_key))
+
     ma_type_map = {
         "SMA": ta.MA_Type.SMA,
         "EMA": ta.MA_Type.EMA,
@@ -47,34 +59,24 @@ def update_ma_cache(c: CZSC, **kwargs):
         "MAMA": ta.MA_Type.MAMA,
         "TRIMA": ta.MA_Type.TRIMA,
     }
-    timeperiod = int(kwargs["timeperiod"])
-    ma_type = kwargs.get("ma_type", "SMA").upper()
     assert ma_type in ma_type_map.keys(), f"{ma_type} 不是支持的均线类型，可选值：{list(ma_type_map.keys())}"
 
-    cache_key = f"{ma_type}#{timeperiod}"
     if c.bars_raw[-1].cache and c.bars_raw[-1].cache.get(cache_key, None):
         # 如果最后一根K线已经有对应的缓存，不执行更新
         return cache_key
 
-    last_cache = dict(c.bars_raw[-2].cache) if c.bars_raw[-2].cache else dict()
-    if cache_key not in last_cache.keys() or len(c.bars_raw) < timeperiod + 15:
+    if cache_key not in c.bars_raw[-2].cache or len(c.bars_raw) < timeperiod + 15:
         # 初始化缓存
-        close = np.array([x.close for x in c.bars_raw])
+        close = get_bars_values(c, "close")
         ma = ta.MA(close, timeperiod=timeperiod, matype=ma_type_map[ma_type.upper()])
         assert len(ma) == len(close)
-        for i in range(len(close)):
-            _c = dict(c.bars_raw[i].cache) if c.bars_raw[i].cache else dict()
-            _c.update({cache_key: ma[i] if ma[i] else close[i]})
-            c.bars_raw[i].cache = _c
+        update_bars_cache(c, cache_key, np.where(ma != 0, ma, close))
 
     else:
         # 增量更新最近5个K线缓存
-        close = np.array([x.close for x in c.bars_raw[-timeperiod - 10 :]])
+        close = get_bars_values(c, "close", timeperiod + 10)
         ma = ta.MA(close, timeperiod=timeperiod, matype=ma_type_map[ma_type.upper()])
-        for i in range(1, 6):
-            _c = dict(c.bars_raw[-i].cache) if c.bars_raw[-i].cache else dict()
-            _c.update({cache_key: ma[-i]})
-            c.bars_raw[-i].cache = _c
+        update_bars_cache(c, cache_key, ma, n=5)
     return cache_key
 
 
@@ -91,32 +93,29 @@ def update_macd_cache(c: CZSC, **kwargs):
     signalperiod = int(kwargs.get("signalperiod", 9))
 
     cache_key = f"MACD{fastperiod}#{slowperiod}#{signalperiod}"
+    store = get_indicator_store(c)
+    if store is not None:
+        # 增量计算，每根K线只计算一次
+        return store.ensure(IncrementalMACD(fastperiod, slowperiod, signalperiod))
+
     if c.bars_raw[-1].cache and c.bars_raw[-1].cache.get(cache_key, None):
         # 如果最后一根K线已经有对应的缓存，不执行更新
         return cache_key
 
     min_count = signalperiod + slowperiod + 168
-    last_cache = dict(c.bars_raw[-2].cache) if c.bars_raw[-2].cache else dict()
-    if cache_key not in last_cache.keys() or len(c.bars_raw) < min_count + 15:
+    if cache_key not in c.bars_raw[-2].cache or len(c.bars_raw) < min_count + 15:
         # 初始化缓存
-        close = np.array([x.close for x in c.bars_raw])
+        close = get_bars_values(c, "close")
         dif, dea, macd = MACD(close, fastperiod=fastperiod, slowperiod=slowperiod, signalperiod=signalperiod)
-        for i in range(len(close)):
-            _c = dict(c.bars_raw[i].cache) if c.bars_raw[i].cache else dict()
-            dif_i = dif[i] if dif[i] else close[i]
-            dea_i = dea[i] if dea[i] else close[i]
-            macd_i = dif_i - dea_i
-            _c.update({cache_key: {"dif": dif_i, "dea": dea_i, "macd": macd_i}})
-            c.bars_raw[i].cache = _c
+        dif = np.where(dif != 0, dif, close)
+        dea = np.where(dea != 0, dea, close)
+        update_bars_cache(c, cache_key, {"dif": dif, "dea": dea, "macd": dif - dea})
 
     else:
         # 增量更新最近5个K线缓存
-        close = np.array([x.close for x in c.bars_raw[-min_count - 10 :]])
+        close = get_bars_values(c, "close", min_count + 10)
         dif, dea, macd = MACD(close, fastperiod=fastperiod, slowperiod=slowperiod, signalperiod=signalperiod)
-        for i in range(1, 6):
-            _c = dict(c.bars_raw[-i].cache) if c.bars_raw[-i].cache else dict()
-            _c.update({cache_key: {"dif": dif[-i], "dea": dea[-i], "macd": macd[-i]}})
-            c.bars_raw[-i].cache = _c
+        update_bars_cache(c, cache_key, {"dif": dif, "dea": dea, "macd": macd}, n=5)
     return cache_key
 
 
@@ -135,30 +134,19 @@ def update_boll_cache_V230228(c: CZSC, **kwargs):
         # 如果最后一根K线已经有对应的缓存，不执行更新
         return cache_key
 
-    last_cache = dict(c.bars_raw[-2].cache) if c.bars_raw[-2].cache else dict()
-    if cache_key not in last_cache.keys() or len(c.bars_raw) < timeperiod + 15:
+    if cache_key not in c.bars_raw[-2].cache or len(c.bars_raw) < timeperiod + 15:
         # 初始化缓存
-        close = np.array([x.close for x in c.bars_raw])
+        close = get_bars_values(c, "close")
         u1, m, l1 = ta.BBANDS(close, timeperiod=timeperiod, nbdevup=nbdev, nbdevdn=nbdev, matype=0)
-
-        for i in range(len(close)):
-            _c = dict(c.bars_raw[i].cache) if c.bars_raw[i].cache else dict()
-            if not m[i]:
-                _data = {"上轨": close[i], "中线": close[i], "下轨": close[i]}
-            else:
-                _data = {"上轨": u1[i], "中线": m[i], "下轨": l1[i]}
-            _c.update({cache_key: _data})
-            c.bars_raw[i].cache = _c
+        flat = m == 0
+        _data = {"上轨": np.where(flat, close, u1), "中线": np.where(flat, close, m), "下轨": np.where(flat, close, l1)}
+        update_bars_cache(c, cache_key, _data)
 
     else:
         # 增量更新最近5个K线缓存
-        close = np.array([x.close for x in c.bars_raw[-timeperiod - 10 :]])
+        close = get_bars_values(c, "close", timeperiod + 10)
         u1, m, l1 = ta.BBANDS(close, timeperiod=timeperiod, nbdevup=nbdev, nbdevdn=nbdev, matype=0)
-
-        for i in range(1, 6):
-            _c = dict(c.bars_raw[-i].cache) if c.bars_raw[-i].cache else dict()
-            _c.update({cache_key: {"上轨": u1[-i], "中线": m[-i], "下轨": l1[-i]}})
-            c.bars_raw[-i].cache = _c
+        update_bars_cache(c, cache_key, {"上轨": u1, "中线": m, "下轨": l1}, n=5)
 
     return cache_key
 
@@ -177,62 +165,34 @@ def update_boll_cache(c: CZSC, **kwargs):
         return cache_key
 
     dev_seq = (1.382, 2, 2.764)
-    last_cache = dict(c.bars_raw[-2].cache) if c.bars_raw[-2].cache else dict()
-    if cache_key not in last_cache.keys() or len(c.bars_raw) < timeperiod + 15:
+    if cache_key not in c.bars_raw[-2].cache or len(c.bars_raw) < timeperiod + 15:
         # 初始化缓存
-        close = np.array([x.close for x in c.bars_raw])
+        close = get_bars_values(c, "close")
         u1, m, l1 = ta.BBANDS(close, timeperiod=timeperiod, nbdevup=dev_seq[0], nbdevdn=dev_seq[0], matype=0)
         u2, m, l2 = ta.BBANDS(close, timeperiod=timeperiod, nbdevup=dev_seq[1], nbdevdn=dev_seq[1], matype=0)
         u3, m, l3 = ta.BBANDS(close, timeperiod=timeperiod, nbdevup=dev_seq[2], nbdevdn=dev_seq[2], matype=0)
 
-        for i in range(len(close)):
-            _c = dict(c.bars_raw[i].cache) if c.bars_raw[i].cache else dict()
-            if not m[i]:
-                _data = {
-                    "上轨3": close[i],
-                    "上轨2": close[i],
-                    "上轨1": close[i],
-                    "中线": close[i],
-                    "下轨1": close[i],
-                    "下轨2": close[i],
-                    "下轨3": close[i],
-                }
-            else:
-                _data = {
-                    "上轨3": u3[i],
-                    "上轨2": u2[i],
-                    "上轨1": u1[i],
-                    "中线": m[i],
-                    "下轨1": l1[i],
-                    "下轨2": l2[i],
-                    "下轨3": l3[i],
-                }
-            _c.update({cache_key: _data})
-            c.bars_raw[i].cache = _c
+        flat = m == 0
+        _data = {
+            "上轨3": np.where(flat, close, u3),
+            "上轨2": np.where(flat, close, u2),
+            "上轨1": np.where(flat, close, u1),
+            "中线": np.where(flat, close, m),
+            "下轨1": np.where(flat, close, l1),
+            "下轨2": np.where(flat, close, l2),
+            "下轨3": np.where(flat, close, l3),
+        }
+        update_bars_cache(c, cache_key, _data)
 
     else:
         # 增量更新最近5个K线缓存
-        close = np.array([x.close for x in c.bars_raw[-timeperiod - 10 :]])
+        close = get_bars_values(c, "close", timeperiod + 10)
         u1, m, l1 = ta.BBANDS(close, timeperiod=timeperiod, nbdevup=dev_seq[0], nbdevdn=dev_seq[0], matype=0)
         u2, m, l2 = ta.BBANDS(close, timeperiod=timeperiod, nbdevup=dev_seq[1], nbdevdn=dev_seq[1], matype=0)
         u3, m, l3 = ta.BBANDS(close, timeperiod=timeperiod, nbdevup=dev_seq[2], nbdevdn=dev_seq[2], matype=0)
 
-        for i in range(1, 6):
-            _c = dict(c.bars_raw[-i].cache) if c.bars_raw[-i].cache else dict()
-            _c.update(
-                {
-                    cache_key: {
-                        "上轨3": u3[-i],
-                        "上轨2": u2[-i],
-                        "上轨1": u1[-i],
-                        "中线": m[-i],
-                        "下轨1": l1[-i],
-                        "下轨2": l2[-i],
-                        "下轨3": l3[-i],
-                    }
-                }
-            )
-            c.bars_raw[-i].cache = _c
+        _data = {"上轨3": u3, "上轨2": u2, "上轨1": u1, "中线": m, "下轨1": l1, "下轨2": l2, "下轨3": l3}
+        update_bars_cache(c, cache_key, _data, n=5)
 
     return cache_key
 
@@ -1196,43 +1156,36 @@ def update_kdj_cache(c: CZSC, **kwargs):
     slowk_period = int(kwargs.get("slowk_period", 3))
     slowd_period = int(kwargs.get("slowd_period", 3))
     cache_key = f"KDJ{fastk_period}#{slowk_period}#{slowd_period}"
+    store = get_indicator_store(c)
+    if store is not None:
+        # 增量计算，每根K线只计算一次
+        return store.ensure(IncrementalKDJ(fastk_period, slowk_period, slowd_period))
 
     if c.bars_raw[-1].cache and c.bars_raw[-1].cache.get(cache_key, None):
         # 如果最后一根K线已经有对应的缓存，不执行更新
         return cache_key
 
     min_count = fastk_period + slowk_period
-    last_cache = dict(c.bars_raw[-2].cache) if c.bars_raw[-2].cache else dict()
-    if cache_key not in last_cache.keys() or len(c.bars_raw) < min_count + 15:
+    if cache_key not in c.bars_raw[-2].cache or len(c.bars_raw) < min_count + 15:
         bars = c.bars_raw
-        high = np.array([x.high for x in bars])
-        low = np.array([x.low for x in bars])
-        close = np.array([x.close for x in bars])
+        high = get_bars_values(c, "high", len(bars))
+        low = get_bars_values(c, "low", len(bars))
+        close = get_bars_values(c, "close", len(bars))
 
         k, d = ta.STOCH(
             high, low, close, fastk_period=fastk_period, slowk_period=slowk_period, slowd_period=slowd_period
         )
-        j = list(map(lambda x, y: 3 * x - 2 * y, k, d))
-
-        for i in range(len(close)):
-            _c = dict(c.bars_raw[i].cache) if c.bars_raw[i].cache else dict()
-            _c.update({cache_key: {"k": k[i] if k[i] else 0, "d": d[i] if d[i] else 0, "j": j[i] if j[i] else 0}})
-            c.bars_raw[i].cache = _c
+        update_bars_cache(c, cache_key, {"k": k, "d": d, "j": 3 * k - 2 * d})
 
     else:
         bars = c.bars_raw[-min_count - 10 :]
-        high = np.array([x.high for x in bars])
-        low = np.array([x.low for x in bars])
-        close = np.array([x.close for x in bars])
+        high = get_bars_values(c, "high", len(bars))
+        low = get_bars_values(c, "low", len(bars))
+        close = get_bars_values(c, "close", len(bars))
         k, d = ta.STOCH(
             high, low, close, fastk_period=fastk_period, slowk_period=slowk_period, slowd_period=slowd_period
         )
-        j = list(map(lambda x, y: 3 * x - 2 * y, k, d))
-
-        for i in range(1, 6):
-            _c = dict(c.bars_raw[-i].cache) if c.bars_raw[-i].cache else dict()
-            _c.update({cache_key: {"k": k[-i], "d": d[-i], "j": j[-i]}})
-            c.bars_raw[-i].cache = _c
+        update_bars_cache(c, cache_key, {"k": k, "d": d, "j": 3 * k - 2 * d}, n=5)
 
     return cache_key
 
@@ -1364,30 +1317,26 @@ def update_rsi_cache(c: CZSC, **kwargs):
     """
     timeperiod = kwargs.get("timeperiod", 9)
     cache_key = f"RSI{timeperiod}"
+    store = get_indicator_store(c)
+    if store is not None:
+        # 增量计算，每根K线只计算一次
+        return store.ensure(IncrementalRSI(timeperiod))
+
     if c.bars_raw[-1].cache and c.bars_raw[-1].cache.get(cache_key, None):
         # 如果最后一根K线已经有对应的缓存，不执行更新
         return cache_key
 
-    last_cache = dict(c.bars_raw[-2].cache) if c.bars_raw[-2].cache else dict()
-    if cache_key not in last_cache.keys() or len(c.bars_raw) < timeperiod + 15:
+    if cache_key not in c.bars_raw[-2].cache or len(c.bars_raw) < timeperiod + 15:
         # 初始化缓存
-        close = np.array([x.close for x in c.bars_raw])
+        close = get_bars_values(c, "close")
         rsi = ta.RSI(close, timeperiod=timeperiod)
-
-        for i in range(len(close)):
-            _c = dict(c.bars_raw[i].cache) if c.bars_raw[i].cache else dict()
-            _c.update({cache_key: rsi[i] if rsi[i] else 0})
-            c.bars_raw[i].cache = _c
+        update_bars_cache(c, cache_key, rsi)
 
     else:
         # 增量更新最近5个K线缓存
-        close = np.array([x.close for x in c.bars_raw[-timeperiod - 10 :]])
+        close = get_bars_values(c, "close", timeperiod + 10)
         rsi = ta.RSI(close, timeperiod=timeperiod)
-
-        for i in range(1, 6):
-            _c = dict(c.bars_raw[-i].cache) if c.bars_raw[-i].cache else dict()
-            _c.update({cache_key: rsi[-i]})
-            c.bars_raw[-i].cache = _c
+        update_bars_cache(c, cache_key, rsi, n=5)
 
     return cache_key
 
@@ -1919,24 +1868,18 @@ def update_cci_cache(c: CZSC, **kwargs):
         # 如果最后一根K线已经有对应的缓存，不执行更新
         return cache_key
 
-    last_cache = dict(c.bars_raw[-2].cache) if c.bars_raw[-2].cache else dict()
-    if cache_key not in last_cache.keys() or len(c.bars_raw) < timeperiod + 15:
+    if cache_key not in c.bars_raw[-2].cache or len(c.bars_raw) < timeperiod + 15:
         # 初始化缓存
         bars = c.bars_raw
     else:
         # 增量更新最近5个K线缓存
         bars = c.bars_raw[-timeperiod - 10 :]
 
-    high = np.array([x.high for x in bars])
-    low = np.array([x.low for x in bars])
-    close = np.array([x.close for x in bars])
+    high = get_bars_values(c, "high", len(bars))
+    low = get_bars_values(c, "low", len(bars))
+    close = get_bars_values(c, "close", len(bars))
     cci = ta.CCI(high, low, close, timeperiod=timeperiod)
-
-    for i in range(len(bars)):
-        _c = dict(bars[i].cache) if bars[i].cache else dict()
-        if cache_key not in _c.keys():
-            _c.update({cache_key: cci[i] if cci[i] else 0})
-            bars[i].cache = _c
+    update_bars_cache(c, cache_key, cci, n=len(bars), missing_only=True)
 
     return cache_key
 
@@ -2112,24 +2055,18 @@ def update_atr_cache(c: CZSC, **kwargs):
         # 如果最后一根K线已经有对应的缓存，不执行更新
         return cache_key
 
-    last_cache = dict(c.bars_raw[-2].cache) if c.bars_raw[-2].cache else dict()
-    if cache_key not in last_cache.keys() or len(c.bars_raw) < timeperiod + 15:
+    if cache_key not in c.bars_raw[-2].cache or len(c.bars_raw) < timeperiod + 15:
         # 初始化缓存
         bars = c.bars_raw
     else:
         # 增量更新最近5个K线缓存
         bars = c.bars_raw[-timeperiod - 80 :]
 
-    high = np.array([x.high for x in bars])
-    low = np.array([x.low for x in bars])
-    close = np.array([x.close for x in bars])
+    high = get_bars_values(c, "high", len(bars))
+    low = get_bars_values(c, "low", len(bars))
+    close = get_bars_values(c, "close", len(bars))
     atr = ta.ATR(high, low, close, timeperiod=timeperiod)
-
-    for i in range(len(bars)):
-        _c = dict(bars[i].cache) if bars[i].cache else dict()
-        if cache_key not in _c.keys():
-            _c.update({cache_key: atr[i] if atr[i] else 0})
-            bars[i].cache = _c
+    update_bars_cache(c, cache_key, atr, n=len(bars), missing_only=True)
 
     return cache_key
 
@@ -2205,23 +2142,17 @@ def update_sar_cache(c: CZSC, **kwargs):
         # 如果最后一根K线已经有对应的缓存，不执行更新
         return cache_key
 
-    last_cache = dict(c.bars_raw[-2].cache) if c.bars_raw[-2].cache else dict()
-    if cache_key not in last_cache.keys() or len(c.bars_raw) < 50:
+    if cache_key not in c.bars_raw[-2].cache or len(c.bars_raw) < 50:
         # 初始化缓存
         bars = c.bars_raw
     else:
         # 增量更新最近5个K线缓存
         bars = c.bars_raw[-120:]
 
-    high = np.array([x.high for x in bars])
-    low = np.array([x.low for x in bars])
+    high = get_bars_values(c, "high", len(bars))
+    low = get_bars_values(c, "low", len(bars))
     sar = ta.SAR(high, low)
-
-    for i in range(len(bars)):
-        _c = dict(bars[i].cache) if bars[i].cache else dict()
-        if cache_key not in _c.keys():
-            _c.update({cache_key: sar[i] if sar[i] else 0})
-            bars[i].cache = _c
+    update_bars_cache(c, cache_key, sar, n=len(bars), missing_only=True)
 
     return cache_key
 
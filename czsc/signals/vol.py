@@ -18,6 +18,8 @@ from typing import List
 from collections import OrderedDict
 from czsc.analyze import CZSC, RawBar
 from czsc.utils.sig import get_sub_elements, create_single_signal
+from czsc.utils.columnar import update_bars_cache, get_indicator_store, get_bars_values
+from czsc.utils.ta import IncrementalSMA, IncrementalEMA
 
 
 def update_vol_ma_cache(c: CZSC, ma_type: str, timeperiod: int, **kwargs):
@@ -28,38 +30,38 @@ def update_vol_ma_cache(c: CZSC, ma_type: str, timeperiod: int, **kwargs):
     :param timeperiod: 计算周期
     :return:
     """
+    ma_type = ma_type.upper()
+    cache_key = f"VOL#{ma_type}#{timeperiod}"
+
+    store = get_indicator_store(c)
+    if store is not None and ma_type in ("SMA", "EMA"):
+        # 增量计算，每根K线只计算一次
+        indicator = IncrementalSMA if ma_type == "SMA" else IncrementalEMA
+        return store.ensure(indicator(timeperiod, source="vol", key=cache_key))
+
     ma_type_map = {
         'SMA': ta.MA_Type.SMA, 'EMA': ta.MA_Type.EMA, 'WMA': ta.MA_Type.WMA, 'KAMA': ta.MA_Type.KAMA,
         'TEMA': ta.MA_Type.TEMA, 'DEMA': ta.MA_Type.DEMA, 'MAMA': ta.MA_Type.MAMA, 'TRIMA': ta.MA_Type.TRIMA,
     }
 
-    ma_type = ma_type.upper()
     assert ma_type in ma_type_map.keys(), f"{ma_type} 不是支持的均线类型，可选值：{list(ma_type_map.keys())}"
-    cache_key = f"VOL#{ma_type}#{timeperiod}"
 
     if c.bars_raw[-1].cache and c.bars_raw[-1].cache.get(cache_key, None):
         # 如果最后一根K线已经有对应的缓存，不执行更新
         return cache_key
 
-    last_cache = dict(c.bars_raw[-2].cache) if c.bars_raw[-2].cache else dict()
-    if cache_key not in last_cache.keys() or len(c.bars_raw) < timeperiod + 15:
+    if cache_key not in c.bars_raw[-2].cache or len(c.bars_raw) < timeperiod + 15:
         # 初始化缓存
-        data = np.array([x.vol for x in c.bars_raw], dtype=np.float64)
+        data = get_bars_values(c, "vol")
         ma = ta.MA(data, timeperiod=timeperiod, matype=ma_type_map[ma_type.upper()]) # type: ignore
         assert len(ma) == len(data)
-        for i in range(len(data)):
-            _c = dict(c.bars_raw[i].cache) if c.bars_raw[i].cache else dict()
-            _c.update({cache_key: ma[i] if ma[i] else data[i]})
-            c.bars_raw[i].cache = _c
+        update_bars_cache(c, cache_key, np.where(ma != 0, ma, data))
 
     else:
         # 增量更新最近3个K线缓存
-        data = np.array([x.vol for x in c.bars_raw[-timeperiod - 10:]], dtype=np.float64)
+        data = get_bars_values(c, "vol", timeperiod + 10)
         ma = ta.MA(data, timeperiod=timeperiod, matype=ma_type_map[ma_type.upper()]) # type: ignore
-        for i in range(1, 4):
-            _c = dict(c.bars_raw[-i].cache) if c.bars_raw[-i].cache else dict()
-            _c.update({cache_key: ma[-i]})
-            c.bars_raw[-i].cache = _c
+        update_bars_cache(c, cache_key, ma, n=3)
     return cache_key
 
 
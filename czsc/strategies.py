@@ -17,8 +17,9 @@ from copy import deepcopy
 from datetime import timedelta, datetime
 from abc import ABC, abstractmethod
 from loguru import logger
+from typing import Union
 from czsc.objects import RawBar, List, Operate, Signal, Factor, Event, Position
-from czsc.traders.base import CzscTrader
+from czsc.traders.base import CzscTrader, CzscSignals
 from czsc.traders.sig_parse import get_signals_freqs, get_signals_config
 from czsc.utils import x_round, freqs_sorted, BarGenerator, dill_dump, save_json, read_json
 from czsc.utils import check_freq_and_market
@@ -86,7 +87,7 @@ class CzscStrategyBase(ABC):
         - 首先，方法获取了基础K线的频率，并检查了是否已经有一个初始化好的BarGenerator对象传入。
         - 然后，根据基础频率是否在排序后的频率列表中，确定要使用的频率列表。
         - 如果没有传入BarGenerator对象，则根据传入的基础K线数据和其他参数创建一个新的BarGenerator对象，
-          并使用部分K线数据初始化它。余下的K线数据将用于trader的初始化区间。
+          并使用部分K线数据一次性初始化它（BarGenerator.init_bars）。余下的K线数据将用于trader的初始化区间。
         - 如果传入了BarGenerator对象，则会做一些断言检查，确保传入的基础K线数据与已有的BarGenerator对象的基础周期一致，
           并且BarGenerator的end_dt是datetime类型。然后，筛选出在BarGenerator的end_dt之后的K线数据。
         - 最后，返回BarGenerator对象和余下的K线数据。
@@ -121,9 +122,7 @@ class CzscStrategyBase(ABC):
                 bars1 = bars[:n]
                 bars2 = bars[n:]
 
-            for bar in bars1:
-                bg.update(bar)
-
+            bg.init_bars(bars1)
             return bg, bars2
         else:
             assert bg.base_freq == bars[-1].freq.value, "BarGenerator 的基础周期和 bars 的基础周期不一致"
@@ -159,20 +158,43 @@ class CzscStrategyBase(ABC):
             trader.on_bar(bar)
         return trader
 
+    def generate_signals(self, bars: List[RawBar], **kwargs) -> pd.DataFrame:
+        """使用策略定义计算信号表，K线切分方式与 init_trader 一致
+
+        信号表的每一行等于 init_trader 中对应K线上 CzscTrader.s 的取值，因此 dummy(generate_signals(bars))
+        与 backtest(bars) 的持仓结果一致；同一份信号表可以用于评估共享同一组信号的任意多个持仓策略。
+
+        :param bars: 基础周期K线
+        :param kwargs: 与 init_trader 的参数一致
+        :return: 信号表，每一行对应 sdt 之后的一根基础周期K线
+        """
+        bg, bars2 = self.init_bar_generator(bars, **kwargs)
+        cs = CzscSignals(bg, signals_config=deepcopy(self.signals_config), **kwargs)
+        _sigs = []
+        for bar in bars2:
+            cs.update_signals(bar)
+            _sigs.append(dict(cs.s))
+        return pd.DataFrame(_sigs)
+
     def backtest(self, bars: List[RawBar], **kwargs) -> CzscTrader:
         trader = self.init_trader(bars, **kwargs)
         return trader
 
-    def dummy(self, sigs: List[dict], **kwargs) -> CzscTrader:
+    def dummy(self, sigs: Union[List[dict], pd.DataFrame], **kwargs) -> CzscTrader:
         """使用信号缓存进行策略回测
 
-        :param sigs: 信号缓存，一般指 generate_czsc_signals 函数计算的结果缓存
+        :param sigs: 信号缓存，一般指 generate_czsc_signals 函数计算的结果缓存；
+            传入 DataFrame 时，使用 CzscTrader.on_sigs 按列批量匹配事件，结果与逐行回测一致
         :return: 完成策略回测后的 CzscTrader 对象
         """
         sleep_time = kwargs.get("sleep_time", 0)
         sleep_step = kwargs.get("sleep_step", 1000)
 
         trader = CzscTrader(positions=deepcopy(self.positions))     # type: ignore
+        if isinstance(sigs, pd.DataFrame):
+            trader.on_sigs(sigs)
+            return trader
+
         for i, sig in tqdm(enumerate(sigs), desc=f"回测 {self.symbol} {self.sorted_freqs}"):
             trader.on_sig(sig)
 
@@ -19,7 +19,7 @@ from pyecharts.charts import Tab
 from pyecharts.components import Table
 from pyecharts.options import ComponentTitleOpts
 from czsc.analyze import CZSC
-from czsc.objects import Position, RawBar, Signal
+from czsc.objects import Position, RawBar, Signal, SignalsMatcher
 from czsc.utils.bar_generator import BarGenerator
 from czsc.utils.cache import home_path
 from czsc.utils import sorted_freqs, import_by_name
@@ -352,7 +352,8 @@ class CzscTrader(CzscSignals):
             bg是一个可选的BarGenerator对象，
             positions是一个可选的Position对象列表，
             ensemble_method是一个集成方法，可以是字符串或者一个回调函数。
-        2. 函数将positions赋值给self.positions。如果positions不为空，函数会检查positions中的所有名称是否都是唯一的，如果不是，函数会抛出一个断言错误。
+        2. 函数将positions赋值给self.positions。如果positions不为空，函数会检查positions中的所有名称是否都是唯一的，如果不是，函数会抛出一个断言错误；
+            然后将所有positions的事件编译到同一个 SignalsMatcher 中，共享每根K线的信号匹配结果。
         3. 函数将ensemble_method赋值给self.__ensemble_method。这个参数用于指定如何从多个仓位中集成一个仓位。
             它可以是"mean"（平均），"vote"（投票），"max"（最大），或者一个回调函数。
         4. 函数将"CzscTrader"赋值给self.name。
@@ -374,6 +375,11 @@ class CzscTrader(CzscSignals):
         if self.positions:
             _pos_names = [x.name for x in self.positions]
             assert len(_pos_names) == len(set(_pos_names)), "仓位策略名称不能重复"
+
+            # 所有持仓策略共用一个信号匹配引擎，每根K线上相同的信号只匹配一次
+            matcher = SignalsMatcher()
+            for position in self.positions:
+                position.compile(matcher)
         self.__ensemble_method = ensemble_method
         self.name = "CzscTrader"
         super().__init__(bg, **kwargs)
@@ -418,6 +424,31 @@ class CzscTrader(CzscSignals):
             for position in self.positions:
                 position.update(self.s)
 
+    def on_sigs(self, sigs: pd.DataFrame) -> None:
+        """通过信号 DataFrame 批量交易，用于快速回测场景，结果与逐行调用 on_sig 一致
+
+        每个持仓策略的事件在整个 DataFrame 上按列匹配，相同的信号、事件在所有持仓策略之间只计算一次，
+        逐行执行的只有仓位状态的更新。
+
+        :param sigs: 信号 DataFrame，每一行对应 on_sig 的一个信号字典，按 dt 升序排列
+        :return: None
+        """
+        if sigs.empty:
+            return
+
+        if self.positions:
+            for position in self.positions:
+                position.update_frame(sigs)
+
+            # 释放匹配引擎对信号 DataFrame 的引用
+            matchers = {id(p._matcher): p._matcher for p in self.positions}
+            for matcher in matchers.values():
+                matcher._reset_frame(None)
+
+        self.s = sigs.iloc[-1].to_dict()
+        self.symbol, self.end_dt = self.s['symbol'], self.s['dt']
+        self.bid, self.latest_price = self.s['id'], self.s['close']
+
     def on_bar(self, bar: RawBar) -> None:
         """输入基础周期已完成K线，更新信号，更新仓位
 
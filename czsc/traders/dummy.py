@@ -73,8 +73,7 @@ class DummyBacktest:
                 sigs = pd.read_parquet(file_sigs)
                 sigs = sigs[sigs['dt'] >= self.sdt]
 
-            sigs = sigs.to_dict('records')
-            trader = tactic.dummy(sigs)
+            trader = tactic.dummy(sigs.reset_index(drop=True))
 
         except Exception as e:
             logger.exception(e)
@@ -8,16 +8,19 @@ describe: 择时策略开平仓优化
 import os
 import czsc
 import time
+import shutil
 import hashlib
 import pandas as pd
 from tqdm import tqdm
 from loguru import logger
 from copy import deepcopy
 from pathlib import Path
-from typing import Callable, Union, List, AnyStr
+from typing import Callable, Union, List, AnyStr, Optional
 from czsc.strategies import CzscStrategyBase
 from czsc.objects import Position, Event
-from concurrent.futures import ProcessPoolExecutor, as_completed
+from czsc.utils.cache import DiskCache, hash_args
+from czsc.utils.io import save_parquet
+from concurrent.futures import ProcessPoolExecutor
 
 
 class CzscOpenOptimStrategy(CzscStrategyBase):
@@ -103,6 +106,51 @@ class CzscExitOptimStrategy(CzscStrategyBase):
         return pos_list
 
 
+def _signals_key(signals_config) -> list:
+    """信号表缓存 key 的信号部分：信号配置与信号函数的源码，信号函数的代码发生变化时，缓存失效"""
+    import inspect
+    from czsc.utils import import_by_name
+
+    config, codes = [], {}
+    for conf in signals_config:
+        func = import_by_name(conf['name']) if isinstance(conf['name'], str) else conf['name']
+        name = f"{func.__module__}.{func.__qualname__}"
+        config.append(str(dict(conf, name=name)))
+        if name not in codes:
+            try:
+                codes[name] = inspect.getsource(func)
+            except (OSError, TypeError):
+                codes[name] = ""
+    return sorted(config) + sorted(codes.items())
+
+
+def symbol_signals(tactic: CzscStrategyBase, bars, sdt, cache: Optional[DiskCache] = None) -> pd.DataFrame:
+    """计算单个标的的信号表，优先读取缓存
+
+    缓存 key 由K线数据、信号配置、信号函数源码、sdt 以及 czsc 版本号的内容哈希组成，
+    K线、信号配置、信号函数的代码发生变化或者升级 czsc 后会重新计算
+
+    :param tactic: 策略对象，信号配置为全部持仓策略的信号并集
+    :param bars: 基础周期K线
+    :param sdt: 回测开始日期
+    :param cache: 信号表缓存，None 表示不缓存
+    :return: 信号表，参见 CzscStrategyBase.generate_signals
+    """
+    if cache is None:
+        return tactic.generate_signals(bars, sdt=sdt)
+
+    cols = ['dt', 'open', 'close', 'high', 'low', 'vol', 'amount']
+    dfk = pd.DataFrame({c: [getattr(x, c) for x in bars] for c in cols})
+    key = hash_args(dfk, _signals_key(tactic.signals_config), str(sdt), czsc.__version__)
+    k = f"{bars[0].symbol}_{key[:16]}"
+
+    sigs = cache.get(k, suffix='pkl') if cache.is_found(k, suffix='pkl') else None
+    if sigs is None:
+        sigs = tactic.generate_signals(bars, sdt=sdt)
+        cache.set(k, sigs, suffix='pkl')
+    return sigs
+
+
 def one_symbol_optim(symbol, read_bars: Callable, path: str, **kwargs):
     """单个标的优化
 
@@ -115,13 +163,14 @@ def one_symbol_optim(symbol, read_bars: Callable, path: str, **kwargs):
         - bar_edt: K线数据结束日期
         - sdt: 优化开始日期
         - optim_type: 优化类型，open 或 exit
+        - signals_path: 信号表缓存路径，默认为 path 下的 .signals 文件夹；多个优化任务可以指定同一个路径共用缓存
+        - signals_max_bytes: 信号表缓存的容量上限，单位：Bytes，默认不限制
 
     """
     symbol_path = Path(path) / symbol
     if symbol_path.exists():
         logger.info(f"{symbol} dummy 结果已经存在")
         return
-    symbol_path.mkdir(parents=True, exist_ok=True)
 
     bar_sdt = kwargs.get('bar_sdt', '20150101')
     bar_edt = kwargs.get('bar_edt', '20220101')
@@ -142,71 +191,139 @@ def one_symbol_optim(symbol, read_bars: Callable, path: str, **kwargs):
             logger.warning(f"{symbol} K线数量不足，无法优化")
             return None
 
-        trader = tactic.backtest(bars, sdt=sdt)
+        # 所有候选策略共享同一张信号表，信号只计算一次，然后按列批量评估全部持仓策略
+        cache = DiskCache(kwargs.get('signals_path', Path(path) / '.signals'),
+                          max_bytes=kwargs.get('signals_max_bytes', None))
+        sigs = symbol_signals(tactic, bars, sdt=sdt, cache=cache)
+        trader = tactic.dummy(sigs)
     except Exception as e:
         logger.exception(f"{symbol} 优化失败，原因：{e}")
         return None
 
+    # 同一标的所有策略的结果分别合并为一个 parquet 文件，用 pos_name 列区分策略
+    pos_pairs, pos_holds = [], []
     for pos in trader.positions:            # type: ignore
         try:
-            file_pairs = os.path.join(symbol_path, f"{pos.name}.pairs")
-            file_holds = os.path.join(symbol_path, f"{pos.name}.holds")
-
             pairs = pd.DataFrame(pos.pairs)
-            pairs.to_parquet(file_pairs)
+            pairs['pos_name'] = pos.name
+            pos_pairs.append(pairs)
 
             dfh = pd.DataFrame(pos.holds)
             dfh['n1b'] = (dfh['price'].shift(-1) / dfh['price'] - 1) * 10000
             dfh.fillna(0, inplace=True)
             dfh['symbol'] = pos.symbol
-            dfh.to_parquet(file_holds)
+            dfh['pos_name'] = pos.name
+            pos_holds.append(dfh)
         except Exception as e:
             logger.debug(f"{symbol} {pos.name} 保存失败，原因：{e}")
 
+    # 先写入临时文件夹，全部写入成功后再重命名为标的文件夹；进程中断时不会留下不完整的结果，重新运行时会重新优化
+    tmp_path = Path(path) / ".tmp" / f"{symbol}.{os.getpid()}"
+    tmp_path.mkdir(parents=True, exist_ok=True)
+    try:
+        pos_pairs = [x for x in pos_pairs if len(x) > 0]
+        if pos_pairs:
+            save_parquet(pd.concat(pos_pairs, ignore_index=True), tmp_path / "pairs.parquet")
+        if pos_holds:
+            save_parquet(pd.concat(pos_holds, ignore_index=True), tmp_path / "holds.parquet")
+        try:
+            os.replace(tmp_path, symbol_path)
+        except OSError:
+            # 其他进程已经写入了该标的的结果，丢弃本次的临时文件夹
+            if not symbol_path.exists():
+                raise
+            logger.info(f"{symbol} dummy 结果已经存在")
+            return
+    finally:
+        shutil.rmtree(tmp_path, ignore_errors=True)
+
     logger.info(f"{symbol} - {optim_type} 优化完成，耗时 {time.time() - start_time:.2f} 秒")
 
 
-def one_position_stats(path, pos_name):
-    """分析单个 pos 的表现"""
-    path = Path(path)
-    files_p = path.glob(f"**/{pos_name}.pairs")
-    files_h = path.glob(f"**/{pos_name}.holds")
+def read_optim_results(path, name="pairs", pos_names=None) -> pd.DataFrame:
+    """读取 one_symbol_optim 的优化结果
+
+    :param path: 优化结果保存路径，每个标的一个子文件夹
+    :param name: 结果类型，pairs 或 holds
+    :param pos_names: 需要读取的策略名称列表，None 表示读取全部策略
+    :return: pd.DataFrame, 全部标的、全部策略的结果，pos_name 列为策略名称
+    """
+    assert name in ['pairs', 'holds'], "name must be pairs or holds"
+    filters = [('pos_name', 'in', list(pos_names))] if pos_names is not None else None
 
-    pos_pairs = []
-    for file_p in files_p:
+    dfs = []
+    for file in sorted(Path(path).glob(f"*/{name}.parquet")):
         try:
-            dfp = pd.read_parquet(file_p)
-            pos_pairs.append(dfp)
+            dfs.append(pd.read_parquet(file, filters=filters))
         except Exception as e:
-            logger.debug(f"{file_p} 读取失败，原因：{e}")
+            logger.debug(f"{file} 读取失败，原因：{e}")
+
+    dfs = [x for x in dfs if len(x) > 0]
+    if not dfs:
+        return pd.DataFrame()
+    return pd.concat(dfs, ignore_index=True)
+
 
-    pos_holds = []
-    for file_h in files_h:
+def positions_stats(path, pos_names=None) -> List[dict]:
+    """读取全部结果，分析所有 pos 的表现
+
+    :param path: 优化结果保存路径
+    :param pos_names: 需要分析的策略名称列表，None 表示分析全部策略
+    :return: list of dict，每个策略的评价结果，结果为空的策略不返回
+    """
+    pairs = read_optim_results(path, 'pairs', pos_names)
+    if len(pairs) == 0:
+        return []
+
+    # 截面等权评价：逐个标的读取 holds，按 pos_name、dt 聚合 edge 之和、非零持仓数、品种数，
+    # 只在内存中累加各标的的聚合结果，全部读取完成后再计算截面收益，不需要一次性载入全部 holds
+    filters = [('pos_name', 'in', list(pos_names))] if pos_names is not None else None
+    dfg = None
+    for file in sorted(Path(path).glob("*/holds.parquet")):
         try:
-            dfh = pd.read_parquet(file_h)
-            pos_holds.append(dfh)
+            holds = pd.read_parquet(file, columns=['dt', 'pos', 'n1b', 'pos_name'], filters=filters)
         except Exception as e:
-            logger.debug(f"{file_h} 读取失败，原因：{e}")
+            logger.debug(f"{file} 读取失败，原因：{e}")
+            continue
+        if len(holds) == 0:
+            continue
+
+        holds['edge'] = holds['n1b'] * holds['pos']
+        holds['nz'] = (holds['pos'] != 0).astype(int)
+        part = holds.groupby(['pos_name', 'dt'], sort=False).agg(edge=('edge', 'sum'), nz=('nz', 'sum'),
+                                                                 count=('edge', 'count'))
+        dfg = part if dfg is None else dfg.add(part, fill_value=0)
+
+    if dfg is None:
+        return []
+    dfg['cross'] = dfg['edge'] / (dfg['nz'] + 1)
+    dfg['edge_mean'] = dfg['edge'] / dfg['count']
+    cross = dfg.groupby(level='pos_name', sort=False)[['cross', 'edge_mean']].sum()
+
+    all_stats = []
+    for pos_name, dfp in pairs.groupby('pos_name', sort=False):
+        if pos_name not in cross.index:
+            continue
+        try:
+            pp = czsc.PairsPerformance(dfp.drop(columns=['pos_name']))
+            stats = dict(pp.basic_info)
+            stats['截面等权收益'] = cross.loc[pos_name, 'cross']
+            stats['截面品种等权'] = cross.loc[pos_name, 'edge_mean']
+            stats['pos_name'] = pos_name
+            all_stats.append(stats)
+        except Exception as e:
+            logger.exception(f"{pos_name} 分析失败，原因：{e}")
 
-    pairs = pd.concat(pos_pairs, ignore_index=True)
-    holds = pd.concat(pos_holds, ignore_index=True)
+    if pos_names is not None:
+        order = {x: i for i, x in enumerate(pos_names)}
+        all_stats = sorted(all_stats, key=lambda x: order[x['pos_name']])
+    return all_stats
 
-    if len(pairs) == 0 or len(holds) == 0:
-        return None
 
-    try:
-        pp = czsc.PairsPerformance(pairs)
-        stats = dict(pp.basic_info)
-        # 加入截面等权评价
-        cross = holds.groupby('dt').apply(lambda x: (x['n1b'] * x['pos']).sum() / (sum(x['pos'] != 0) + 1)).sum()
-        stats['截面等权收益'] = cross
-        cross1 = holds.groupby('dt').apply(lambda x: (x['n1b'] * x['pos']).mean()).sum()
-        stats['截面品种等权'] = cross1
-        stats['pos_name'] = pos_name
-        return stats
-    except Exception as e:
-        logger.exception(f"{pos_name} 分析失败，原因：{e}")
-        return None
+def one_position_stats(path, pos_name):
+    """分析单个 pos 的表现"""
+    res = positions_stats(path, [pos_name])
+    return res[0] if res else None
 
 
 class OpensOptimize:
@@ -262,23 +379,10 @@ class OpensOptimize:
             pool.map(self._one_symbol_optim, sorted(symbols))
 
     def _positions_stats(self, dumps_map, n_jobs=1):
-        """统计所有 pos 的表现"""
-        if n_jobs <= 1:
-            all_stats = [self._one_pos_stats(pos_name) for pos_name in dumps_map.keys()]
-            for s, pos_name in zip(all_stats, dumps_map.keys()):
-                if not s:
-                    continue
-                s['pos_dump'] = dumps_map[pos_name]
-            return all_stats
-
-        all_stats = []
-        with ProcessPoolExecutor(n_jobs) as pool:
-            futures = [pool.submit(self._one_pos_stats, pos_name) for pos_name in dumps_map.keys()]
-            for future in as_completed(futures):
-                s = future.result()
-                if s:
-                    s['pos_dump'] = dumps_map[s['pos_name']]
-                    all_stats.append(s)
+        """统计所有 pos 的表现，一次读取全部结果后分组计算，n_jobs 参数不再使用"""
+        all_stats = positions_stats(self.poss_path, list(dumps_map.keys()))
+        for s in all_stats:
+            s['pos_dump'] = dumps_map[s['pos_name']]
         return all_stats
 
     def execute(self, n_jobs=1):
@@ -364,23 +468,10 @@ class ExitsOptimize:
             pool.map(self._one_symbol_optim, sorted(symbols))
 
     def _positions_stats(self, dumps_map, n_jobs=1):
-        """统计所有 pos 的表现"""
-        if n_jobs <= 1:
-            all_stats = [self._one_pos_stats(pos_name) for pos_name in dumps_map.keys()]
-            for s, pos_name in zip(all_stats, dumps_map.keys()):
-                if not s:
-                    continue
-                s['pos_dump'] = dumps_map[pos_name]
-            return all_stats
-
-        all_stats = []
-        with ProcessPoolExecutor(n_jobs) as pool:
-            futures = [pool.submit(self._one_pos_stats, pos_name) for pos_name in dumps_map.keys()]
-            for future in as_completed(futures):
-                s = future.result()
-                if s:
-                    s['pos_dump'] = dumps_map[s['pos_name']]
-                    all_stats.append(s)
+        """统计所有 pos 的表现，一次读取全部结果后分组计算，n_jobs 参数不再使用"""
+        all_stats = positions_stats(self.poss_path, list(dumps_map.keys()))
+        for s in all_stats:
+            s['pos_dump'] = dumps_map[s['pos_name']]
         return all_stats
 
     def execute(self, n_jobs=1):
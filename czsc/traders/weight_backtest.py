@@ -18,8 +18,8 @@ from concurrent.futures import ProcessPoolExecutor
 
 import czsc
 from czsc.traders.base import CzscTrader
-from czsc.utils.io import save_json
-from czsc.utils.stats import daily_performance, evaluate_pairs
+from czsc.utils.io import save_json, save_pkl
+from czsc.utils.stats import daily_performance
 
 
 @deprecated(version="1.0.0", reason="截面回测已经迁移到 czsc.holds_performance 中")
@@ -224,6 +224,238 @@ def stoploss_by_direction(dfw, stoploss=0.03, **kwargs):
     return dfw1
 
 
+def _symbol_daily(dfw: pd.DataFrame, starts, fee_rate=0.0002) -> pd.DataFrame:
+    """一次性向量化计算所有品种的每日收益
+
+    dfw 中同一品种的数据必须是连续的一块，starts 为每一块的起始行号；品种内的 shift 通过把跨品种边界的位置置为 NaN 实现，
+    计算结果与逐品种筛选后单独计算完全一致。
+
+    :param dfw: pd.DataFrame, 按 symbol 连续分块的持仓权重数据，columns 至少包含 ['dt', 'symbol', 'weight', 'price']
+    :param starts: list, 每个品种数据块的起始行号，升序排列
+    :param fee_rate: float, 单边交易成本
+    :return: pd.DataFrame, columns = ['date', 'symbol', 'n1b', 'edge', 'return', 'cost', 'turnover']
+    """
+    n = len(dfw)
+    starts = np.asarray(starts, dtype=np.int64)
+    ends = np.append(starts[1:], n)
+    price = dfw["price"].to_numpy(dtype=np.float64)
+    weight = dfw["weight"].to_numpy(dtype=np.float64)
+
+    n1b = np.full(n, np.nan)
+    n1b[:-1] = price[1:] / price[:-1] - 1
+    n1b[ends - 1] = np.nan
+    turnover = np.full(n, np.nan)
+    turnover[1:] = np.abs(weight[:-1] - weight[1:])
+    turnover[starts] = np.nan
+    edge = weight * n1b
+    cost = turnover * fee_rate
+
+    dt = dfw["dt"]
+    if dt.dt.tz is not None:
+        dt = dt.dt.tz_localize(None)
+    df = pd.DataFrame(
+        {
+            "block": np.repeat(np.arange(len(starts)), ends - starts),
+            "date": dt.to_numpy().astype("datetime64[D]"),
+            "n1b": n1b,
+            "edge": edge,
+            "return": edge - cost,
+            "cost": cost,
+            "turnover": turnover,
+        }
+    )
+    daily = df.groupby(["block", "date"], sort=True).sum().reset_index()
+    daily["symbol"] = dfw["symbol"].to_numpy()[starts][daily["block"].to_numpy()]
+    daily["date"] = pd.DatetimeIndex(daily["date"]).date
+    return daily[["date", "symbol", "n1b", "edge", "return", "cost", "turnover"]]
+
+
+def _symbol_pairs(dfs: pd.DataFrame, symbol, digits=2, state=None):
+    """根据单个品种的持仓权重序列，生成开平交易记录
+
+    权重按 10 的 digits 次方转换成整数手数，开仓记录以 [手数, 行号] 的分段形式压入栈中，平仓时按后进先出的顺序从栈顶
+    分段扣减（支持部分成交）；计算量与权重变化次数成正比，最后按手数展开，每一手对应一条交易记录。
+
+    :param dfs: pd.DataFrame, 单个品种的持仓权重数据，columns 至少包含 ['dt', 'weight', 'price']
+    :param symbol: str, 合约代码
+    :param digits: int, 权重列保留小数位数
+    :param state: dict, 上一次计算结束时的持仓状态，用于增量计算；为 None 时表示从空仓开始
+    :return: (pd.DataFrame, dict), 开平交易记录，计算结束时的持仓状态，状态包含以下字段：
+
+        - volume: 最新的持仓手数，正数为多头，负数为空头
+        - n_bars: 已经处理的K线数量
+        - opens: 未平仓的开仓分段，每个分段为 [手数, bar_id, 开仓时间, 开仓价格]
+    """
+    state = state or {"volume": 0, "n_bars": 0, "opens": []}
+    volume = (dfs["weight"].to_numpy() * pow(10, digits)).astype(int)
+    v0, n0, m = state["volume"], state["n_bars"], len(state["opens"])
+    changes = np.flatnonzero(np.diff(volume, prepend=v0))
+
+    # 历史未平仓分段排在最前面，之后是本次的K线，统一用位置 k 引用
+    opens = [[seg[0], k] for k, seg in enumerate(state["opens"])]  # 开仓分段栈，元素为 [手数, 位置]
+    records = []  # 平仓分段，元素为 (开仓位置, 平仓位置, 手数)
+
+    def __close(k, lots):
+        while lots > 0:
+            seg = opens[-1]
+            n = min(lots, seg[0])
+            records.append((seg[1], k, n))
+            seg[0] -= n
+            lots -= n
+            if seg[0] == 0:
+                opens.pop()
+
+    v1 = v0
+    for i in changes.tolist():
+        v2 = int(volume[i])
+        if v1 * v2 >= 0 and abs(v2) < abs(v1):
+            __close(m + i, abs(v1) - abs(v2))
+        elif v1 * v2 >= 0:
+            opens.append([abs(v2) - abs(v1), m + i])
+        else:
+            # 多空反转：先平掉全部旧仓，再反向开仓
+            __close(m + i, abs(v1))
+            opens.append([abs(v2), m + i])
+        v1 = v2
+
+    price = [seg[3] for seg in state["opens"]] + dfs["price"].tolist()
+    bar_id = np.concatenate([[seg[1] for seg in state["opens"]], np.arange(n0 + 1, n0 + len(dfs) + 1)]).astype(int)
+    dt = pd.concat([pd.Series([seg[2] for seg in state["opens"]], dtype=dfs["dt"].dtype), dfs["dt"]], ignore_index=True)
+    state = {
+        "volume": v1,
+        "n_bars": n0 + len(dfs),
+        "opens": [[lots, int(bar_id[k]), dt[k], price[k]] for lots, k in opens],
+    }
+    if not records:
+        return pd.DataFrame(), state
+
+    rec = np.array(records, dtype=np.int64)
+    oi, ci, lots = rec[:, 0], rec[:, 1], rec[:, 2]
+    is_long = np.concatenate([np.full(m, v0), volume])[oi] > 0
+    dt_ns = pd.DatetimeIndex(dt).asi8
+
+    p_ret = []
+    for o, c, long in zip(oi.tolist(), ci.tolist(), is_long.tolist()):
+        diff = price[c] - price[o] if long else price[o] - price[c]
+        p_ret.append(round(diff / price[o] * 10000, 2))
+
+    idx = np.repeat(np.arange(len(rec)), lots)
+    oi, ci, is_long = oi[idx], ci[idx], is_long[idx]
+    price = np.array(price, dtype=dfs["price"].dtype)
+    df_pairs = pd.DataFrame(
+        {
+            "标的代码": symbol,
+            "交易方向": np.where(is_long, "多头", "空头").astype(object),
+            "开仓时间": dt.take(oi).reset_index(drop=True),
+            "平仓时间": dt.take(ci).reset_index(drop=True),
+            "开仓价格": price[oi],
+            "平仓价格": price[ci],
+            "持仓K线数": bar_id[ci] - bar_id[oi] + 1,
+            "事件序列": np.where(is_long, "开多 -> 平多", "开空 -> 平空").astype(object),
+            "持仓天数": (dt_ns[ci] - dt_ns[oi]) // 86400_000_000_000,
+            "盈亏比例": np.array(p_ret, dtype=np.float64)[idx],
+        }
+    )
+    return df_pairs, state
+
+
+def _daily_tail(dfs: pd.DataFrame) -> pd.DataFrame:
+    """取出单个品种最后一个交易日的数据及其前一行，增量计算时用于重算最后一个交易日的收益
+
+    :param dfs: pd.DataFrame, 单个品种的持仓权重数据，dt 必须是递增的
+    :return: pd.DataFrame, columns = ['dt', 'symbol', 'weight', 'price']
+    """
+    dt = pd.DatetimeIndex(dfs["dt"])
+    i = int(np.searchsorted(dt.asi8, dt[-1].normalize().value))
+    return dfs.iloc[max(i - 1, 0) :][["dt", "symbol", "weight", "price"]].reset_index(drop=True)
+
+
+def _concat_pairs(df1: pd.DataFrame, df2: pd.DataFrame) -> pd.DataFrame:
+    """拼接同一品种前后两段的开平交易记录"""
+    if len(df1) == 0:
+        return df2
+    if len(df2) == 0:
+        return df1
+    return pd.concat([df1, df2], ignore_index=True)
+
+
+def _pairs_sums(dfp: pd.DataFrame) -> np.ndarray:
+    """累计单个品种开平交易记录的统计量，用于增量回测时不保留全部交易记录也能计算交易绩效
+
+    :param dfp: pd.DataFrame, 单个品种的开平交易记录，盈亏比例保留两位小数
+    :return: np.ndarray, [交易次数, 盈亏比例之和（以 0.01 为单位）, 持仓天数之和, 持仓K线数之和, 盈利次数]
+    """
+    if len(dfp) == 0:
+        return np.zeros(5, dtype=np.int64)
+    ret = dfp["盈亏比例"].to_numpy(dtype=float)
+    cents = np.round(ret * 100).astype(np.int64).sum()
+    sums = [len(dfp), cents, dfp["持仓天数"].sum(), dfp["持仓K线数"].sum(), np.count_nonzero(ret >= 0)]
+    return np.array(sums, dtype=np.int64)
+
+
+def _pairs_stats(sums) -> dict:
+    """根据 _pairs_sums 的累计结果计算单笔收益、交易胜率、持仓天数、持仓K线数，与 evaluate_pairs 的结果一致"""
+    n, cents, days, bars, wins = (int(x) for x in sums)
+    if n == 0:
+        return {"单笔收益": 0, "交易胜率": 0, "持仓天数": 0, "持仓K线数": 0}
+    return {
+        "单笔收益": round(cents / 100 / n, 2),
+        "交易胜率": round(wins / n, 4) if wins > 0 else 0,
+        "持仓天数": round(days / n, 2),
+        "持仓K线数": round(bars / n, 2),
+    }
+
+
+def iter_symbol_weights(source, columns=("dt", "symbol", "weight", "price")):
+    """逐个品种读取持仓权重数据，每次只在内存中保留一个品种的数据
+
+    :param source: 持仓权重数据源，支持以下两种形式：
+
+        - str / Path: parquet 或 feather 文件路径，也可以是 parquet 数据集目录；只扫描一遍数据，
+          按数据块（batch）读取，每个数据块按品种拆分后追加写入临时目录中各品种的缓存文件，
+          扫描完成后再按 symbol 排序逐个读取缓存文件。因此需要额外占用与数据大小相当的临时磁盘空间，
+          读取的时间复杂度是 O(数据行数)，与品种数量无关；同一个品种内部保持数据源中的行顺序
+        - 迭代器: 每次返回一个 pd.DataFrame，可以包含一个或多个品种，同一个品种的全部数据必须在同一个 DataFrame 中
+
+    :param columns: 需要读取的列
+    :return: 迭代器，每次返回 (symbol, dfs)
+    """
+    if isinstance(source, (str, Path)):
+        import pickle
+        import tempfile
+        import pyarrow.dataset as ds
+
+        source = Path(source)
+        fmt = "feather" if source.suffix in [".feather", ".arrow", ".ipc"] else "parquet"
+        dataset = ds.dataset(source, format=fmt)
+        with tempfile.TemporaryDirectory(prefix="czsc_wbt_") as tmp:
+            files = {}
+            for batch in dataset.to_batches(columns=list(columns)):
+                if batch.num_rows == 0:
+                    continue
+                for symbol, dfs in batch.to_pandas().groupby("symbol", sort=False):
+                    # 品种代码不一定是合法的文件名，缓存文件按品种出现的顺序编号
+                    file = files.setdefault(symbol, Path(tmp).joinpath(f"{len(files)}.pkl"))
+                    with open(file, "ab") as f:
+                        pickle.dump(dfs, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+            for symbol in sorted(files):
+                chunks = []
+                with open(files[symbol], "rb") as f:
+                    while True:
+                        try:
+                            chunks.append(pickle.load(f))
+                        except EOFError:
+                            break
+                files[symbol].unlink()
+                yield symbol, pd.concat(chunks, ignore_index=True)
+        return
+
+    for df in source:
+        for symbol, dfs in df.groupby("symbol", sort=False):
+            yield symbol, dfs[list(columns)]
+
+
 class WeightBacktest:
     """持仓权重回测
 
@@ -242,12 +474,12 @@ class WeightBacktest:
         初始化函数逻辑：
 
         1. 将传入的kwargs保存在实例变量self.kwargs中。
-        2. 复制传入的dfw到实例变量self.dfw。
-        3. 检查self.dfw中是否存在空值，如果存在则抛出ValueError异常，并提示"dfw 中存在空值，请先处理"。
-        4. 设置实例变量self.digits为传入的digits值。
-        5. 从kwargs中获取'fee_rate'参数的值，默认为0.0002，并将其保存在实例变量self.fee_rate中。
-        6. 将self.dfw中的 weight 列转换为浮点型，并保留self.digits位小数。
-        7. 提取self.dfw中的唯一交易标的符号，并将其保存在实例变量self.symbols中。
+        2. 检查dfw中是否存在空值，如果存在则抛出ValueError异常，并提示"dfw 中存在空值，请先处理"。
+        3. 设置实例变量self.digits为传入的digits值。
+        4. 从kwargs中获取'fee_rate'参数的值，默认为0.0002，并将其保存在实例变量self.fee_rate中。
+        5. 提取dfw中的唯一交易标的符号，并将其保存在实例变量self.symbols中。
+        6. 将dfw按 symbol 稳定排序后复制到实例变量self.dfw，每个品种的数据是连续的一块，行号区间保存在self._blocks中。
+        7. 将self.dfw中的 weight 列转换为浮点型，并保留self.digits位小数。
         8. 执行backtest()方法进行回测，并将结果保存在实例变量self.results中。
 
         :param dfw: pd.DataFrame, columns = ['dt', 'symbol', 'weight', 'price'], 持仓权重数据，其中
@@ -276,14 +508,26 @@ class WeightBacktest:
 
         """
         self.kwargs = kwargs
-        self.dfw = dfw.copy()
-        if self.dfw.isnull().sum().sum() > 0:
+        if dfw.isnull().values.any():
             raise ValueError("dfw 中存在空值, 请先处理")
         self.digits = digits
         self.fee_rate = kwargs.get("fee_rate", 0.0002)
+
+        # 按品种分块：只排序一次，后续各品种直接按行号切片，不再对全表反复筛选
+        codes, uniques = pd.factorize(dfw["symbol"], sort=True)
+        self.symbols = uniques[pd.unique(codes)].tolist()
+        if len(codes) > 1 and np.any(codes[1:] < codes[:-1]):
+            self.dfw = dfw.take(np.argsort(codes, kind="stable"))
+        else:
+            self.dfw = dfw.copy()
+        self.dfw.index = pd.RangeIndex(len(self.dfw))
         self.dfw["weight"] = self.dfw["weight"].astype("float").round(digits)
-        self.symbols = list(self.dfw["symbol"].unique().tolist())
+
+        ends = np.cumsum(np.bincount(codes, minlength=len(uniques)))
+        self._starts = ends - np.bincount(codes, minlength=len(uniques))
+        self._blocks = {symbol: (int(s), int(e)) for symbol, s, e in zip(uniques, self._starts, ends)}
         self._dailys = None
+        self.res_path = None
         self.results = self.backtest(n_jobs=kwargs.get("n_jobs", 1))
 
     @property
@@ -311,7 +555,15 @@ class WeightBacktest:
             cost        交易成本
             turnover    当日的单边换手率
         """
-        return self._dailys.copy() if self._dailys is not None else pd.DataFrame()
+        dailys = self._all_dailys()
+        return dailys.copy() if dailys is not None else pd.DataFrame()
+
+    def _all_dailys(self):
+        """所有品种的日收益；append 之后按需从 results 中拼接，不在每次增量回测时重建"""
+        if self._dailys is None and self._states:
+            symbols = sorted(self._states)
+            self._dailys = pd.concat([self.results[symbol]["daily"] for symbol in symbols], ignore_index=True)
+        return self._dailys
 
     @property
     def alpha(self) -> pd.DataFrame:
@@ -319,9 +571,10 @@ class WeightBacktest:
 
         columns = ['date', '策略', '基准', '超额']
         """
-        if self._dailys is None:
+        dailys = self._all_dailys()
+        if dailys is None:
             return pd.DataFrame()
-        df1 = self._dailys.groupby("date").agg({"return": "mean", "n1b": "mean"})
+        df1 = dailys.groupby("date").agg({"return": "mean", "n1b": "mean"})
         df1["alpha"] = df1["return"] - df1["n1b"]
         df1.rename(columns={"return": "策略", "n1b": "基准", "alpha": "超额"}, inplace=True)
         df1 = df1.reset_index()
@@ -350,7 +603,7 @@ class WeightBacktest:
 
         函数计算逻辑：
 
-        1. 从实例变量self.dfw中筛选出交易标的为symbol的数据，并复制到新的DataFrame dfs。
+        1. 从实例变量self.dfw中按行号区间切片取出交易标的为symbol的数据。
         2. 计算每条数据的收益（edge）：权重乘以下一条数据的价格除以当前价格减1。
         3. 计算每条数据的手续费（cost）：当前权重与前一条数据权重之差的绝对值乘以实例变量self.fee_rate。
         4. 计算每条数据扣除手续费后的收益（edge_post_fee）：收益减去手续费。
@@ -384,132 +637,36 @@ class WeightBacktest:
                 2019-01-08  DLi9001   -0.0004743    -0.0016243    0.00115
                 ==========  ========  ============  ============  =======
         """
-        dfs = self.dfw[self.dfw["symbol"] == symbol].copy()
-        dfs["n1b"] = dfs["price"].shift(-1) / dfs["price"] - 1
-        dfs["edge"] = dfs["weight"] * dfs["n1b"]
-        dfs["turnover"] = abs(dfs["weight"].shift(1) - dfs["weight"])
-        dfs["cost"] = dfs["turnover"] * self.fee_rate
-        dfs["edge_post_fee"] = dfs["edge"] - dfs["cost"]
-        daily = (
-            dfs.groupby(dfs["dt"].dt.date)
-            .agg({"edge": "sum", "edge_post_fee": "sum", "cost": "sum", "n1b": "sum", "turnover": "sum"})
-            .reset_index()
-        )
-        daily["symbol"] = symbol
-        daily.rename(columns={"edge_post_fee": "return", "dt": "date"}, inplace=True)
-        daily = daily[["date", "symbol", "n1b", "edge", "return", "cost", "turnover"]].copy()
-        return daily
+        if self.dfw is None:
+            return self.results[symbol]["daily"].copy()
+        s, e = self._blocks[symbol]
+        return _symbol_daily(self.dfw.iloc[s:e], [0], self.fee_rate)
 
     def get_symbol_pairs(self, symbol):
         """获取某个合约的开平交易记录
 
         函数计算逻辑：
 
-        1. 从实例变量self.dfw中筛选出交易标的为symbol的数据，并复制到新的DataFrame dfs。
-        2. 将权重乘以10的self.digits次方，并转换为整数类型，作为volume列的值。
-        3. 生成bar_id列，从1开始递增，与行数对应。
-        4. 创建一个空列表operates，用于存储开平仓交易记录。
-        5. 定义内部函数__add_operate，用于向operates列表中添加开平仓交易记录。
-           函数接受日期dt、bar_id、交易量volume、价格price和操作类型operate作为参数。
-           函数根据交易量的绝对值循环添加交易记录到operates列表中。
-        6. 将dfs转换为字典列表rows。
-        7. 处理第一个行记录。
-           - 如果volume大于0，则调用__add_operate函数添加"开多"操作的交易记录。
-           - 如果volume小于0，则调用__add_operate函数添加"开空"操作的交易记录。
-        8. 处理后续的行记录。
-           - 使用zip函数遍历rows[:-1]和rows[1:]，同时获取当前行row1和下一行row2。
-           - 根据volume的正负和变化情况，调用__add_operate函数添加对应的开平仓交易记录。
-        9. 创建空列表pairs和opens，用于存储交易对和开仓记录。
-        10. 遍历operates列表中的交易记录。
-            - 如果操作类型为"开多"或"开空"，将交易记录添加到opens列表中，并继续下一次循环。
-            - 如果操作类型为"平多"或"平空"，将对应的开仓记录从opens列表中弹出。
-              根据开仓和平仓的价格计算盈亏比例，并创建一个交易对字典，将其添加到pairs列表中。
-        11. 将pairs列表转换为DataFrame，并返回包含交易标的的开平仓交易记录的DataFrame。
+        1. 从实例变量self.dfw中按行号区间切片取出交易标的为symbol的数据。
+        2. 将权重乘以10的self.digits次方，并转换为整数类型，作为持仓手数。
+        3. 只遍历持仓手数发生变化的行，根据手数的正负和变化情况判断开仓、平仓或多空反转。
+           - 开仓时，将 [开仓手数, 行号] 作为一个分段压入开仓栈。
+           - 平仓时，按后进先出的顺序从栈顶分段扣减手数，一个分段可以被部分平仓，每次扣减记录一个平仓分段。
+        4. 对每个平仓分段，根据开仓和平仓的价格计算盈亏比例，再按手数展开，每一手对应一条交易记录。
+        5. 返回包含交易标的的开平仓交易记录的DataFrame，持仓K线数按行号计算，从1开始。
 
+        不保存 dfw 时直接从 results 中读取；results 中没有 pairs 时（from_stream 设置了 res_path），
+        从 res_path/symbols/{symbol}.pkl 以及 append 追加写入的 {symbol}.append{i}.pkl 中读取。
         """
-        dfs = self.dfw[self.dfw["symbol"] == symbol].copy()
-        dfs["volume"] = (dfs["weight"] * pow(10, self.digits)).astype(int)
-        dfs["bar_id"] = list(range(1, len(dfs) + 1))
-
-        # 根据权重变化生成开平仓记录
-        operates = []
-
-        def __add_operate(dt, bar_id, volume, price, operate):
-            for _ in range(abs(volume)):
-                _op = {"bar_id": bar_id, "dt": dt, "price": price, "operate": operate}
-                operates.append(_op)
-
-        rows = dfs.to_dict(orient="records")
-
-        # 处理第一个 row
-        if rows[0]["volume"] > 0:
-            __add_operate(rows[0]["dt"], rows[0]["bar_id"], rows[0]["volume"], rows[0]["price"], operate="开多")
-        elif rows[0]["volume"] < 0:
-            __add_operate(rows[0]["dt"], rows[0]["bar_id"], rows[0]["volume"], rows[0]["price"], operate="开空")
-
-        # 处理后续 rows
-        for row1, row2 in zip(rows[:-1], rows[1:]):
-            if row1["volume"] >= 0 and row2["volume"] >= 0:
-                # 多头仓位变化对应的操作
-                if row2["volume"] > row1["volume"]:
-                    __add_operate(
-                        row2["dt"], row2["bar_id"], row2["volume"] - row1["volume"], row2["price"], operate="开多"
-                    )
-                elif row2["volume"] < row1["volume"]:
-                    __add_operate(
-                        row2["dt"], row2["bar_id"], row1["volume"] - row2["volume"], row2["price"], operate="平多"
-                    )
-
-            elif row1["volume"] <= 0 and row2["volume"] <= 0:
-                # 空头仓位变化对应的操作
-                if row2["volume"] > row1["volume"]:
-                    __add_operate(
-                        row2["dt"], row2["bar_id"], row1["volume"] - row2["volume"], row2["price"], operate="平空"
-                    )
-                elif row2["volume"] < row1["volume"]:
-                    __add_operate(
-                        row2["dt"], row2["bar_id"], row2["volume"] - row1["volume"], row2["price"], operate="开空"
-                    )
-
-            elif row1["volume"] >= 0 >= row2["volume"]:
-                # 多头转换成空头对应的操作
-                __add_operate(row2["dt"], row2["bar_id"], row1["volume"], row2["price"], operate="平多")
-                __add_operate(row2["dt"], row2["bar_id"], row2["volume"], row2["price"], operate="开空")
-
-            elif row1["volume"] <= 0 <= row2["volume"]:
-                # 空头转换成多头对应的操作
-                __add_operate(row2["dt"], row2["bar_id"], row1["volume"], row2["price"], operate="平空")
-                __add_operate(row2["dt"], row2["bar_id"], row2["volume"], row2["price"], operate="开多")
-
-        pairs, opens = [], []
-        for op in operates:
-            if op["operate"] in ["开多", "开空"]:
-                opens.append(op)
-                continue
-
-            assert op["operate"] in ["平多", "平空"]
-            open_op = opens.pop()
-            if open_op["operate"] == "开多":
-                p_ret = round((op["price"] - open_op["price"]) / open_op["price"] * 10000, 2)
-                p_dir = "多头"
-            else:
-                p_ret = round((open_op["price"] - op["price"]) / open_op["price"] * 10000, 2)
-                p_dir = "空头"
-            pair = {
-                "标的代码": symbol,
-                "交易方向": p_dir,
-                "开仓时间": open_op["dt"],
-                "平仓时间": op["dt"],
-                "开仓价格": open_op["price"],
-                "平仓价格": op["price"],
-                "持仓K线数": op["bar_id"] - open_op["bar_id"] + 1,
-                "事件序列": f"{open_op['operate']} -> {op['operate']}",
-                "持仓天数": (op["dt"] - open_op["dt"]).days,
-                "盈亏比例": p_ret,
-            }
-            pairs.append(pair)
-        df_pairs = pd.DataFrame(pairs)
-        return df_pairs
+        if self.dfw is None:
+            if "pairs" in self.results[symbol]:
+                return self.results[symbol]["pairs"].copy()
+            dfp = pd.read_pickle(self.res_path.joinpath(f"{symbol}.pkl"))["pairs"]
+            for i in range(1, self._states[symbol].get("parts", 0) + 1):
+                dfp = _concat_pairs(dfp, pd.read_pickle(self.res_path.joinpath(f"{symbol}.append{i}.pkl"))["pairs"])
+            return dfp
+        s, e = self._blocks[symbol]
+        return _symbol_pairs(self.dfw.iloc[s:e], symbol, self.digits)[0]
 
     def process_symbol(self, symbol):
         """处理某个合约的回测数据"""
@@ -522,54 +679,237 @@ class WeightBacktest:
 
         函数计算逻辑：
 
-        1. 获取数据：遍历所有合约，调用get_symbol_daily方法获取每个合约的日收益，调用get_symbol_pairs方法获取每个合约的交易流水。
+        1. 获取数据：对按品种分块的self.dfw一次性向量化计算所有合约的日收益；遍历所有合约，调用get_symbol_pairs方法获取
+            每个合约的交易流水，多进程时只把单个合约的数据切片发送给子进程。
 
         2. 数据处理：将每个合约的日收益合并为一个DataFrame，使用pd.pivot_table方法将数据重塑为以日期为索引、合约为列、
             收益率为值的表格，并将缺失值填充为0。计算所有合约收益率的平均值，并将该列添加到DataFrame中。将结果存储在res字典中，
             键为合约名，值为包含日行情数据和交易对数据的字典。
 
-        3. 绩效评价：计算回测结果的开始日期和结束日期，调用daily_performance方法评估总收益率的绩效指标。将每个合约的交易对数据
-            合并为一个DataFrame，调用evaluate_pairs方法评估交易对的绩效指标。将结果存储在stats字典中，并更新到绩效评价的字典中。
+        3. 绩效评价：计算回测结果的开始日期和结束日期，调用daily_performance方法评估总收益率的绩效指标。累计每个合约交易对的
+            统计量（交易次数、盈亏比例之和等），计算与evaluate_pairs一致的交易绩效指标。将结果存储在stats字典中，并更新到绩效评价的字典中。
 
         4. 返回结果：将合约的等权日收益数据和绩效评价结果存储在res字典中，并将该字典作为函数的返回结果。
         """
         n_jobs = min(n_jobs, cpu_count())
         logger.info(f"n_jobs={n_jobs}，将使用 {n_jobs} 个进程进行回测")
 
-        symbols = self.symbols
-        res = {}
+        symbols = sorted(self.symbols)
+        dailys = _symbol_daily(self.dfw, self._starts, self.fee_rate)
+        self._dailys = dailys
+
         if n_jobs <= 1:
-            for symbol in tqdm(sorted(symbols), desc="WBT进度", leave=False):
-                res[symbol] = self.process_symbol(symbol)[1]
+            outs = []
+            for symbol in tqdm(symbols, desc="WBT进度", leave=False):
+                outs.append(_symbol_pairs(self.dfw.iloc[slice(*self._blocks[symbol])], symbol, self.digits))
         else:
+            dfs_list = [self.dfw.iloc[slice(*self._blocks[symbol])][["dt", "weight", "price"]] for symbol in symbols]
             with ProcessPoolExecutor(n_jobs) as pool:
-                for symbol, res_symbol in tqdm(
-                    pool.map(self.process_symbol, sorted(symbols)), desc="WBT进度", total=len(symbols), leave=False
-                ):
-                    res[symbol] = res_symbol
-
-        self._dailys = pd.concat([v["daily"] for k, v in res.items() if k in symbols], ignore_index=True)
-
-        dret = pd.concat([v["daily"] for k, v in res.items() if k in symbols], ignore_index=True)
-        dret = pd.pivot_table(dret, index="date", columns="symbol", values="return").fillna(0)
-        dret["total"] = dret[list(res.keys())].mean(axis=1)
+                tasks = pool.map(_symbol_pairs, dfs_list, symbols, [self.digits] * len(symbols))
+                outs = list(tqdm(tasks, desc="WBT进度", total=len(symbols), leave=False))
+            del dfs_list
+
+        res, self._states = {}, {}
+        sym = dailys["symbol"].to_numpy()
+        bounds = [0] + (np.flatnonzero(sym[1:] != sym[:-1]) + 1).tolist() + [len(sym)]
+        for i, symbol in enumerate(symbols):
+            daily = dailys.iloc[bounds[i] : bounds[i + 1]].reset_index(drop=True)
+            dfp, state = outs[i]
+            res[symbol] = {"daily": daily, "pairs": dfp}
+            tail = _daily_tail(self.dfw.iloc[slice(*self._blocks[symbol])])
+            self._states[symbol] = {"tail": tail, "pairs": state, "stats": _pairs_sums(dfp)}
+
+        weight = self.dfw["weight"].to_numpy()
+        self._counts = {"rows": len(weight), "long": np.count_nonzero(weight > 0), "short": np.count_nonzero(weight < 0)}
+        dret = pd.pivot_table(dailys, index="date", columns="symbol", values="return").fillna(0)
+        return self._summary(res, dret)
+
+    def _summary(self, res, dret):
+        """根据各合约的日收益与交易统计量，汇总品种等权日收益与绩效评价
+
+        交易绩效由 self._states 中各品种累计的交易统计量计算，不再拼接全部交易记录；
+        daily_performance 仍然需要遍历全部日收益，这一步的复杂度是 O(交易日数量)。
+
+        :param res: dict, 按合约代码排序的各合约回测结果，value 中必须包含 daily
+        :param dret: pd.DataFrame, 各合约的日收益，index 为 date，columns 为合约代码，不包含 total 列
+        :return: dict, 回测结果
+        """
+        symbols = list(res.keys())
+        long_rate = self._counts["long"] / self._counts["rows"]
+        short_rate = self._counts["short"] / self._counts["rows"]
+        dret["total"] = dret[symbols].mean(axis=1)
         res["品种等权日收益"] = dret
 
         stats = {"开始日期": dret.index.min().strftime("%Y%m%d"), "结束日期": dret.index.max().strftime("%Y%m%d")}
         stats.update(daily_performance(dret["total"]))
-        dfp = pd.concat([v["pairs"] for k, v in res.items() if k in symbols], ignore_index=True)
-        pairs_stats = evaluate_pairs(dfp)
-        pairs_stats = {k: v for k, v in pairs_stats.items() if k in ["单笔收益", "持仓K线数", "交易胜率", "持仓天数"]}
-        stats.update(pairs_stats)
-
-        dfw = self.dfw.copy()
-        long_rate = dfw[dfw["weight"] > 0].shape[0] / dfw.shape[0]
-        short_rate = dfw[dfw["weight"] < 0].shape[0] / dfw.shape[0]
+        stats.update(_pairs_stats(sum(self._states[symbol]["stats"] for symbol in symbols)))
         stats.update({"多头占比": long_rate, "空头占比": short_rate})
 
         res["绩效评价"] = stats
         return res
 
+    @classmethod
+    def from_stream(cls, source, digits=2, res_path=None, **kwargs):
+        """流式持仓权重回测，逐个品种读取、计算，适用于无法一次性载入内存的持仓权重数据
+
+        每次只在内存中保留一个品种的持仓权重，品种计算完成后即释放；回测结果与一次性载入 dfw 的结果完全一致。
+        返回的对象不保存 dfw（self.dfw 为 None），get_symbol_daily / get_symbol_pairs 直接从 results 或 res_path 中读取。
+
+        :param source: 持仓权重数据源，支持以下两种形式：
+
+            - str / Path: parquet 或 feather 文件路径，也可以是 parquet 数据集目录，详见 iter_symbol_weights
+            - 迭代器: 每次返回一个 pd.DataFrame，columns = ['dt', 'symbol', 'weight', 'price']，
+              同一个品种的全部数据必须在同一个 DataFrame 中
+
+        :param digits: int, 权重列保留小数位数
+        :param res_path: str, 结果保存路径；不为空时，每个品种计算完成后立即将 daily 与 pairs 写入
+            res_path/symbols/{symbol}.pkl，results 中不再保留各品种的 pairs，进一步降低内存占用
+        :param kwargs: 同 WeightBacktest，n_jobs 参数不生效
+        :return: WeightBacktest
+        """
+        wb = cls.__new__(cls)
+        wb.kwargs = kwargs
+        wb.digits = digits
+        wb.fee_rate = kwargs.get("fee_rate", 0.0002)
+        wb.dfw = None
+        wb.symbols = []
+        wb._dailys = None
+        wb._states = {}
+        wb._counts = {"rows": 0, "long": 0, "short": 0}
+        if res_path:
+            res_path = Path(res_path).joinpath("symbols")
+            res_path.mkdir(exist_ok=True, parents=True)
+        wb.res_path = res_path or None
+
+        res = {}
+        for symbol, dfs in tqdm(iter_symbol_weights(source), desc="WBT进度", leave=False):
+            if symbol in res:
+                raise ValueError(f"{symbol} 的持仓权重必须在同一个数据块中")
+            if dfs.isnull().values.any():
+                raise ValueError("dfw 中存在空值, 请先处理")
+
+            dfs = dfs.reset_index(drop=True)
+            dfs["weight"] = dfs["weight"].astype("float").round(digits)
+            daily = _symbol_daily(dfs, [0], wb.fee_rate)
+            dfp, state = _symbol_pairs(dfs, symbol, digits)
+            wb._update_counts(dfs["weight"].to_numpy())
+            wb._states[symbol] = {"tail": _daily_tail(dfs), "pairs": state, "stats": _pairs_sums(dfp)}
+            wb.symbols.append(symbol)
+            wb._set_symbol(res, symbol, daily, dfp)
+
+        symbols = sorted(res.keys())
+        res = {symbol: res[symbol] for symbol in symbols}
+        wb._dailys = pd.concat([v["daily"] for v in res.values()], ignore_index=True)
+        dret = pd.pivot_table(wb._dailys, index="date", columns="symbol", values="return").fillna(0)
+        wb.results = wb._summary(res, dret)
+        return wb
+
+    def _set_symbol(self, res, symbol, daily, dfp):
+        """保存单个品种的回测结果
+
+        设置了 res_path 时，将 daily 与完整的 pairs 写入 res_path/symbols/{symbol}.pkl，results 中只保留 daily
+        """
+        if self.res_path:
+            save_pkl({"daily": daily, "pairs": dfp}, self.res_path.joinpath(f"{symbol}.pkl"))
+            res[symbol] = {"daily": daily}
+        else:
+            res[symbol] = {"daily": daily, "pairs": dfp}
+
+    def _update_counts(self, weight):
+        """累加持仓权重的行数、多头行数、空头行数，用于计算多头占比与空头占比"""
+        self._counts["rows"] += len(weight)
+        self._counts["long"] += np.count_nonzero(weight > 0)
+        self._counts["short"] += np.count_nonzero(weight < 0)
+
+    def append(self, dfw_new):
+        """增量回测：在已有回测结果的基础上追加新的持仓权重数据，只计算新增的数据，结果与全量重新回测一致
+
+        已有回测在 self._states 中保存了每个品种的增量状态（最后一个交易日的持仓权重、未平仓的开仓分段、
+        已处理的K线数量、累计的交易统计量），新数据到达时只需要重算最后一个交易日的收益，再继续处理新增的K线；
+        交易绩效由累计的交易统计量计算，品种等权日收益只更新新增的交易日。append 之后不再保留 dfw，
+        get_symbol_daily / get_symbol_pairs 直接从 results 中读取。from_stream 设置了 res_path 时，
+        新增品种写入 res_path/symbols/{symbol}.pkl，已有品种新增的 daily、pairs 追加写入
+        res_path/symbols/{symbol}.append{i}.pkl，不再重写已有的文件。
+
+        注意：已有品种的 daily 仍然需要与新增部分拼接，daily_performance 也需要遍历全部日收益，
+        所以每次 append 的汇总步骤仍然是 O(历史交易日数量)；results 中保留 pairs 时（未设置 res_path），
+        已有品种的 pairs 同样需要拼接，是 O(该品种的交易记录数量)。
+
+        :param dfw_new: pd.DataFrame, columns = ['dt', 'symbol', 'weight', 'price']，新增的持仓权重数据；
+            每个品种的 dt 必须晚于该品种已有数据的最后时间，允许出现新的品种
+        :return: dict, 更新后的回测结果
+        """
+        if dfw_new.isnull().values.any():
+            raise ValueError("dfw 中存在空值, 请先处理")
+
+        groups = list(dfw_new.groupby("symbol", sort=False))
+        for symbol, dfs in groups:
+            if symbol in self._states and dfs["dt"].min() <= self._states[symbol]["tail"]["dt"].iloc[-1]:
+                last_dt = self._states[symbol]["tail"]["dt"].iloc[-1]
+                raise ValueError(f"{symbol} 新增数据的 dt 必须晚于已有数据的最后时间 {last_dt}")
+
+        res = {symbol: self.results[symbol] for symbol in self._states}
+        news = []
+        for symbol, dfs in groups:
+            dfs = dfs[["dt", "symbol", "weight", "price"]].reset_index(drop=True)
+            dfs["weight"] = dfs["weight"].astype("float").round(self.digits)
+            self._update_counts(dfs["weight"].to_numpy())
+
+            if symbol not in self._states:
+                daily = _symbol_daily(dfs, [0], self.fee_rate)
+                dfp, state = _symbol_pairs(dfs, symbol, self.digits)
+                self._set_symbol(res, symbol, daily, dfp)
+                self._states[symbol] = {"tail": _daily_tail(dfs), "pairs": state, "stats": _pairs_sums(dfp)}
+                self.symbols.append(symbol)
+                news.append(daily)
+                continue
+
+            st = self._states[symbol]
+            tail = st["tail"]
+            # 用最后一个交易日的数据（及其前一行）与新数据拼接，重算最后一个交易日及之后的日收益
+            dfs = pd.concat([tail, dfs], ignore_index=True)
+            daily = _symbol_daily(dfs, [0], self.fee_rate)
+            daily = daily[daily["date"] >= tail["dt"].iloc[-1].date()].reset_index(drop=True)
+            news.append(daily)
+
+            dfp, state = _symbol_pairs(dfs.iloc[len(tail) :], symbol, self.digits, st["pairs"])
+            res[symbol] = dict(res[symbol], daily=pd.concat([res[symbol]["daily"].iloc[:-1], daily], ignore_index=True))
+            if "pairs" in res[symbol]:
+                res[symbol]["pairs"] = _concat_pairs(res[symbol]["pairs"], dfp)
+            else:
+                # res_path 模式下只追加写入新增的部分，最后一个交易日的 daily 以追加的文件为准
+                st["parts"] = st.get("parts", 0) + 1
+                save_pkl({"daily": daily, "pairs": dfp}, self.res_path.joinpath(f"{symbol}.append{st['parts']}.pkl"))
+            st.update({"tail": _daily_tail(dfs), "pairs": state, "stats": st["stats"] + _pairs_sums(dfp)})
+
+        # 只对新增的交易日做透视，合并到已有的品种日收益中
+        dret = self.results["品种等权日收益"].drop(columns="total")
+        dret_new = pd.pivot_table(pd.concat(news, ignore_index=True), index="date", columns="symbol", values="return")
+        dret = dret.reindex(index=dret.index.union(dret_new.index), columns=dret.columns.union(dret_new.columns))
+        dret = dret.fillna(0)
+        dret.update(dret_new)
+
+        symbols = sorted(res.keys())
+        res = {symbol: res[symbol] for symbol in symbols}
+        self.dfw, self._blocks, self._starts = None, {}, None
+        self._dailys = None
+        self.results = self._summary(res, dret)
+        return self.results
+
+    def save(self, file):
+        """保存回测结果与增量状态（不包含 dfw），后续可以通过 WeightBacktest.load 加载后调用 append 增量回测"""
+        wb = self.__class__.__new__(self.__class__)
+        wb.__dict__.update(self.__dict__)
+        wb.__dict__.update({"dfw": None, "_blocks": {}, "_starts": None})
+        pd.to_pickle(wb, file)
+
+    @classmethod
+    def load(cls, file):
+        """加载 save 保存的回测对象"""
+        wb = pd.read_pickle(file)
+        assert isinstance(wb, cls), f"{file} 不是 {cls.__name__} 对象"
+        return wb
+
     def report(self, res_path):
         """回测报告"""
         res_path = Path(res_path)
@@ -10,9 +10,9 @@ from . import echarts_plot
 from .echarts_plot import kline_pro, heat_map
 from .word_writer import WordWriter
 from .corr import nmi_matrix, single_linear, cross_sectional_ic
-from .bar_generator import BarGenerator, freq_end_time, resample_bars, format_standard_kline
+from .bar_generator import BarGenerator, freq_end_time, freq_end_times, resample_bars, resample_bars_multi, format_standard_kline
 from .bar_generator import is_trading_time, get_intraday_times, check_freq_and_market
-from .io import dill_dump, dill_load, read_json, save_json
+from .io import dill_dump, dill_load, read_json, save_json, save_parquet
 from .sig import check_pressure_support, check_gap_info, is_bis_down, is_bis_up, get_sub_elements, is_symmetry_zs
 from .sig import same_dir_counts, fast_slow_cross, count_last_same, create_single_signal
 from .plotly_plot import KlineChart
@@ -29,7 +29,7 @@ from .stats import (
     psi,
 )
 from .signal_analyzer import SignalAnalyzer, SignalPerformance
-from .cache import home_path, get_dir_size, empty_cache_path, DiskCache, disk_cache, clear_cache
+from .cache import home_path, get_dir_size, empty_cache_path, DiskCache, disk_cache, clear_cache, hash_args
 from .index_composition import index_composition
 from .data_client import DataClient, set_url_token, get_url_token
 from .oss import AliyunOSS
@@ -5,7 +5,9 @@ email: zeng_bin8888@163.com
 create_dt: 2021/11/14 12:39
 describe: 从任意周期K线开始合成更高周期K线的工具类
 """
+import numpy as np
 import pandas as pd
+from functools import lru_cache
 from datetime import datetime, timedelta, date
 from typing import List, Union, AnyStr, Optional
 from czsc.objects import RawBar, Freq
@@ -21,6 +23,29 @@ for _m, dfg in mss.groupby("market"):
         freq_edt_map[f"{_f}_{_m}"] = {k: v for k, v in dfg[["time", _f]].values}
 
 
+def _create_freq_edt_minutes():
+    """将 freq_edt_map 转换为 一天中的分钟序号 -> 周期结束时间距当日零点的分钟数 的整数查找表
+
+    查找表长度为 1440，不在交易时间内的分钟取值为 -1；跨日的结束时间（00:00）记为 1440，即次日零点
+    """
+    tables = {}
+    for key, edt_map in freq_edt_map.items():
+        table = [-1] * 1440
+        is_f1 = key.startswith("1分钟_")
+        for hm, edt in edt_map.items():
+            h, m = map(int, hm.split(":"))
+            eh, em = map(int, edt.split(":"))
+            minute = eh * 60 + em
+            if minute == 0 and not is_f1 and hm != "00:00":
+                minute = 1440
+            table[(h * 60 + m) % 1440] = minute
+        tables[key] = table
+    return tables
+
+
+freq_edt_minutes = _create_freq_edt_minutes()
+
+
 def is_trading_time(dt: datetime = datetime.now(), market="A股"):
     """判断指定时间是否是交易时间"""
     hm = dt.strftime("%H:%M")
@@ -119,7 +144,11 @@ def freq_end_date(dt, freq: Union[Freq, AnyStr]):
         dt = pd.to_datetime(dt).date()
     if not isinstance(freq, Freq):
         freq = Freq(freq)
+    return _freq_end_date(dt, freq)
 
+
+@lru_cache(maxsize=4096)
+def _freq_end_date(dt: date, freq: Freq):
     dt = pd.to_datetime(dt)
     if freq == Freq.D:
         return dt
@@ -165,26 +194,85 @@ def freq_end_time(dt: datetime, freq: Union[Freq, AnyStr], market="A股") -> dat
     assert market in ["A股", "期货", "默认"], "market 参数必须为 A股 或 期货 或 默认"
     if not isinstance(freq, Freq):
         freq = Freq(freq)
-    if dt.second > 0 or dt.microsecond > 0:
-        dt = dt.replace(second=0, microsecond=0) + timedelta(minutes=1)
 
-    hm = dt.strftime("%H:%M")
-    key = f"{freq.value}_{market}"
     if freq.value.endswith("分钟"):
-        h, m = map(int, freq_edt_map[key][hm].split(":"))
-        edt = dt.replace(hour=h, minute=m)
-
-        if h == m == 0 and freq != Freq.F1 and hm != "00:00":
-            edt += timedelta(days=1)
-
-        return edt
+        return _minute_end_time(dt, freq_edt_minutes[f"{freq.value}_{market}"])
 
     # if not ("15:00" > hm > "09:00") and market == "期货":
     #     dt = next_trading_date(dt, n=1)
 
+    if dt.second > 0 or dt.microsecond > 0:
+        dt = dt.replace(second=0, microsecond=0) + timedelta(minutes=1)
     return freq_end_date(dt.date(), freq)
 
 
+def _minute_end_time(dt: datetime, table: List[int]) -> datetime:
+    """使用 freq_edt_minutes 中的查找表计算分钟级别K线的周期结束时间"""
+    if dt.second > 0 or dt.microsecond > 0:
+        dt = dt.replace(second=0, microsecond=0) + timedelta(minutes=1)
+
+    minute = table[dt.hour * 60 + dt.minute]
+    if minute < 0:
+        raise KeyError(dt.strftime("%H:%M"))
+    return dt.replace(hour=0, minute=0) + timedelta(minutes=minute)
+
+
+def freq_end_times(dts, freq: Union[Freq, AnyStr], market="A股") -> pd.DatetimeIndex:
+    """向量化计算一组时间对应的K线周期结束时间，结果与逐个调用 freq_end_time 一致
+
+    分钟级别周期使用 freq_edt_minutes 查找表按一天中的分钟序号取值；日线及以上周期直接在日期数组上计算。
+
+    :param dts: 时间序列，可以是 pd.Series、pd.DatetimeIndex、np.ndarray 或 datetime 列表
+    :param freq: 目标周期
+    :param market: str, A股 或 期货 或 默认
+    :return: pd.DatetimeIndex，与 dts 一一对应
+    """
+    assert market in ["A股", "期货", "默认"], "market 参数必须为 A股 或 期货 或 默认"
+    if not isinstance(freq, Freq):
+        freq = Freq(freq)
+
+    dts = pd.DatetimeIndex(dts)
+    tz = dts.tz
+    if tz is not None:
+        dts = dts.tz_localize(None)
+    values = dts.values.astype("datetime64[ns]").view("int64")
+
+    # 秒或微秒不为 0 时，向后取整到分钟
+    minute_ns, day_ns = 60 * 10**9, 86400 * 10**9
+    rem = values % minute_ns
+    values = values - rem + np.where(rem >= 1000, minute_ns, 0)
+    days = values // day_ns
+
+    if freq.value.endswith("分钟"):
+        table = np.asarray(freq_edt_minutes[f"{freq.value}_{market}"], dtype=np.int64)
+        minutes = table[(values - days * day_ns) // minute_ns]
+        if len(minutes) and minutes.min() < 0:
+            i = int(np.argmax(minutes < 0))
+            raise KeyError(pd.Timestamp(values[i]).strftime("%H:%M"))
+        edt = (days * day_ns + minutes * minute_ns).view("datetime64[ns]")
+
+    else:
+        d = days.view("datetime64[D]")
+        if freq == Freq.D:
+            edt = d
+        elif freq == Freq.W:
+            # 1970-01-01 是星期四，isoweekday 为 4
+            edt = d + (5 - ((days + 3) % 7 + 1))
+        elif freq == Freq.M:
+            edt = (d.astype("datetime64[M]") + 1).astype("datetime64[D]") - 1
+        elif freq == Freq.S:
+            months = d.astype("datetime64[M]").view("int64")
+            edt = (months - months % 3 + 3).view("datetime64[M]").astype("datetime64[D]") - 1
+        elif freq == Freq.Y:
+            edt = (d.astype("datetime64[Y]") + 1).astype("datetime64[D]") - 1
+        else:
+            edt = np.array([freq_end_time(x, freq, market) for x in dts], dtype="datetime64[ns]")
+        edt = edt.astype("datetime64[ns]")
+
+    edt = pd.DatetimeIndex(edt)
+    return edt.tz_localize(tz) if tz is not None else edt
+
+
 def resample_bars(df: pd.DataFrame, target_freq: Union[Freq, AnyStr], raw_bars=True, **kwargs):
     """将给定的K线数据重新采样为目标周期的K线数据
 
@@ -194,7 +282,8 @@ def resample_bars(df: pd.DataFrame, target_freq: Union[Freq, AnyStr], raw_bars=T
     2. 添加一个新列`freq_edt`，表示每个数据点对应的目标周期的结束时间。
     3. 根据`freq_edt`对数据进行分组，并对每组数据进行聚合，得到目标周期的K线数据。
     4. 重置索引，并选择需要的列。
-    5. 根据`raw_bars`参数，决定返回的数据类型：如果为True，转换为`RawBar`对象；如果为False，直接返回DataFrame。
+    5. 根据`raw_bars`参数，决定返回的数据类型：如果为True，转换为`RawBar`对象；如果为False，直接返回DataFrame；
+        如果`columnar`参数为True，返回各列的 numpy 数组，不创建`RawBar`对象。
     6. 如果`drop_unfinished`参数为True，删除最后一根未完成的K线。
 
     :param df: 原始K线数据，必须包含以下列：symbol, dt, open, close, high, low, vol, amount。样例如下：
@@ -216,6 +305,8 @@ def resample_bars(df: pd.DataFrame, target_freq: Union[Freq, AnyStr], raw_bars=T
 
         - base_freq: 基础周期，如果不指定，则根据df中的dt列自动推断
         - drop_unfinished: 是否删除最后一根未完成的K线
+        - columnar: 是否返回列式数据，默认为 False；为 True 时返回 {列名: np.ndarray} 字典，
+            包含 symbol, dt, open, close, high, low, vol, amount，可以直接传给 CZSC.from_arrays
 
     :return: 转换后的K线序列
     """
@@ -224,12 +315,12 @@ def resample_bars(df: pd.DataFrame, target_freq: Union[Freq, AnyStr], raw_bars=T
 
     base_freq = kwargs.get("base_freq", None)
     if target_freq.value.endswith("分钟"):
-        uni_times = sorted(df["dt"].tail(2000).apply(lambda x: x.strftime("%H:%M")).unique().tolist())
+        uni_times = sorted(pd.to_datetime(df["dt"].tail(2000)).dt.strftime("%H:%M").unique().tolist())
         _, market = check_freq_and_market(uni_times, freq=base_freq)
     else:
         market = "默认"
 
-    df["freq_edt"] = df["dt"].apply(lambda x: freq_end_time(x, target_freq, market))
+    df["freq_edt"] = freq_end_times(df["dt"], target_freq, market)
     dfk1 = df.groupby("freq_edt").agg(
         {
             "symbol": "first",
@@ -246,38 +337,187 @@ def resample_bars(df: pd.DataFrame, target_freq: Union[Freq, AnyStr], raw_bars=T
     dfk1.reset_index(drop=True, inplace=True)
     dfk1["dt"] = dfk1["freq_edt"]
     dfk1 = dfk1[["symbol", "dt", "open", "close", "high", "low", "vol", "amount"]]
+    return _format_resampled(dfk1, df["dt"].iloc[-1], target_freq, raw_bars, **kwargs)
 
-    if raw_bars:
-        _bars = []
-        for i, row in enumerate(dfk1.to_dict("records"), 1):
-            row.update({"id": i, "freq": target_freq})
-            _bars.append(RawBar(**row))
-
-        if kwargs.get("drop_unfinished", True):
-            # 清除最后一根未完成的K线
-            if df["dt"].iloc[-1] < _bars[-1].dt:
-                _bars.pop()
-        return _bars
-    else:
+
+def _format_resampled(dfk1: pd.DataFrame, last_dt, target_freq: Freq, raw_bars=True, **kwargs):
+    """按 raw_bars / columnar / drop_unfinished 参数输出重新采样的结果
+
+    :param dfk1: 重新采样后的K线数据，列为 symbol, dt, open, close, high, low, vol, amount
+    :param last_dt: 原始K线数据中最后一根K线的时间，用于判断最后一根K线是否完成
+    """
+    columnar = kwargs.get("columnar", False)
+    if not (raw_bars or columnar):
         return dfk1
 
+    if kwargs.get("drop_unfinished", True):
+        # 清除最后一根未完成的K线
+        if len(dfk1) and last_dt < dfk1["dt"].iloc[-1]:
+            dfk1 = dfk1.iloc[:-1]
+
+    if columnar:
+        return {col: dfk1[col].to_numpy() for col in dfk1.columns}
+
+    cols = [dfk1[col].tolist() for col in dfk1.columns]
+    _bars = [
+        RawBar(symbol=symbol, id=i, dt=dt, freq=target_freq, open=open_, close=close,
+               high=high, low=low, vol=vol, amount=amount)
+        for i, (symbol, dt, open_, close, high, low, vol, amount) in enumerate(zip(*cols), 1)
+    ]
+    return _bars
+
+
+def _aggregate_segments(data: dict, starts: np.ndarray) -> dict:
+    """按照连续分段聚合K线数据，starts 为每一段的起始位置"""
+    n = len(data["open"])
+    ends = np.append(starts[1:], n) - 1
+
+    res = {"symbol": data["symbol"][starts], "open": data["open"][starts], "close": data["close"][ends]}
+    res["high"] = np.fmax.reduceat(data["high"], starts)
+    res["low"] = np.fmin.reduceat(data["low"], starts)
+    for col in ["vol", "amount"]:
+        values = data[col]
+        if values.dtype.kind == "f":
+            values = np.where(np.isnan(values), 0, values)
+        res[col] = np.add.reduceat(values, starts)
+    return res
+
+
+def resample_bars_multi(df: pd.DataFrame, target_freqs: List[Union[Freq, AnyStr]], raw_bars=True, **kwargs) -> dict:
+    """一次性将给定的K线数据重新采样为多个目标周期的K线数据
+
+    函数计算逻辑：
+
+    1. 按照从小到大的顺序处理目标周期，每个周期使用 freq_end_times 计算原始K线对应的周期结束时间。
+    2. 如果已经合成的某个较小周期的每根K线都完整的落在目标周期的一根K线内（交易时段的分割相互嵌套），
+        直接在这个较小周期的结果上继续合成，不再对全部原始K线重新分组；否则从原始K线合成。
+    3. 每个周期的输出与 resample_bars 一致，由 raw_bars / columnar / drop_unfinished 参数决定。
+
+    :param df: 原始K线数据，必须包含以下列：symbol, dt, open, close, high, low, vol, amount；要求按 dt 升序排列
+    :param target_freqs: 目标周期列表
+    :param raw_bars: 是否将转换后的K线序列转换为RawBar对象
+    :param kwargs:
+
+        - base_freq: 基础周期，如果不指定，则根据df中的dt列自动推断
+        - market: 交易市场，如果不指定，则根据df中的dt列自动推断
+        - drop_unfinished: 是否删除最后一根未完成的K线
+        - columnar: 是否返回列式数据，参考 resample_bars
+
+    :return: dict，key 为目标周期名称，value 为对应周期的重新采样结果
+    """
+    from czsc.utils import sorted_freqs
+
+    freqs = {x.value: x for x in [f if isinstance(f, Freq) else Freq(f) for f in target_freqs]}
+    freqs = [freqs[x] for x in sorted(freqs.keys(), key=sorted_freqs.index)]
+
+    dts = pd.DatetimeIndex(pd.to_datetime(df["dt"]))
+    market = kwargs.get("market", None)
+    if market is None:
+        market = "默认"
+        if any(f.value.endswith("分钟") for f in freqs):
+            uni_times = sorted(dts[-2000:].strftime("%H:%M").unique().tolist())
+            _, market = check_freq_and_market(uni_times, freq=kwargs.get("base_freq", None))
+
+    data = {col: df[col].to_numpy() for col in ["symbol", "open", "close", "high", "low", "vol", "amount"]}
+    last_dt = dts[-1]
+
+    # 已经合成的周期，按周期从小到大排列：(原始K线对应的周期结束时间, 每根K线在原始K线中的起始位置, 聚合结果)
+    levels = []
+    results = {}
+    for freq in freqs:
+        edts = freq_end_times(dts, freq, market)
+        keys = edts.asi8
+        if len(keys) > 1 and np.all(keys[1:] >= keys[:-1]):
+            starts = np.flatnonzero(np.append(True, keys[1:] != keys[:-1]))
+
+            # 从最大的、与目标周期相互嵌套的已合成周期开始合成
+            for l_keys, l_starts, l_data in reversed(levels):
+                l_ends = np.append(l_starts[1:], len(keys)) - 1
+                if np.array_equal(keys[l_starts], keys[l_ends]):
+                    seg = np.flatnonzero(np.append(True, keys[l_starts[1:]] != keys[l_starts[:-1]]))
+                    agg = _aggregate_segments(l_data, seg)
+                    break
+            else:
+                agg = _aggregate_segments(data, starts)
+
+            levels.append((keys, starts, agg))
+            dt = edts[starts]
+        else:
+            # 周期结束时间不是单调递增的，按照结束时间稳定排序后合成，与 groupby 的结果一致
+            order = np.argsort(keys, kind="stable")
+            sorted_keys = keys[order]
+            starts = np.flatnonzero(np.append(True, sorted_keys[1:] != sorted_keys[:-1]))
+            agg = _aggregate_segments({k: v[order] for k, v in data.items()}, starts)
+            dt = edts[order[starts]]
+
+        dfk1 = pd.DataFrame({"symbol": agg["symbol"], "dt": dt, "open": agg["open"], "close": agg["close"],
+                             "high": agg["high"], "low": agg["low"], "vol": agg["vol"], "amount": agg["amount"]})
+        results[freq.value] = _format_resampled(dfk1, last_dt, freq, raw_bars, **kwargs)
+    return results
+
 
 class BarGenerator:
 
     version = "V231008"
 
-    def __init__(self, base_freq: str, freqs: List[str], max_count: int = 5000, market="默认"):
+    def __init__(self, base_freq: str, freqs: List[str], max_count: int = 5000, market="默认", inplace: bool = False):
+        """
+
+        :param base_freq: 基础周期
+        :param freqs: 需要合成的周期列表
+        :param max_count: 每个周期在内存中保留的最大K线数量
+        :param market: 交易市场，可选值：A股、期货、默认
+        :param inplace: 是否原地更新各周期最后一根未完成的K线；默认为 False，每次合并都创建新的 RawBar 对象。
+            开启后不再创建新对象，适用于大批量合成K线的场景；需要注意，外部持有的最后一根K线对象会随之变化。
+        """
         self.symbol = None
         self.end_dt = None
         self.market = market
         self.base_freq = base_freq
         self.max_count = max_count
+        self.inplace = inplace
         self.freqs = freqs
         self.bars = {v: [] for v in self.freqs}
         self.bars.update({base_freq: []})
         self.freq_map = {f.value: f for _, f in Freq.__members__.items()}
         self.__validate_freqs()
 
+        # 分钟级别周期预先取出周期结束时间的查找表，避免每根K线都进行字符串格式化和字典查找
+        self._edt_tables = self.__create_edt_tables()
+        self._edt_cache = {}
+
+    def __create_edt_tables(self):
+        tables = {}
+        for freq in self.bars.keys():
+            if freq.endswith("分钟"):
+                assert self.market in ["A股", "期货", "默认"], "market 参数必须为 A股 或 期货 或 默认"
+                tables[freq] = freq_edt_minutes[f"{freq}_{self.market}"]
+        return tables
+
+    def __setstate__(self, state):
+        # 兼容旧版本序列化的对象
+        self.__dict__.update(state)
+        self.__dict__.setdefault("inplace", False)
+        if "_edt_tables" not in state:
+            self._edt_tables = self.__create_edt_tables()
+            self._edt_cache = {}
+
+    def __freq_edt(self, dt: datetime, freq: Freq) -> datetime:
+        """计算 dt 对应的 freq 周期结束时间，结束时间相同的连续K线复用上一次的计算结果"""
+        if dt.second > 0 or dt.microsecond > 0:
+            return freq_end_time(dt, freq, self.market)
+
+        name = freq.value
+        table = self._edt_tables.get(name)
+        key = (dt.year, dt.month, dt.day, table[dt.hour * 60 + dt.minute] if table is not None else None)
+        cached = self._edt_cache.get(name)
+        if cached is not None and cached[0] == key:
+            return cached[1]
+
+        edt = _minute_end_time(dt, table) if table is not None else freq_end_time(dt, freq, self.market)
+        self._edt_cache[name] = (key, edt)
+        return edt
+
     def __validate_freqs(self):
         from czsc.utils import sorted_freqs
 
@@ -308,6 +548,49 @@ class BarGenerator:
         self.bars[freq] = bars
         self.symbol = bars[-1].symbol
 
+    def init_bars(self, bars: List[RawBar]):
+        """使用基础周期K线一次性初始化全部周期的K线序列，结果与逐根调用 update 一致
+
+        使用 resample_bars_multi 一次性合成所有周期，适用于策略启动前的预热；成交量、成交金额为分段求和，
+        浮点数结果可能与逐根累加存在极小的误差。
+
+        :param bars: 基础周期已完成K线，按时间升序排列
+        """
+        assert all(not b for b in self.bars.values()), "BarGenerator 已经有K线数据，不允许执行初始化"
+        if not bars:
+            return
+
+        if bars[-1].freq.value != self.base_freq:
+            raise ValueError(f"Input bar frequency does not match base frequency. Expected {self.base_freq}, got {bars[-1].freq.value}")
+
+        # update 会跳过与上一根K线时间相同的重复K线
+        bars = [b for i, b in enumerate(bars) if i == 0 or b.dt != bars[i - 1].dt]
+        df = pd.DataFrame({
+            "symbol": [b.symbol for b in bars],
+            "dt": [b.dt for b in bars],
+            "open": [b.open for b in bars],
+            "close": [b.close for b in bars],
+            "high": [b.high for b in bars],
+            "low": [b.low for b in bars],
+            "vol": [b.vol for b in bars],
+            "amount": [b.amount for b in bars],
+        })
+        res = resample_bars_multi(df, list(self.bars.keys()), market=self.market, drop_unfinished=False, columnar=True)
+        for freq, data in res.items():
+            # 只为保留在内存中的K线创建 RawBar 对象，id 与逐根 update 的结果保持一致
+            n = len(data["dt"])
+            i0 = max(n - self.max_count, 0)
+            cols = [data[col][i0:].tolist() for col in ["symbol", "dt", "open", "close", "high", "low", "vol", "amount"]]
+            cols[1] = pd.DatetimeIndex(data["dt"][i0:]).tolist()
+            self.bars[freq] = [
+                RawBar(symbol=symbol, id=i, dt=dt, freq=self.freq_map[freq], open=open_, close=close,
+                       high=high, low=low, vol=vol, amount=amount)
+                for i, (symbol, dt, open_, close, high, low, vol, amount) in enumerate(zip(*cols), i0)
+            ]
+
+        self.symbol = bars[-1].symbol
+        self.end_dt = bars[-1].dt
+
     def __repr__(self):
         return f"<BarGenerator for {self.symbol} @ {self.end_dt}>"
 
@@ -323,13 +606,14 @@ class BarGenerator:
         5. 如果`freq_edt`等于最后一根K线的日期时间，创建一个新的`RawBar`对象，其开盘价为最后一根K线的开盘价，
             收盘价为当前K线的收盘价，最高价为最后一根K线和当前K线的最高价中的最大值，最低价为最后一根K线和当前K线的最低价中的最小值，
             成交量和成交金额为最后一根K线和当前K线的成交量和成交金额的和。然后用这个新的`RawBar`对象替换`self.bars`中的最后一根K线。
+            如果`self.inplace`为True，则不创建新对象，直接在最后一根K线上原地更新上述字段。
 
         :param bar: 基础周期已完成K线
         :param freq: 目标周期
         """
-        freq_edt = freq_end_time(bar.dt, freq, self.market)
-
-        if not self.bars[freq.value]:
+        freq_edt = self.__freq_edt(bar.dt, freq)
+        bars = self.bars[freq.value]
+        if not bars:
             bar_ = RawBar(
                 symbol=bar.symbol,
                 freq=freq,
@@ -342,11 +626,11 @@ class BarGenerator:
                 vol=bar.vol,
                 amount=bar.amount,
             )
-            self.bars[freq.value].append(bar_)
+            bars.append(bar_)
             return
 
-        last: RawBar = self.bars[freq.value][-1]
-        if freq_edt != self.bars[freq.value][-1].dt:
+        last: RawBar = bars[-1]
+        if freq_edt != last.dt:
             bar_ = RawBar(
                 symbol=bar.symbol,
                 freq=freq,
@@ -359,7 +643,17 @@ class BarGenerator:
                 vol=bar.vol,
                 amount=bar.amount,
             )
-            self.bars[freq.value].append(bar_)
+            bars.append(bar_)
+
+        elif self.inplace:
+            last.close = bar.close
+            last.high = max(last.high, bar.high)
+            last.low = min(last.low, bar.low)
+            last.vol += bar.vol
+            last.amount += bar.amount
+            if last._cache is not None:
+                # K线数据已经变化，清空之前的缓存
+                last.cache = None
 
         else:
             bar_ = RawBar(
@@ -374,7 +668,7 @@ class BarGenerator:
                 vol=last.vol + bar.vol,
                 amount=last.amount + bar.amount,
             )
-            self.bars[freq.value][-1] = bar_
+            bars[-1] = bar_
 
     def update(self, bar: RawBar) -> None:
         """更新各周期K线
@@ -408,7 +702,7 @@ class BarGenerator:
         for freq in self.bars.keys():
             self._update_freq(bar, self.freq_map[freq])
 
-        # 限制存在内存中的K限制数量
-        for f, b in self.bars.items():
+        # 限制存在内存中的K限制数量；原地删除头部的K线，避免每次更新都复制整个列表
+        for b in self.bars.values():
             if len(b) > self.max_count:
-                self.bars[f] = b[-self.max_count :]
+                del b[: len(b) - self.max_count]
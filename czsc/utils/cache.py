@@ -7,11 +7,14 @@ create_dt: 2021/7/16 11:51
 
 import os
 import time
+import uuid
 import dill
 import json
 import shutil
 import hashlib
 import inspect
+import functools
+import numpy as np
 import pandas as pd
 from pathlib import Path
 from loguru import logger
@@ -40,74 +43,172 @@ def empty_cache_path():
     print(f"已清空缓存文件夹：{home_path}")
 
 
+def _update_hash(h, obj):
+    """按内容更新哈希值：numpy 数组直接哈希内存数据，pandas 对象使用 hash_pandas_object，容器类型递归处理"""
+    if isinstance(obj, (pd.DataFrame, pd.Series, pd.Index)):
+        if isinstance(obj, pd.DataFrame):
+            h.update(f"DataFrame{obj.shape}{obj.dtypes.tolist()}".encode("utf-8"))
+            _update_hash(h, obj.columns)
+        else:
+            h.update(f"{type(obj).__name__}{obj.shape}{obj.name}{obj.dtype}".encode("utf-8"))
+        try:
+            values = pd.util.hash_pandas_object(obj, index=False).to_numpy()
+            h.update(values.tobytes())
+        except TypeError:
+            # 包含 list、dict 等不可哈希对象时，逐个元素哈希
+            _update_hash(h, obj.to_numpy().tolist())
+        if not isinstance(obj, pd.Index):
+            _update_hash(h, obj.index)
+
+    elif isinstance(obj, np.ndarray):
+        h.update(f"ndarray{obj.dtype}{obj.shape}".encode("utf-8"))
+        if obj.dtype == object:
+            _update_hash(h, obj.tolist())
+        else:
+            h.update(np.ascontiguousarray(obj).view(np.uint8).data)
+
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        h.update(f"{type(obj).__name__}{len(obj)}".encode("utf-8"))
+        items = sorted(obj, key=repr) if isinstance(obj, (set, frozenset)) else obj
+        for item in items:
+            _update_hash(h, item)
+
+    elif isinstance(obj, dict):
+        h.update(f"dict{len(obj)}".encode("utf-8"))
+        for key in sorted(obj, key=repr):
+            _update_hash(h, key)
+            _update_hash(h, obj[key])
+
+    elif isinstance(obj, bytes):
+        h.update(b"bytes" + obj)
+
+    else:
+        h.update(f"{type(obj).__name__}:{obj!r}".encode("utf-8"))
+
+
+def hash_args(*args, **kwargs) -> str:
+    """按参数内容计算哈希值
+
+    DataFrame、Series、ndarray 按数据内容哈希，不依赖截断后的 repr，数据相同则哈希值相同
+
+    :return: 32 位十六进制字符串
+    """
+    h = hashlib.md5()
+    _update_hash(h, args)
+    _update_hash(h, kwargs)
+    return h.hexdigest().upper()
+
+
 class DiskCache:
-    def __init__(self, path=None):
+    def __init__(self, path=None, max_bytes=None):
+        """
+
+        :param path: 缓存文件夹路径，默认为 home_path / disk_cache
+        :param max_bytes: 缓存文件夹的容量上限，单位：Bytes；超过上限时按最近访问时间淘汰缓存文件，None 表示不限制
+        """
         self.path = home_path / "disk_cache" if path is None else Path(path)
         if self.path.is_file():
             raise Exception("path must be a directory, not a file")
 
         self.path.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.stats = {"hits": 0, "misses": 0, "errors": 0, "writes": 0, "evictions": 0, "bytes_read": 0, "bytes_written": 0}
 
     def __str__(self) -> str:
         return "DiskCache: " + str(self.path)
 
+    @property
+    def nbytes(self) -> int:
+        """缓存文件夹当前占用的空间，单位：Bytes"""
+        return get_dir_size(self.path)
+
     def is_found(self, k: str, suffix: str = "pkl", ttl=-1) -> bool:
         """判断缓存文件是否存在
 
         :param k: 缓存文件名
         :param suffix: 缓存文件后缀，支持 pkl, json, txt, csv, xlsx, feather, parquet
-        :param ttl: 缓存文件有效期，单位：秒，-1 表示永久有效
+        :param ttl: 缓存文件有效期，单位：秒，-1 表示永久有效；以缓存文件的写入时间为准
         :return: bool
         """
         file = self.path / f"{k}.{suffix}"
         if not file.exists():
             logger.info(f"缓存文件不存在, {file}")
+            self.stats["misses"] += 1
             return False
 
         if ttl > 0:
-            create_time = file.stat().st_ctime
-            if (time.time() - create_time) > ttl:
+            try:
+                expired = (time.time() - file.stat().st_mtime) > ttl
+            except FileNotFoundError:
+                expired = True
+            if expired:
                 logger.info(f"缓存文件已过期, {file}")
-                os.remove(file)
+                file.unlink(missing_ok=True)
+                self.stats["misses"] += 1
                 return False
 
         logger.info(f"缓存文件已找到, {file}")
         return True
 
-    def get(self, k: str, suffix: str = "pkl") -> Any:
+    def get(self, k: str, suffix: str = "pkl", default=None) -> Any:
         """读取缓存文件
 
+        读取失败（文件不存在、文件损坏）时返回 default，损坏的缓存文件会被删除；
+        读取成功时更新文件的访问时间，用于按最近访问时间淘汰缓存文件
+
         :param k: 缓存文件名
         :param suffix: 缓存文件后缀，支持 pkl, json, txt, csv, xlsx, feather, parquet
+        :param default: 读取失败时的返回值
         :return: 缓存文件内容
         """
         file = self.path / f"{k}.{suffix}"
         logger.info(f"正在读取缓存记录，地址：{file}")
         if not file.exists():
             logger.warning(f"文件不存在, {file}")
-            return None
-
-        if suffix == "pkl":
-            res = dill.load(open(file, "rb"))
-        elif suffix == "json":
-            res = json.load(open(file, "r", encoding="utf-8"))
-        elif suffix == "txt":
-            res = file.read_text(encoding="utf-8")
-        elif suffix == "csv":
-            res = pd.read_csv(file, encoding="utf-8")
-        elif suffix == "xlsx":
-            res = pd.read_excel(file)
-        elif suffix == "feather":
-            res = pd.read_feather(file)
-        elif suffix == "parquet":
-            res = pd.read_parquet(file)
-        else:
+            return default
+
+        if suffix not in ["pkl", "json", "txt", "csv", "xlsx", "feather", "parquet"]:
             raise ValueError(f"suffix {suffix} not supported")
+
+        try:
+            if suffix == "pkl":
+                with open(file, "rb") as f:
+                    res = dill.load(f)
+            elif suffix == "json":
+                with open(file, "r", encoding="utf-8") as f:
+                    res = json.load(f)
+            elif suffix == "txt":
+                res = file.read_text(encoding="utf-8")
+            elif suffix == "csv":
+                res = pd.read_csv(file, encoding="utf-8")
+            elif suffix == "xlsx":
+                res = pd.read_excel(file)
+            elif suffix == "feather":
+                res = pd.read_feather(file)
+            else:
+                res = pd.read_parquet(file)
+
+            st = file.stat()
+            os.utime(file, (time.time(), st.st_mtime))
+        except FileNotFoundError:
+            logger.warning(f"缓存文件已被删除, {file}")
+            self.stats["misses"] += 1
+            return default
+        except Exception as e:
+            logger.warning(f"缓存文件读取失败，已删除：{file}；{e}")
+            file.unlink(missing_ok=True)
+            self.stats["errors"] += 1
+            return default
+
+        self.stats["hits"] += 1
+        self.stats["bytes_read"] += st.st_size
         return res
 
     def set(self, k: str, v: Any, suffix: str = "pkl"):
         """写入缓存文件
 
+        先写入同目录下的临时文件，再重命名为目标文件，保证其他进程读不到写了一半的缓存文件
+
         :param k: 缓存文件名
         :param v: 缓存文件内容
         :param suffix: 缓存文件后缀，支持 pkl, json, txt, csv, xlsx, feather, parquet
@@ -116,43 +217,78 @@ class DiskCache:
         if file.exists():
             logger.info(f"缓存文件 {file} 将被覆盖")
 
-        if suffix == "pkl":
-            dill.dump(v, open(file, "wb"))
-
-        elif suffix == "json":
-            if not isinstance(v, dict):
-                raise ValueError("suffix json only support dict")
-            json.dump(v, open(file, "w", encoding="utf-8"), ensure_ascii=False, indent=4)
+        if suffix == "json" and not isinstance(v, dict):
+            raise ValueError("suffix json only support dict")
+        if suffix == "txt" and not isinstance(v, str):
+            raise ValueError("suffix txt only support str")
+        if suffix in ["csv", "xlsx", "feather", "parquet"] and not isinstance(v, pd.DataFrame):
+            raise ValueError(f"suffix {suffix} only support pd.DataFrame")
+        if suffix not in ["pkl", "json", "txt", "csv", "xlsx", "feather", "parquet"]:
+            raise ValueError(f"suffix {suffix} not supported")
 
-        elif suffix == "txt":
-            if not isinstance(v, str):
-                raise ValueError("suffix txt only support str")
-            file.write_text(v, encoding="utf-8")
+        # 临时文件以 . 开头，保留原后缀，便于 to_excel 等按后缀识别文件格式
+        tmp = self.path / f".{k}.{os.getpid()}.{uuid.uuid4().hex[:8]}.tmp.{suffix}"
+        try:
+            if suffix == "pkl":
+                with open(tmp, "wb") as f:
+                    dill.dump(v, f)
+            elif suffix == "json":
+                with open(tmp, "w", encoding="utf-8") as f:
+                    json.dump(v, f, ensure_ascii=False, indent=4)
+            elif suffix == "txt":
+                tmp.write_text(v, encoding="utf-8")
+            elif suffix == "csv":
+                v.to_csv(tmp, index=False, encoding="utf-8")
+            elif suffix == "xlsx":
+                v.to_excel(tmp, index=False)
+            elif suffix == "feather":
+                v.to_feather(tmp)
+            else:
+                v.to_parquet(tmp)
 
-        elif suffix == "csv":
-            if not isinstance(v, pd.DataFrame):
-                raise ValueError("suffix csv only support pd.DataFrame")
-            v.to_csv(file, index=False, encoding="utf-8")
+            size = tmp.stat().st_size
+            os.replace(tmp, file)
+        finally:
+            tmp.unlink(missing_ok=True)
 
-        elif suffix == "xlsx":
-            if not isinstance(v, pd.DataFrame):
-                raise ValueError("suffix xlsx only support pd.DataFrame")
-            v.to_excel(file, index=False)
+        self.stats["writes"] += 1
+        self.stats["bytes_written"] += size
+        logger.info(f"已写入缓存文件：{file}")
 
-        elif suffix == "feather":
-            if not isinstance(v, pd.DataFrame):
-                raise ValueError("suffix feather only support pd.DataFrame")
-            v.to_feather(file)
+        if self.max_bytes is not None:
+            self.evict()
 
-        elif suffix == "parquet":
-            if not isinstance(v, pd.DataFrame):
-                raise ValueError("suffix parquet only support pd.DataFrame")
-            v.to_parquet(file)
+    def evict(self, max_bytes=None):
+        """按最近访问时间淘汰缓存文件，直到缓存文件夹占用的空间不超过 max_bytes；至少保留最近访问的一个文件
 
-        else:
-            raise ValueError(f"suffix {suffix} not supported")
-
-        logger.info(f"已写入缓存文件：{file}")
+        :param max_bytes: 容量上限，单位：Bytes，默认为 self.max_bytes
+        """
+        max_bytes = self.max_bytes if max_bytes is None else max_bytes
+        if max_bytes is None:
+            return
+
+        files = []
+        with os.scandir(self.path) as it:
+            for entry in it:
+                if entry.is_file() and not entry.name.startswith("."):
+                    try:
+                        st = entry.stat()
+                    except FileNotFoundError:
+                        continue
+                    files.append((st.st_atime, st.st_size, entry.path))
+
+        total = sum(x[1] for x in files)
+        files.sort()
+        for _, size, file in files[:-1]:
+            if total <= max_bytes:
+                break
+            try:
+                os.remove(file)
+                self.stats["evictions"] += 1
+                logger.info(f"缓存空间超过上限，已淘汰缓存文件：{file}")
+            except FileNotFoundError:
+                pass
+            total -= size
 
     def remove(self, k: str, suffix: str = "pkl"):
         file = self.path / f"{k}.{suffix}"
@@ -160,36 +296,51 @@ class DiskCache:
         Path.unlink(file) if Path.exists(file) else None
 
 
-def disk_cache(path: Union[AnyStr, Path] = home_path, suffix: str = "pkl", ttl: int = -1):
+def _source_hash(func) -> str:
+    """函数源码的哈希值，无法获取源码时使用函数的完整名称"""
+    try:
+        code_str = inspect.getsource(func)
+    except (OSError, TypeError):
+        code_str = f"{func.__module__}.{func.__qualname__}"
+    return hashlib.md5(code_str.encode("utf-8")).hexdigest().upper()
+
+
+def disk_cache(path: Union[AnyStr, Path] = home_path, suffix: str = "pkl", ttl: int = -1, max_bytes=None):
     """缓存装饰器，支持多种数据格式
 
+    缓存 key 由函数源码的哈希值（每个函数只计算一次）与参数内容的哈希值组成，参见 hash_args；
+    被装饰的函数通过 cache 属性访问对应的 DiskCache 对象，如 func.cache.stats 查看命中次数等统计信息
+
     :param path: 缓存文件夹父路径，默认为 home_path，每个函数的缓存文件夹为 path/func_name
     :param suffix: 缓存文件后缀，支持 pkl, json, txt, csv, xlsx, feather, parquet
     :param ttl: 缓存文件有效期，单位：秒
+    :param max_bytes: 每个函数的缓存文件夹容量上限，单位：Bytes，None 表示不限制
     """
 
     def decorator(func):
         nonlocal path
-        _c = DiskCache(path=Path(path) / func.__name__)
+        _c = DiskCache(path=Path(path) / func.__name__, max_bytes=max_bytes)
+        code_hash = _source_hash(func)
+        missing = object()
 
+        @functools.wraps(func)
         def cached_func(*args, **kwargs):
             # 如果函数有 ttl 参数，则使用函数的 ttl 参数
             ttl1 = kwargs.pop("ttl", ttl)
 
-            hash_str = f"{func.__name__}{args}{kwargs}"
-            code_str = inspect.getsource(func)
-            k = hashlib.md5((code_str + hash_str).encode("utf-8")).hexdigest().upper()[:8]
-            k = f"{k}_{func.__name__}"
+            k = hashlib.md5((code_hash + func.__name__ + hash_args(*args, **kwargs)).encode("utf-8"))
+            k = f"{k.hexdigest().upper()[:16]}_{func.__name__}"
 
             if _c.is_found(k, suffix=suffix, ttl=ttl1):
-                output = _c.get(k, suffix=suffix)
-                return output
+                output = _c.get(k, suffix=suffix, default=missing)
+                if output is not missing:
+                    return output
 
-            else:
-                output = func(*args, **kwargs)
-                _c.set(k, output, suffix=suffix)
-                return output
+            output = func(*args, **kwargs)
+            _c.set(k, output, suffix=suffix)
+            return output
 
+        cached_func.cache = _c
         return cached_func
 
     return decorator
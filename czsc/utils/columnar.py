@@ -0,0 +1,473 @@
+# -*- coding: utf-8 -*-
+"""
+author: zengbin93
+email: zeng_bin8888@163.com
+create_dt: 2024/8/3 10:21
+describe: 预分配的列式缓冲区，用于替代大量 dataclass 对象组成的 list
+"""
+import numpy as np
+from collections.abc import MutableMapping
+from typing import Dict, Optional, Tuple, Union
+
+
+class ColumnBuffer:
+    """预分配的列式缓冲区
+
+    每一列是一个预分配的 numpy 数组，行使用全局递增的绝对位置（绝对索引）进行访问：
+
+    1. append / set_last / pop_last 只操作尾部，时间复杂度 O(1)
+    2. discard_before 只移动头部指针，时间复杂度 O(1)
+    3. 尾部空间不足时，如果有效数据不超过容量的一半，将有效数据整体搬移到数组开头，否则容量翻倍；均摊复杂度 O(1)
+
+    与首尾相接的环形缓冲区相比，这里的有效数据始终是连续的，``column`` 可以直接返回 numpy 视图，不需要拼接。
+    """
+
+    def __init__(self, dtypes: Dict[str, object], capacity: int = 1024):
+        """
+
+        :param dtypes: 列名及其数据类型，如 {"open": np.float64, "dt": object}
+        :param capacity: 初始容量
+        """
+        self.dtypes = dict(dtypes)
+        self.capacity = max(int(capacity), 16)
+        self.data = {k: np.empty(self.capacity, dtype=v) for k, v in self.dtypes.items()}
+        self.base = 0  # 物理位置 0 对应的绝对索引
+        self.head = 0  # 第一行有效数据的绝对索引
+        self.tail = 0  # 最后一行有效数据的绝对索引 + 1
+
+    def __len__(self):
+        return self.tail - self.head
+
+    def __repr__(self):
+        return f"<ColumnBuffer~{list(self.dtypes)}~head={self.head}~tail={self.tail}>"
+
+    def _reserve(self, n: int = 1):
+        """确保尾部至少还有 n 行空间"""
+        if self.tail - self.base + n <= self.capacity:
+            return
+
+        size = self.tail - self.head
+        start = self.head - self.base
+        capacity = self.capacity
+        while size + n > capacity // 2:
+            capacity *= 2
+
+        for k, v in self.data.items():
+            arr = v if capacity == self.capacity else np.empty(capacity, dtype=v.dtype)
+            arr[:size] = v[start: start + size]
+            if v.dtype == object:
+                # 释放被搬移区域中残留的对象引用
+                arr[size: self.capacity] = None
+            self.data[k] = arr
+
+        self.capacity = capacity
+        self.base = self.head
+
+    def __getstate__(self):
+        # 序列化时只保留有效数据
+        state = dict(self.__dict__)
+        start, end = self.head - self.base, self.tail - self.base
+        state["data"] = {k: v[start:end].copy() for k, v in self.data.items()}
+        state["capacity"] = max(end - start, 16)
+        state["base"] = self.head
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        for k, v in self.data.items():
+            if len(v) < self.capacity:
+                arr = np.empty(self.capacity, dtype=v.dtype)
+                arr[:len(v)] = v
+                self.data[k] = arr
+
+    def add_column(self, name, dtype, fill=None):
+        """增加一列，已有的有效数据行使用 fill 填充"""
+        if name in self.data:
+            return
+        self.dtypes[name] = dtype
+        arr = np.empty(self.capacity, dtype=dtype)
+        if fill is not None:
+            arr[self.head - self.base: self.tail - self.base] = fill
+        self.data[name] = arr
+
+    def append(self, values: dict = None, **kwargs) -> int:
+        """在尾部追加一行，返回该行的绝对索引；列名不是字符串时通过 values 传入"""
+        self._reserve(1)
+        i = self.tail - self.base
+        if values:
+            kwargs.update(values)
+        for k, v in kwargs.items():
+            self.data[k][i] = v
+        self.tail += 1
+        return self.tail - 1
+
+    def extend(self, columns: Dict[str, np.ndarray]) -> int:
+        """在尾部批量追加多行，返回第一行的绝对索引
+
+        :param columns: 列名到等长数组的映射
+        """
+        n = len(next(iter(columns.values())))
+        self._reserve(n)
+        i = self.tail - self.base
+        for k, v in columns.items():
+            self.data[k][i: i + n] = v
+        self.tail += n
+        return self.tail - n
+
+    def set(self, index: int, values: dict = None, **kwargs):
+        """修改指定绝对索引对应行的值；列名不是字符串时通过 values 传入"""
+        assert self.head <= index < self.tail, f"索引 {index} 不在有效区间 [{self.head}, {self.tail}) 内"
+        i = index - self.base
+        if values:
+            kwargs.update(values)
+        for k, v in kwargs.items():
+            self.data[k][i] = v
+
+    def set_last(self, **kwargs):
+        """修改最后一行的值"""
+        self.set(self.tail - 1, **kwargs)
+
+    def pop_last(self):
+        """删除最后一行"""
+        assert self.tail > self.head, "ColumnBuffer 为空"
+        self.tail -= 1
+
+    def discard_before(self, index: int):
+        """丢弃绝对索引小于 index 的行，仅移动头部指针"""
+        self.head = min(max(self.head, index), self.tail)
+
+    def get(self, name: str, index: int):
+        """读取指定列、指定绝对索引的值"""
+        return self.data[name][index - self.base]
+
+    def column(self, name: str, start: int = None, end: int = None) -> np.ndarray:
+        """读取指定列在 [start, end) 绝对索引区间内的数据视图，默认返回全部有效数据"""
+        start = self.head if start is None else max(start, self.head)
+        end = self.tail if end is None else min(end, self.tail)
+        return self.data[name][start - self.base: end - self.base]
+
+    @property
+    def nbytes(self) -> int:
+        """缓冲区占用的字节数（不含 object 列所引用的对象本身）"""
+        return sum(v.nbytes for v in self.data.values())
+
+
+class IndicatorStore:
+    """按缓存 key 组织的列式指标存储
+
+    每一行对应 CZSC.bars_raw 中的一根K线，行的绝对索引在 K 线追加时确定，与 bars_raw 同步裁剪。
+    除了 open / close / high / low / vol 等行情数据列，每个缓存 key 对应一列（或多列，key 的值为 dict 时
+    每个字段一列）float64 数据和一列有效性标记：
+
+    1. 只有通过 register 注册过的 key 才会存储在这里，其他 key 仍然存储在 K 线自身的字典中
+    2. 同一根K线被更新（时间延伸）时，该行全部 key 被标记为无效
+    3. 通过 BarCache 按 ``bar.cache[key]`` 的方式读写，与原有的信号函数兼容
+    4. 通过 ensure 注册的增量指标（czsc.utils.ta.IncrementalIndicator）只计算新增或者被更新的行
+    """
+
+    bar_columns = ("open", "close", "high", "low", "vol")
+
+    def __init__(self, capacity: int = 1024):
+        self.buffer = ColumnBuffer({("bar", k): np.float64 for k in self.bar_columns}, capacity=capacity)
+        self.fields: Dict[str, Optional[Tuple[str, ...]]] = {}  # key -> dict 字段名；值为标量时为 None
+        self.incremental = {}  # key -> (增量指标对象, 最后一次计算的行的绝对索引)
+
+    def __len__(self):
+        return len(self.buffer)
+
+    def __repr__(self):
+        return f"<IndicatorStore~{list(self.fields)}~rows={len(self.buffer)}>"
+
+    def __contains__(self, key):
+        return key in self.fields
+
+    @property
+    def head(self) -> int:
+        return self.buffer.head
+
+    @property
+    def tail(self) -> int:
+        return self.buffer.tail
+
+    def register(self, key: str, fields: Optional[Tuple[str, ...]] = None):
+        """注册缓存 key
+
+        :param key: 缓存 key，如 "SMA#5"，"MACD12#26#9"
+        :param fields: 缓存值为 dict 时的字段名，如 ("dif", "dea", "macd")；缓存值为标量时为 None
+        """
+        fields = tuple(fields) if fields is not None else None
+        if key in self.fields:
+            assert self.fields[key] == fields, f"{key} 已注册，字段为 {self.fields[key]}"
+            return
+        self.fields[key] = fields
+        self.buffer.add_column(("valid", key), np.bool_, fill=False)
+        for f in fields or (None,):
+            self.buffer.add_column(("value", key, f), np.float64)
+
+    def append(self, bar=None) -> int:
+        """追加一行，返回该行的绝对索引
+
+        :param bar: 该行对应的K线，用于写入行情数据列
+        """
+        buffer = self.buffer
+        index = buffer.append()
+        for k in self.fields:
+            buffer.data[("valid", k)][index - buffer.base] = False
+        if bar is not None:
+            self.set_bar(index, bar)
+        return index
+
+    def set_bar(self, index: int, bar):
+        """写入指定行的行情数据"""
+        data, i = self.buffer.data, index - self.buffer.base
+        data[("bar", "open")][i] = bar.open
+        data[("bar", "close")][i] = bar.close
+        data[("bar", "high")][i] = bar.high
+        data[("bar", "low")][i] = bar.low
+        data[("bar", "vol")][i] = bar.vol
+
+    def values(self, name: str) -> np.ndarray:
+        """读取全部有效行的行情数据视图，如 close、high、low、vol"""
+        return self.buffer.column(("bar", name))
+
+    def invalidate(self, index: int):
+        """将指定行的全部 key 标记为无效"""
+        self.buffer.set(index, {("valid", k): False for k in self.fields})
+
+    def discard_before(self, index: int):
+        self.buffer.discard_before(index)
+
+    def has(self, key: str, index: int) -> bool:
+        """判断指定行的 key 是否有效"""
+        return key in self.fields and self.buffer.head <= index < self.buffer.tail \
+            and bool(self.buffer.get(("valid", key), index))
+
+    def get(self, key: str, index: int):
+        """读取指定行的缓存值，不存在时抛出 KeyError"""
+        if not self.has(key, index):
+            raise KeyError(key)
+        fields = self.fields[key]
+        if fields is None:
+            return self.buffer.get(("value", key, None), index)
+        return {f: self.buffer.get(("value", key, f), index) for f in fields}
+
+    def set(self, key: str, index: int, value) -> bool:
+        """写入单个缓存值；key 未注册或者 value 与注册的字段不一致时不写入，返回 False"""
+        if key not in self.fields:
+            return False
+        fields = self.fields[key]
+        try:
+            if fields is None:
+                values = {("value", key, None): float(value)}
+            else:
+                if not isinstance(value, dict) or tuple(value.keys()) != fields:
+                    return False
+                values = {("value", key, f): float(v) for f, v in value.items()}
+        except (TypeError, ValueError):
+            return False
+        values[("valid", key)] = True
+        self.buffer.set(index, values)
+        return True
+
+    def discard(self, key: str, index: int):
+        """将指定行的单个 key 标记为无效"""
+        if key in self.fields:
+            self.buffer.set(index, {("valid", key): False})
+
+    def update(self, key: str, values: Union[np.ndarray, Dict[str, np.ndarray]], n: int = None, missing_only=False):
+        """批量写入最后 n 行的缓存值
+
+        :param key: 缓存 key，需要先注册
+        :param values: 标量 key 为一维数组；dict key 为字段名到一维数组的映射；数组的最后一个元素对应最后一行
+        :param n: 写入的行数，默认为数组长度
+        :param missing_only: 是否只写入无效的行
+        """
+        fields = self.fields[key]
+        arrays = {None: values} if fields is None else values
+        n = len(next(iter(arrays.values()))) if n is None else n
+        n = min(n, len(self.buffer))
+        if n <= 0:
+            return
+
+        buffer = self.buffer
+        start, end = buffer.tail - n - buffer.base, buffer.tail - buffer.base
+        valid = buffer.data[("valid", key)][start:end]
+        mask = ~valid if missing_only else slice(None)
+        for f in fields or (None,):
+            column = buffer.data[("value", key, f)][start:end]
+            column[mask] = np.asarray(arrays[f], dtype=np.float64)[-n:][mask]
+        valid[:] = True
+
+    def column(self, key: str, field: str = None) -> np.ndarray:
+        """读取指定 key 全部有效行的数据视图，无效的行为 nan"""
+        values = self.buffer.column(("value", key, field)).copy()
+        values[~self.buffer.column(("valid", key))] = np.nan
+        return values
+
+    def ensure(self, indicator) -> str:
+        """确保增量指标已经计算到最后一行，返回缓存 key
+
+        同一个 key 只保留第一次传入的指标对象，之后每次调用只计算新增的行，以及被更新（时间延伸）的最后一行。
+
+        :param indicator: czsc.utils.ta.IncrementalIndicator 对象
+        :return: 缓存 key
+        """
+        key = indicator.key
+        buffer = self.buffer
+        if key in self.incremental:
+            indicator, last = self.incremental[key]
+        else:
+            self.register(key, indicator.fields)
+            last = None
+
+        if last is not None and last == buffer.tail - 1 and buffer.get(("valid", key), last):
+            return key
+
+        if last is None or last < buffer.head - 1:
+            # 第一次计算，或者中间有K线没有计算就被裁剪掉了，从第一行开始重新计算
+            indicator.reset()
+            start, replace = buffer.head, False
+        elif last >= buffer.head and not buffer.get(("valid", key), last):
+            start, replace = last, True
+        else:
+            start, replace = last + 1, False
+
+        base, fields = buffer.base, indicator.fields
+        bars = {k: buffer.data[("bar", k)] for k in self.bar_columns}
+        valid = buffer.data[("valid", key)]
+        columns = [buffer.data[("value", key, f)] for f in fields or (None,)]
+        head = buffer.head - base
+        for index in range(start - base, buffer.tail - base):
+            value = indicator.update(bars, index, head, replace=replace)
+            replace = False
+            if fields is None:
+                columns[0][index] = value
+            else:
+                for column, v in zip(columns, value):
+                    column[index] = v
+            valid[index] = True
+
+        self.incremental[key] = (indicator, buffer.tail - 1)
+        return key
+
+    @property
+    def nbytes(self) -> int:
+        return self.buffer.nbytes
+
+
+class BarCache(MutableMapping):
+    """K线缓存：已注册的 key 读写 IndicatorStore 中对应的行，其他 key 读写 K 线自身的字典"""
+
+    __slots__ = ("store", "index", "extra")
+
+    def __init__(self, store: IndicatorStore, index: int, extra: dict = None):
+        self.store = store
+        self.index = index
+        self.extra = extra or None
+
+    def __getstate__(self):
+        return self.store, self.index, self.extra
+
+    def __setstate__(self, state):
+        self.store, self.index, self.extra = state
+
+    def __getitem__(self, key):
+        store = self.store
+        if key in store.fields and store.has(key, self.index):
+            return store.get(key, self.index)
+        if self.extra is None:
+            raise KeyError(key)
+        return self.extra[key]
+
+    def __setitem__(self, key, value):
+        if self.store.set(key, self.index, value):
+            if self.extra:
+                self.extra.pop(key, None)
+            return
+        self.store.discard(key, self.index)
+        if self.extra is None:
+            self.extra = {}
+        self.extra[key] = value
+
+    def __delitem__(self, key):
+        found = self.store.has(key, self.index)
+        self.store.discard(key, self.index)
+        if self.extra and key in self.extra:
+            del self.extra[key]
+        elif not found:
+            raise KeyError(key)
+
+    def _store_keys(self):
+        store, index = self.store, self.index
+        if not store.fields or not store.buffer.head <= index < store.buffer.tail:
+            return []
+        return [k for k in store.fields if store.buffer.get(("valid", k), index)]
+
+    def __iter__(self):
+        yield from self._store_keys()
+        if self.extra:
+            yield from self.extra
+
+    def __len__(self):
+        return len(self._store_keys()) + (len(self.extra) if self.extra else 0)
+
+    def __repr__(self):
+        return repr(dict(self))
+
+    def reset(self, data: dict):
+        """使用 data 替换全部缓存内容，对应 ``bar.cache = data``"""
+        for key in self._store_keys():
+            if key not in data:
+                self.store.discard(key, self.index)
+        self.extra = None
+        for key, value in data.items():
+            self[key] = value
+
+
+def get_indicator_store(c) -> Optional[IndicatorStore]:
+    """返回与 c.bars_raw 对齐的 IndicatorStore；c 没有启用指标存储时返回 None"""
+    store = getattr(c, "indicators", None)
+    if store is None or len(store) != len(c.bars_raw):
+        return None
+    return store
+
+
+def get_bars_values(c, name: str, n: int = None) -> np.ndarray:
+    """读取 c.bars_raw 最后 n 根K线的行情数据，如 close、high、low、vol；n 为 None 表示全部K线"""
+    store = get_indicator_store(c)
+    if store is not None:
+        values = store.values(name)
+        return values[-n:] if n else values
+
+    bars = c.bars_raw[-n:] if n else c.bars_raw
+    return np.array([getattr(x, name) for x in bars], dtype=np.float64)
+
+
+def update_bars_cache(c, cache_key: str, values, n: int = None, missing_only=False):
+    """将指标计算结果写入 c.bars_raw 最后 n 根K线的缓存
+
+    启用了 IndicatorStore 的 CZSC 对象直接按列写入；否则逐根写入 ``bar.cache``，不再复制整个缓存字典。
+
+    :param c: CZSC 对象
+    :param cache_key: 缓存 key
+    :param values: 标量指标为一维数组；多字段指标为字段名到一维数组的映射；数组的最后一个元素对应最后一根K线
+    :param n: 写入的K线数量，默认为数组长度
+    :param missing_only: 是否只写入没有该缓存的K线
+    """
+    fields = tuple(values.keys()) if isinstance(values, dict) else None
+    arrays = values if fields else {None: values}
+    n = len(next(iter(arrays.values()))) if n is None else n
+    n = min(n, len(c.bars_raw))
+    if n <= 0:
+        return
+
+    store = get_indicator_store(c)
+    if store is not None:
+        store.register(cache_key, fields)
+        store.update(cache_key, values, n, missing_only=missing_only)
+        return
+
+    for i, bar in enumerate(c.bars_raw[-n:], start=-n):
+        if missing_only and cache_key in bar.cache:
+            continue
+        bar.cache[cache_key] = values[i] if fields is None else {f: values[f][i] for f in fields}
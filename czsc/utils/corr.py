@@ -94,6 +94,98 @@ def single_linear(y: Union[np.array, list], x: Union[np.array, list] = None) ->
     return res
 
 
+def _group_rank(codes: np.ndarray, x: np.ndarray) -> np.ndarray:
+    """分组计算平均秩（相同值取平均排名），等价于每个分组内 rankdata(x, method="average")
+
+    :param codes: 分组编号，要求已按分组排序
+    :param x: 待排序的值，不能包含空值
+    """
+    n = len(x)
+    if n == 0:
+        return x.astype(float)
+
+    order = np.lexsort((x, codes))
+    cs, xs = codes[order], x[order]
+    starts = np.flatnonzero(np.r_[True, cs[1:] != cs[:-1]])
+    sizes = np.diff(np.r_[starts, n])
+    pos = np.arange(1, n + 1) - np.repeat(starts, sizes)
+
+    # 同一分组内相同值组成一段，段内取首尾排名的平均值
+    new_run = np.r_[True, (cs[1:] != cs[:-1]) | (xs[1:] != xs[:-1])]
+    run_first = np.flatnonzero(new_run)
+    run_last = np.r_[run_first[1:] - 1, n - 1]
+    avg = (pos[run_first] + pos[run_last]) / 2
+
+    ranks = np.empty(n, dtype=float)
+    ranks[order] = avg[np.cumsum(new_run) - 1]
+    return ranks
+
+
+def _cross_sectional_stats(df, x_col, y_col, dt_col="dt", method="pearson", fit_intercept=False) -> pd.DataFrame:
+    """按 dt_col 分组批量计算每个截面上 x_col 与 y_col 的相关系数、回归系数
+
+    只排序一次，样本数、均值、协方差通过 np.bincount 分段归约得到，不再逐个截面调用 Series.corr 或 LinearRegression；
+    每个截面只使用 x_col、y_col 均非空的样本，结果与逐个截面计算一致。
+
+    :param df: 数据，DateFrame格式
+    :param x_col: X列
+    :param y_col: Y列
+    :param dt_col: 截面列
+    :param method: {'pearson', 'spearman'}，相关系数的计算方法
+    :param fit_intercept: bool, 计算回归系数时是否拟合截距项
+    :return: pd.DataFrame, columns = [dt_col, count, ic, beta]
+
+        count   截面上的有效样本数
+        ic      相关系数，有效样本少于 2 个时为空值；x_col 或 y_col 在截面上为常数时，pearson 记为 0
+                （逐个截面调用 Series.corr 只能得到舍入误差量级的结果），spearman 的排名全部相同，为空值
+        beta    y_col 对 x_col 的回归系数，x_col 在截面上为常数时记为 0
+
+    截面是否为常数按相对容差判断：中心化后的平方和不超过 eps * sum(x ** 2) 时，剩下的只有舍入误差
+    """
+    assert method in ["pearson", "spearman"], f"method 只支持 pearson、spearman，当前为 {method}"
+    dts = df[dt_col]
+    codes, uniques = pd.factorize(dts, sort=True)
+    x = df[x_col].to_numpy(dtype=float)
+    y = df[y_col].to_numpy(dtype=float)
+
+    # groupby 会丢弃 dt_col 为空的行；相关系数与回归只使用 x、y 均非空的样本
+    mask = (codes >= 0) & ~np.isnan(x) & ~np.isnan(y)
+    codes, x, y = codes[mask], x[mask], y[mask]
+    order = np.argsort(codes, kind="stable")
+    codes, x, y = codes[order], x[order], y[order]
+
+    k = len(uniques)
+    count = np.bincount(codes, minlength=k)
+    eps = np.finfo(float).eps
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        if fit_intercept:
+            dx = x - (np.bincount(codes, weights=x, minlength=k) / count)[codes]
+            dy = y - (np.bincount(codes, weights=y, minlength=k) / count)[codes]
+        else:
+            dx, dy = x, y
+        sxy = np.bincount(codes, weights=dx * dy, minlength=k)
+        sxx = np.bincount(codes, weights=dx * dx, minlength=k)
+        flat = sxx <= eps * np.bincount(codes, weights=x * x, minlength=k)
+        beta = np.where(flat, 0.0, sxy / np.where(flat, 1, sxx))
+
+        if method == "spearman":
+            x, y = _group_rank(codes, x), _group_rank(codes, y)
+        dx = x - (np.bincount(codes, weights=x, minlength=k) / count)[codes]
+        dy = y - (np.bincount(codes, weights=y, minlength=k) / count)[codes]
+        sxy = np.bincount(codes, weights=dx * dy, minlength=k)
+        sxx = np.bincount(codes, weights=dx * dx, minlength=k)
+        syy = np.bincount(codes, weights=dy * dy, minlength=k)
+        ic = np.clip(sxy / np.sqrt(sxx) / np.sqrt(syy), -1, 1)
+        if method == "pearson":
+            flat = (sxx <= eps * np.bincount(codes, weights=x * x, minlength=k)) | (
+                syy <= eps * np.bincount(codes, weights=y * y, minlength=k)
+            )
+            ic = np.where(flat & (count >= 2), 0.0, ic)
+
+    return pd.DataFrame({dt_col: uniques, "count": count, "ic": ic, "beta": beta})
+
+
 def cross_sectional_ic(df, x_col="open", y_col="n1b", method="spearman", **kwargs):
     """分析 df 中 x_col 和 y_col 列的截面相关性（IC）
 
@@ -105,12 +197,17 @@ def cross_sectional_ic(df, x_col="open", y_col="n1b", method="spearman", **kwarg
             * kendall : Kendall Tau correlation coefficient
             * spearman : Spearman rank correlation
             * callable: callable with input two 1d ndarrays and returning a float
+
+        pearson、spearman 按截面批量计算，kendall、callable 逐个截面计算
     :return：df，res: 前者是每日相关系数结果，后者是每日相关系数的统计结果
     """
     dt_col = kwargs.pop("dt_col", "dt")
-    tqdm.pandas(desc="cross_section_ic")
-    s = df.groupby(dt_col).progress_apply(lambda row: row[x_col].corr(row[y_col], method=method))
-    df = pd.DataFrame(s, columns=["ic"]).reset_index(inplace=False)
+    if method in ["pearson", "spearman"]:
+        df = _cross_sectional_stats(df, x_col, y_col, dt_col=dt_col, method=method)[[dt_col, "ic"]]
+    else:
+        tqdm.pandas(desc="cross_section_ic")
+        s = df.groupby(dt_col).progress_apply(lambda row: row[x_col].corr(row[y_col], method=method))
+        df = pd.DataFrame(s, columns=["ic"]).reset_index(inplace=False)
 
     res = {
         "x_col": x_col,
@@ -19,8 +19,15 @@ def dill_load(file):
 
 
 def save_pkl(data, file):
-    with open(file, "wb") as f:
-        pickle.dump(data, f)
+    """原子写入 pkl 文件：先写临时文件再重命名，进程中断时不会留下不完整的文件"""
+    file_tmp = f"{file}.{os.getpid()}.tmp"
+    try:
+        with open(file_tmp, "wb") as f:
+            pickle.dump(data, f)
+        os.replace(file_tmp, file)
+    finally:
+        if os.path.exists(file_tmp):
+            os.remove(file_tmp)
 
 
 def read_pkl(file):
@@ -40,6 +47,17 @@ def read_json(file):
     return data
 
 
+def save_parquet(df, file):
+    """原子写入 parquet 文件：先写临时文件再重命名，进程中断时不会留下不完整的文件"""
+    file_tmp = f"{file}.{os.getpid()}.tmp"
+    try:
+        df.to_parquet(file_tmp)
+        os.replace(file_tmp, file)
+    finally:
+        if os.path.exists(file_tmp):
+            os.remove(file_tmp)
+
+
 def make_zip(source_dir: str, file_zip: str) -> None:
     """打包目录为zip文件
 
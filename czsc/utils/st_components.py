@@ -449,7 +449,7 @@ def show_weight_backtest(dfw, **kwargs):
             st.dataframe(df_.style.background_gradient(cmap="RdYlGn_r").format("{:.2%}"), use_container_width=True)
 
         with c2.expander("查看开平交易对", expanded=False):
-            dfp = pd.concat([v["pairs"] for k, v in wb.results.items() if k in wb.symbols], ignore_index=True)
+            dfp = pd.concat([wb.get_symbol_pairs(symbol) for symbol in sorted(wb.symbols)], ignore_index=True)
             st.dataframe(dfp, use_container_width=True)
 
     if kwargs.get("show_splited_daily", False):
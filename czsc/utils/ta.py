@@ -143,3 +143,191 @@ def RSQ(close: [np.array, list]) -> float:
     rsq = 1 - ss_err / ss_tot
 
     return round(rsq, 4)
+
+
+class IncrementalIndicator:
+    """增量计算的技术指标基类
+
+    第 i 根K线的指标值只依赖于第 i - 1 根K线计算完成后的状态，以及最近若干根K线的行情数据，
+    更新一根K线的时间复杂度与历史K线数量无关。最后一根K线可能被多次更新（时间延伸），
+    因此同时保留上一根K线计算完成后的状态，用于重新计算最后一根K线。
+
+    子类需要实现 init_state 和 step，并设置 key（缓存 key）和 fields（指标值为 dict 时的字段名）。
+    """
+
+    key: str = ""
+    fields = None
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.state = self.init_state()
+        self.prev_state = self.state
+
+    def init_state(self):
+        raise NotImplementedError
+
+    def step(self, state, bars: dict, i: int, start: int):
+        """计算第 i 根K线的指标值
+
+        :param state: 第 i - 1 根K线计算完成后的状态
+        :param bars: 行情数据，列名到 numpy 数组的映射，如 bars["close"][i]
+        :param i: 当前K线在数组中的位置
+        :param start: 数组中第一根有效K线的位置，回看时不能早于 start
+        :return: (新的状态, 指标值)；指标值为标量，或者与 fields 对应的元组
+        """
+        raise NotImplementedError
+
+    def update(self, bars: dict, i: int, start: int, replace=False):
+        """更新第 i 根K线；replace 为 True 表示重新计算上一次更新的那根K线"""
+        if not replace:
+            self.prev_state = self.state
+        self.state, value = self.step(self.prev_state, bars, i, start)
+        return value
+
+
+class IncrementalSMA(IncrementalIndicator):
+    """简单移动平均，与 ta-lib 的 SMA 一致：前 timeperiod - 1 根K线为 nan"""
+
+    def __init__(self, timeperiod: int, source: str = "close", key: str = None):
+        self.timeperiod = int(timeperiod)
+        self.source = source
+        self.key = key or f"SMA#{self.timeperiod}"
+        super().__init__()
+
+    def init_state(self):
+        return 0
+
+    def step(self, state, bars, i, start):
+        n = state + 1
+        if n < self.timeperiod:
+            return n, np.nan
+        return n, bars[self.source][max(i - self.timeperiod + 1, start): i + 1].mean()
+
+
+class IncrementalEMA(IncrementalIndicator):
+    """指数移动平均，与 ta-lib 的 EMA 一致：使用前 timeperiod 个数据的均值作为初始值"""
+
+    def __init__(self, timeperiod: int, source: str = "close", key: str = None):
+        self.timeperiod = int(timeperiod)
+        self.source = source
+        self.key = key or f"EMA#{self.timeperiod}"
+        self.k = 2.0 / (self.timeperiod + 1)
+        super().__init__()
+
+    def init_state(self):
+        return 0, 0.0, np.nan  # 已计算的K线数量，初始化阶段的累计值，EMA
+
+    def step(self, state, bars, i, start):
+        n, total, ema = state
+        x = bars[self.source][i]
+        n += 1
+        if n < self.timeperiod:
+            return (n, total + x, ema), np.nan
+        if n == self.timeperiod:
+            ema = (total + x) / self.timeperiod
+        else:
+            ema = (x - ema) * self.k + ema
+        return (n, total, ema), ema
+
+
+class IncrementalMACD(IncrementalIndicator):
+    """MACD，与 czsc.utils.ta.MACD 的计算结果一致"""
+
+    fields = ("dif", "dea", "macd")
+
+    def __init__(self, fastperiod=12, slowperiod=26, signalperiod=9):
+        self.fastperiod, self.slowperiod, self.signalperiod = int(fastperiod), int(slowperiod), int(signalperiod)
+        self.key = f"MACD{self.fastperiod}#{self.slowperiod}#{self.signalperiod}"
+        super().__init__()
+
+    def init_state(self):
+        return None  # 快线 EMA、慢线 EMA、DEA，均为未四舍五入的值
+
+    @staticmethod
+    def _ema(prev, x, timeperiod):
+        return x if prev is None else (2 * x + prev * (timeperiod - 1)) / (timeperiod + 1)
+
+    def step(self, state, bars, i, start):
+        close = bars["close"][i]
+        fast, slow, dea = state or (None, None, None)
+        fast = self._ema(fast, close, self.fastperiod)
+        slow = self._ema(slow, close, self.slowperiod)
+        diff = np.round(fast, 4) - np.round(slow, 4)
+        dea = self._ema(dea, diff, self.signalperiod)
+        dea_ = np.round(dea, 4)
+        macd = (diff - dea_) * 2
+        return (fast, slow, dea), (np.round(diff, 4), dea_, np.round(macd, 4))
+
+
+class IncrementalRSI(IncrementalIndicator):
+    """相对强弱指数，与 ta-lib 的 RSI 一致：使用 Wilder 平滑，前 timeperiod 根K线为 nan"""
+
+    def __init__(self, timeperiod: int = 14):
+        self.timeperiod = int(timeperiod)
+        self.key = f"RSI{timeperiod}"
+        super().__init__()
+
+    def init_state(self):
+        return 0, np.nan, 0.0, 0.0  # 已计算的K线数量，上一根K线收盘价，平均上涨，平均下跌
+
+    def step(self, state, bars, i, start):
+        n, prev_close, gain, loss = state
+        close = bars["close"][i]
+        if n == 0:
+            return (1, close, 0.0, 0.0), np.nan
+
+        change = close - prev_close
+        up, down = (change, 0.0) if change > 0 else (0.0, -change)
+        m = self.timeperiod
+        if n < m:
+            # 初始化阶段，gain、loss 为累计值
+            gain, loss = gain + up, loss + down
+        elif n == m:
+            gain, loss = (gain + up) / m, (loss + down) / m
+        else:
+            gain, loss = (gain * (m - 1) + up) / m, (loss * (m - 1) + down) / m
+
+        state = (n + 1, close, gain, loss)
+        if n < m:
+            return state, np.nan
+        total = gain + loss
+        return state, 100 * (gain / total) if not -1e-8 < total < 1e-8 else 0.0
+
+
+class IncrementalKDJ(IncrementalIndicator):
+    """KDJ，K、D 与 ta-lib 的 STOCH（slowk_matype=0, slowd_matype=0）一致，J = 3K - 2D"""
+
+    fields = ("k", "d", "j")
+
+    def __init__(self, fastk_period=9, slowk_period=3, slowd_period=3):
+        self.fastk_period, self.slowk_period, self.slowd_period = int(fastk_period), int(slowk_period), int(slowd_period)
+        self.key = f"KDJ{self.fastk_period}#{self.slowk_period}#{self.slowd_period}"
+        super().__init__()
+
+    def init_state(self):
+        return 0, (), ()  # 已计算的K线数量，最近 slowk_period 个 fastk，最近 slowd_period 个 slowk
+
+    def step(self, state, bars, i, start):
+        n, fastk_seq, slowk_seq = state
+        n += 1
+        if n < self.fastk_period:
+            return (n, fastk_seq, slowk_seq), (np.nan, np.nan, np.nan)
+
+        s = max(i - self.fastk_period + 1, start)
+        highest, lowest = bars["high"][s: i + 1].max(), bars["low"][s: i + 1].min()
+        diff = (highest - lowest) / 100.0
+        fastk = (bars["close"][i] - lowest) / diff if diff != 0 else 0.0
+
+        fastk_seq = (fastk_seq + (fastk,))[-self.slowk_period:]
+        if len(fastk_seq) < self.slowk_period:
+            return (n, fastk_seq, slowk_seq), (np.nan, np.nan, np.nan)
+
+        slowk = sum(fastk_seq) / self.slowk_period
+        slowk_seq = (slowk_seq + (slowk,))[-self.slowd_period:]
+        if len(slowk_seq) < self.slowd_period:
+            return (n, fastk_seq, slowk_seq), (np.nan, np.nan, np.nan)
+
+        slowd = sum(slowk_seq) / self.slowd_period
+        return (n, fastk_seq, slowk_seq), (slowk, slowd, 3 * slowk - 2 * slowd)
@@ -5,6 +5,7 @@ email: zeng_bin8888@163.com
 create_dt: 2023/3/21 16:04
 describe: 交易相关的工具函数
 """
+import numpy as np
 import pandas as pd
 from typing import List, Union
 from czsc.objects import RawBar
@@ -99,16 +100,20 @@ def update_nxb(df: pd.DataFrame, **kwargs) -> pd.DataFrame:
     df["dt"] = pd.to_datetime(df["dt"])
     df = df.sort_values(["dt", "symbol"]).reset_index(drop=True)
 
+    # 所有品种、所有周期的收益一次性计算，作为一个整体拼接到 df 上
     nseq = kwargs.get("nseq", (1, 2, 3, 5, 8, 10, 13))
-    for symbol, dfg in df.groupby("symbol"):
+    price = df.groupby("symbol")["price"]
+    block = {}
+    for n in nseq:
+        block[f"n{n}b"] = (price.shift(-n) / df["price"] - 1).fillna(0)
+        if kwargs.get("bp", False) is True:
+            block[f"n{n}b"] = block[f"n{n}b"] * 10000
 
-        for n in nseq:
-            dfg[f"n{n}b"] = dfg["price"].shift(-n) / dfg["price"] - 1
-            df.loc[dfg.index, f"n{n}b"] = dfg[f"n{n}b"].fillna(0)
-
-            if kwargs.get("bp", False) is True:
-                df[f"n{n}b"] = df[f"n{n}b"] * 10000
-    return df
+    dfn = pd.DataFrame(block, index=df.index)
+    exists = [c for c in dfn.columns if c in df.columns]
+    if exists:
+        df[exists] = dfn[exists]
+    return pd.concat([df, dfn.drop(columns=exists)], axis=1)
 
 
 def update_bbars(da, price_col="close", numbers=(1, 2, 5, 10, 20, 30)) -> None:
@@ -128,9 +133,10 @@ def update_bbars(da, price_col="close", numbers=(1, 2, 5, 10, 20, 30)) -> None:
     if price_col not in da.columns:
         raise ValueError(f"price_col {price_col} not in da.columns")
 
-    for n in numbers:
-        # 收益计量单位：BP；1倍涨幅 = 10000BP
-        da[f"b{n}b"] = (da[price_col] / da[price_col].shift(n) - 1) * 10000
+    # 收益计量单位：BP；1倍涨幅 = 10000BP
+    price = da[price_col]
+    block = {f"b{n}b": (price / price.shift(n) - 1) * 10000 for n in numbers}
+    da[list(block.keys())] = pd.DataFrame(block, index=da.index)
 
 
 def update_tbars(da: pd.DataFrame, event_col: str) -> None:
@@ -150,8 +156,11 @@ def update_tbars(da: pd.DataFrame, event_col: str) -> None:
     :return: None
     """
     n_seq = [int(x.strip("nb")) for x in da.columns if x[0] == "n" and x[-1] == "b"]
-    for n in n_seq:
-        da[f"t{n}b"] = da[f"n{n}b"] * da[event_col]
+    if not n_seq:
+        return
+    block = da[[f"n{n}b" for n in n_seq]].mul(da[event_col], axis=0)
+    block.columns = [f"t{n}b" for n in n_seq]
+    da[block.columns.tolist()] = block
 
 
 def resample_to_daily(df: pd.DataFrame, sdt=None, edt=None, only_trade_date=True):
@@ -167,9 +176,8 @@ def resample_to_daily(df: pd.DataFrame, sdt=None, edt=None, only_trade_date=True
     2. 函数将`df`中的`dt`列转换为日期时间格式。如果没有提供`sdt`或`edt`，则使用`df`中的最小和最大日期作为开始和结束日期。
     3. 创建一个日期序列。如果`only_trade_date`为真，则只包含交易日期；否则，包含`sdt`和`edt`之间的所有日期。
     4. 使用`merge_asof`函数，找到每个日期在原始`df`中对应的最近一个日期。
-    5. 创建一个映射，将每个日期映射到原始`df`中的对应行。
-    6. 对于日期序列中的每个日期，复制映射中对应的数据行，并将日期设置为当前日期。
-    7. 最后，将所有复制的数据行合并成一个新的数据框，并返回。
+    5. 将原始`df`按日期稳定排序，计算每个日期的数据行在排序结果中的起止位置。
+    6. 根据日期序列对应的起止位置，一次性生成所有日期需要的行号，用 take 取出数据行，并将日期设置为日期序列中的日期。
 
     :param df: 日线以上周期的数据，必须包含 dt 列
     :param sdt: 开始日期
@@ -196,15 +204,19 @@ def resample_to_daily(df: pd.DataFrame, sdt=None, edt=None, only_trade_date=True
     trade_dates = pd.merge_asof(trade_dates, vdt, left_on="date", right_on="dt")
     trade_dates = trade_dates.dropna(subset=["dt"]).reset_index(drop=True)
 
-    dt_map = {dt: dfg for dt, dfg in df.groupby("dt")}
-    results = []
-    for row in trade_dates.to_dict("records"):
-        # 注意：这里必须进行 copy，否则默认浅拷贝导致数据异常
-        df_ = dt_map[row["dt"]].copy()
-        df_["dt"] = row["date"]
-        results.append(df_)
+    # 原始 df 中每个日期的数据行在稳定排序后的起止位置，每个交易日取对应日期的全部行
+    codes, uniques = pd.factorize(df["dt"], sort=True)
+    order = np.argsort(codes, kind="stable")
+    sizes = np.bincount(codes[codes >= 0], minlength=len(uniques))
+    starts = np.cumsum(sizes) - sizes
 
-    dfr = pd.concat(results, ignore_index=True)
+    groups = uniques.get_indexer(trade_dates["dt"])
+    repeats = sizes[groups]
+    offsets = np.arange(repeats.sum()) - np.repeat(np.cumsum(repeats) - repeats, repeats)
+    rows = order[np.repeat(starts[groups], repeats) + offsets]
+
+    dfr = df.take(rows).reset_index(drop=True)
+    dfr["dt"] = np.repeat(trade_dates["date"].to_numpy(), repeats)
     return dfr
 
 
@@ -235,9 +247,14 @@ def adjust_holding_weights(df, hold_periods=1, **kwargs):
     # 在 adjust_dts 上获取每个品种的权重，并且在 dts 上进行前向填充
     dfs = pd.pivot_table(df, index="dt", columns="symbol", values="weight").fillna(0)
     dfs = dfs[dfs.index.isin(adjust_dts)]
-    dfs = dfs.reindex(dts, method="ffill").fillna(0).reset_index()
 
-    # 从原始数据中获取 n1b 列，然后将 weight 列与 n1b 列进行合并
-    dfw1 = pd.melt(dfs, id_vars="dt", value_vars=dfs.columns.to_list(), var_name="symbol", value_name="weight")
-    dfw1 = pd.merge(df[["dt", "symbol", "n1b"]], dfw1, on=["dt", "symbol"], how="left")
+    dfs = dfs.reindex(dts, method="ffill").fillna(0)
+
+    # 从原始数据中获取 n1b 列，按 (dt, symbol) 直接从权重矩阵中取出每一行的 weight
+    dfw1 = df[["dt", "symbol", "n1b"]].reset_index(drop=True)
+    rows = dfs.index.get_indexer(dfw1["dt"])
+    cols = dfs.columns.get_indexer(dfw1["symbol"])
+    weight = np.full(len(dfw1), np.nan)
+    weight[cols >= 0] = dfs.to_numpy(dtype=float)[rows[cols >= 0], cols[cols >= 0]]
+    dfw1["weight"] = weight
     return dfw1
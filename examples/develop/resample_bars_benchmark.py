@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+"""
+describe: resample_bars 向量化实现与逐行计算周期结束时间的旧实现的性能对比
+
+运行方式：python examples/develop/resample_bars_benchmark.py
+"""
+import sys
+
+sys.path.insert(0, ".")
+sys.path.insert(0, "..")
+sys.path.insert(0, "../..")
+import time
+import pandas as pd
+from czsc.objects import Freq, RawBar
+from czsc.utils.bar_generator import resample_bars, freq_end_time, check_freq_and_market
+from test.test_analyze import read_1min
+
+
+def resample_bars_v1(df: pd.DataFrame, target_freq, raw_bars=True, **kwargs):
+    """旧版本实现：逐行调用 freq_end_time，逐行创建 RawBar"""
+    target_freq = Freq(target_freq) if not isinstance(target_freq, Freq) else target_freq
+    if target_freq.value.endswith("分钟"):
+        uni_times = sorted(df["dt"].tail(2000).apply(lambda x: x.strftime("%H:%M")).unique().tolist())
+        _, market = check_freq_and_market(uni_times, freq=kwargs.get("base_freq", None))
+    else:
+        market = "默认"
+
+    df["freq_edt"] = df["dt"].apply(lambda x: freq_end_time(x, target_freq, market))
+    dfk1 = df.groupby("freq_edt").agg(
+        {
+            "symbol": "first",
+            "dt": "last",
+            "open": "first",
+            "close": "last",
+            "high": "max",
+            "low": "min",
+            "vol": "sum",
+            "amount": "sum",
+            "freq_edt": "last",
+        }
+    )
+    dfk1.reset_index(drop=True, inplace=True)
+    dfk1["dt"] = dfk1["freq_edt"]
+    dfk1 = dfk1[["symbol", "dt", "open", "close", "high", "low", "vol", "amount"]]
+    if not raw_bars:
+        return dfk1
+
+    _bars = []
+    for i, row in enumerate(dfk1.to_dict("records"), 1):
+        row.update({"id": i, "freq": target_freq})
+        _bars.append(RawBar(**row))
+    if df["dt"].iloc[-1] < _bars[-1].dt:
+        _bars.pop()
+    return _bars
+
+
+def timeit(func, *args, **kwargs):
+    start = time.perf_counter()
+    res = func(*args, **kwargs)
+    return res, time.perf_counter() - start
+
+
+def main():
+    df = pd.DataFrame(read_1min())
+    print(f"1分钟K线数量：{len(df)}")
+
+    for freq in ["5分钟", "30分钟", "60分钟", "日线", "周线", "月线"]:
+        bars1, t1 = timeit(resample_bars_v1, df.copy(), freq, raw_bars=True)
+        bars2, t2 = timeit(resample_bars, df.copy(), freq, raw_bars=True)
+        arrays, t3 = timeit(resample_bars, df.copy(), freq, columnar=True)
+        assert [x.__dict__ for x in bars1] == [x.__dict__ for x in bars2]
+        assert len(arrays["dt"]) == len(bars2)
+        print(f"{freq}：逐行实现 {t1:.3f}s；向量化 RawBar {t2:.3f}s；向量化列式 {t3:.3f}s；加速 {t1 / t2:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+"""
+describe: features.utils 中 rolling_* 函数向量化实现与 rolling.apply 逐窗口计算的旧实现的性能对比
+
+运行方式：python examples/develop/rolling_features_benchmark.py
+"""
+import sys
+
+sys.path.insert(0, ".")
+sys.path.insert(0, "..")
+sys.path.insert(0, "../..")
+import time
+import numpy as np
+import pandas as pd
+from sklearn.linear_model import LinearRegression
+from sklearn.preprocessing import scale, maxabs_scale, robust_scale
+from czsc.features import utils
+
+
+def rolling_norm_v1(df, col, window=300, min_periods=2):
+    fn = lambda x: (x[-1] - x.mean()) / x.std()
+    return df[col].rolling(window=window, min_periods=min_periods).apply(fn, raw=True).fillna(0)
+
+
+def rolling_qcut_v1(df, col, window=300, min_periods=10, q=10):
+    fn = lambda x: pd.qcut(x, q=q, labels=False, duplicates="drop")[-1]
+    return df[col].rolling(window=window, min_periods=min_periods).apply(fn, raw=True).fillna(-1)
+
+
+def rolling_scale_v1(df, col, window=300, min_periods=100, method=scale):
+    return df[col].rolling(window=window, min_periods=min_periods).apply(lambda x: method(x)[-1]).fillna(0)
+
+
+def rolling_tanh_v1(df, col, window=300, min_periods=100):
+    fn = lambda x: np.tanh(scale(x))[-1]
+    return df[col].rolling(window=window, min_periods=min_periods).apply(fn).fillna(0)
+
+
+def feature_to_weight_v1(df, factor, window=1000, min_periods=100, q_threshold=0.05):
+    upper = df[factor].rolling(window, min_periods).quantile(1 - q_threshold)
+    lower = df[factor].rolling(window, min_periods).quantile(q_threshold)
+    df[factor] = df[factor].clip(lower=lower, upper=upper)
+    norm = df[factor].rolling(window, min_periods).apply(lambda x: scale(x)[-1])
+    return norm.rolling(window, min_periods).apply(lambda x: maxabs_scale(x)[-1]).fillna(0)
+
+
+def rolling_compare_v1(df, col1, col2, window=300, min_periods=2):
+    res = []
+    for i in range(len(df)):
+        dfi = df.loc[i - window + 1 : i, [col1, col2]]
+        if i < min_periods:
+            res.append(0)
+            continue
+        reg = LinearRegression().fit(dfi[col2].values.reshape(-1, 1), dfi[col1].values.reshape(-1, 1))
+        res.append(reg.coef_[0][0])
+    return pd.Series(res, index=df.index)
+
+
+def timeit(func, *args, **kwargs):
+    start = time.perf_counter()
+    res = func(*args, **kwargs)
+    return res, time.perf_counter() - start
+
+
+def main():
+    n = 20000
+    rng = np.random.default_rng(42)
+    df = pd.DataFrame({"dt": pd.date_range("2020-01-01", periods=n, freq="min"), "symbol": "TEST"})
+    df["x"] = np.cumsum(rng.normal(size=n)) + 1000
+    df["y"] = df["x"] * 0.5 + rng.normal(size=n)
+    print(f"数据量：{n}")
+
+    cases = [
+        ("rolling_norm", rolling_norm_v1, lambda d: utils.rolling_norm(d, "x")["x_norm"]),
+        ("rolling_qcut", rolling_qcut_v1, lambda d: utils.rolling_qcut(d, "x")["x_qcut"]),
+        ("rolling_scale", rolling_scale_v1, lambda d: utils.rolling_scale(d, "x")["x_scale"]),
+        (
+            "rolling_scale[robust]",
+            lambda d, c: rolling_scale_v1(d, c, method=robust_scale),
+            lambda d: utils.rolling_scale(d, "x", method="robust_scale")["x_scale"],
+        ),
+        ("rolling_tanh", rolling_tanh_v1, lambda d: utils.rolling_tanh(d, "x")["x_tanh"]),
+        ("feature_to_weight", feature_to_weight_v1, lambda d: utils.feature_to_weight(d, "x", positive=True)["weight"]),
+        (
+            "rolling_compare[lr_coef]",
+            lambda d, c: rolling_compare_v1(d, c, "y"),
+            lambda d: utils.rolling_compare(d, "x", "y", method="lr_coef")["compare_x_y"],
+        ),
+    ]
+    for name, func_v1, func in cases:
+        s1, t1 = timeit(func_v1, df.copy(), "x")
+        s2, t2 = timeit(func, df.copy())
+        assert np.allclose(s1.to_numpy(), s2.to_numpy(), rtol=1e-8, atol=1e-10, equal_nan=True)
+        print(f"{name}：逐窗口实现 {t1:.3f}s；向量化 {t2:.3f}s；加速 {t1 / t2:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
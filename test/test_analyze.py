@@ -3,7 +3,7 @@ import os
 import zipfile
 from tqdm import tqdm
 import pandas as pd
-from czsc.analyze import CZSC, RawBar, NewBar, remove_include, FX, check_fx, Direction, kline_pro
+from czsc.analyze import CZSC, ColumnarCZSC, RawBar, NewBar, remove_include, FX, check_fx, check_fxs, Direction, kline_pro
 from czsc.enum import Freq
 from collections import OrderedDict
 
@@ -90,3 +90,153 @@ def test_czsc_update():
     file_html = "x.html"
     chart.render(file_html)
     os.remove(file_html)
+
+
+def test_columnar_czsc():
+    bars = read_daily()
+
+    def __check(c1, c2):
+        assert [(x.sdt, x.edt, x.high, x.low, x.length) for x in c1.bi_list] == \
+               [(x.sdt, x.edt, x.high, x.low, x.length) for x in c2.bi_list]
+        assert [x.dt for x in c1.bars_raw] == [x.dt for x in c2.bars_raw]
+        assert [(x.dt, x.high, x.low, len(x.raw_bars)) for x in c1.bars_ubi] == \
+               [(x.dt, x.high, x.low, len(x.raw_bars)) for x in c2.bars_ubi]
+        assert [(x.dt, x.mark) for x in c1.fx_list] == [(x.dt, x.mark) for x in c2.fx_list]
+
+    c1 = CZSC(bars[:1000])
+    c2 = ColumnarCZSC(bars[:1000])
+    __check(c1, c2)
+
+    # 同一根K线多次推送（时间延伸）的场景
+    for bar in bars[1000:1500]:
+        close = (bar.open + bar.close) / 2
+        part = RawBar(symbol=bar.symbol, id=bar.id, dt=bar.dt, freq=bar.freq, open=bar.open, close=close,
+                      high=max(bar.open, close), low=min(bar.open, close), vol=bar.vol / 2, amount=bar.amount / 2)
+        for b in [part, bar]:
+            c1.update(b)
+            c2.update(b)
+    __check(c1, c2)
+
+    assert c2.bars_raw[-1].dt == bars[1499].dt
+    assert len(c2.bars_raw[-10:]) == 10
+    assert c2.ubi['high'] == c1.ubi['high']
+
+
+def test_czsc_incremental_ubi():
+    """增量维护的 ubi_fxs、ubi 与全量重算的结果一致"""
+    bars = read_daily()
+    c = CZSC(bars[:300])
+    for i, bar in enumerate(bars[300:1200]):
+        close = (bar.open + bar.close) / 2
+        part = RawBar(symbol=bar.symbol, id=bar.id, dt=bar.dt, freq=bar.freq, open=bar.open, close=close,
+                      high=max(bar.open, close), low=min(bar.open, close), vol=bar.vol / 2, amount=bar.amount / 2)
+        for b in [part, bar]:
+            c.update(b)
+
+        if i % 7 == 0:
+            assert [(x.dt, x.mark, x.fx) for x in c.ubi_fxs] == \
+                   [(x.dt, x.mark, x.fx) for x in check_fxs(c.bars_ubi)]
+
+            raw_bars = [x for y in c.bars_ubi for x in y.raw_bars]
+            ubi = c.ubi
+            if ubi:
+                assert [x.dt for x in ubi['raw_bars']] == [x.dt for x in raw_bars]
+                assert ubi['high'] == max(x.high for x in raw_bars)
+                assert ubi['low'] == min(x.low for x in raw_bars)
+                # 修改返回的 raw_bars 不影响增量状态
+                ubi['raw_bars'].clear()
+                assert len(c.ubi['raw_bars']) == len(raw_bars)
+
+    fx_list = [x for bi in c.bi_list for x in bi.fxs[1:]]
+    fx_list += [x for x in check_fxs(c.bars_ubi) if x.dt > fx_list[-1].dt]
+    assert [(x.dt, x.mark) for x in c.fx_list] == [(x.dt, x.mark) for x in fx_list]
+
+
+def test_czsc_from_dataframe():
+    bars = read_daily()
+    df = pd.DataFrame([{k: v for k, v in x.__dict__.items() if k != 'cache'} for x in bars])
+
+    c1 = CZSC(bars[:2000])
+    c2 = CZSC.from_dataframe(df.iloc[:2000], get_signals=lambda c: OrderedDict(n=len(c.bars_raw)))
+    c3 = CZSC.from_arrays(df['dt'].iloc[:2000], df['open'].iloc[:2000], df['close'].iloc[:2000],
+                          df['high'].iloc[:2000], df['low'].iloc[:2000], df['vol'].iloc[:2000],
+                          amount=df['amount'].iloc[:2000], symbol=bars[0].symbol, freq=bars[0].freq)
+    assert c2.signals['n'] == len(c1.bars_raw)
+
+    # 便捷构造函数创建之后继续增量更新
+    for bar in bars[2000:2500]:
+        c1.update(bar)
+        c2.update(bar)
+        c3.update(bar)
+
+    for c in [c2, c3]:
+        assert [(x.sdt, x.edt, x.high, x.low) for x in c1.bi_list] == [(x.sdt, x.edt, x.high, x.low) for x in c.bi_list]
+        assert [(x.dt, x.close, x.vol) for x in c1.bars_raw] == [(x.dt, x.close, x.vol) for x in c.bars_raw]
+        assert [(x.dt, x.high, x.low) for x in c1.bars_ubi] == [(x.dt, x.high, x.low) for x in c.bars_ubi]
+    assert c2.signals['n'] == len(c1.bars_raw)
+
+    # 批量构造的笔、分型、无包含K线与逐根构造完全一致，包括笔内分型的K线和原始K线
+    def _state(c):
+        def nb(x):
+            return x.dt, x.open, x.close, x.high, x.low, x.vol, x.amount, [e.dt for e in x.elements]
+
+        def fx(x):
+            return x.dt, x.mark, x.fx, [nb(e) for e in x.elements]
+
+        return ([(fx(x.fx_a), fx(x.fx_b), [fx(f) for f in x.fxs], [nb(b) for b in x.bars]) for x in c.bi_list],
+                [nb(x) for x in c.bars_ubi], [fx(x) for x in c.fx_list], [x.dt for x in c.bars_raw])
+
+    for max_bi_num in [1, 3, 50]:
+        for n in [3, 300, 3000]:
+            c1 = CZSC(bars[:n], max_bi_num=max_bi_num)
+            c2 = CZSC.from_dataframe(df.iloc[:n], max_bi_num=max_bi_num)
+            assert _state(c1) == _state(c2) and len(c2.indicators) == len(c2.bars_raw)
+            for bar in bars[n: n + 200]:
+                c1.update(bar)
+                c2.update(bar)
+            assert _state(c1) == _state(c2)
+
+
+def test_czsc_indicator_store():
+    """CZSC.indicators 按列存储已注册的指标缓存，通过 bar.cache 读写"""
+    import numpy as np
+    from czsc.utils.columnar import update_bars_cache
+
+    bars = read_daily()
+    c = CZSC(bars[:500], max_bi_num=10)
+    close = np.array([x.close for x in c.bars_raw])
+    update_bars_cache(c, 'SMA#5', close * 2)
+    update_bars_cache(c, 'M', {'a': close, 'b': -close}, n=3)
+    assert len(c.indicators) == len(c.bars_raw)
+    assert c.bars_raw[-1].cache['SMA#5'] == close[-1] * 2
+    assert c.bars_raw[-1].cache['M'] == {'a': close[-1], 'b': -close[-1]}
+    assert 'M' not in c.bars_raw[-4].cache and 'SMA#5' in c.bars_raw[-4].cache
+
+    # 未注册的 key 仍然存储在 K 线自身的字典中；整体赋值与 dict 语义一致
+    bar = c.bars_raw[-1]
+    bar.cache['flag'] = '高位'
+    assert dict(bar.cache) == {'SMA#5': close[-1] * 2, 'M': {'a': close[-1], 'b': -close[-1]}, 'flag': '高位'}
+    bar.cache = {'SMA#5': 1.0}
+    assert dict(bar.cache) == {'SMA#5': 1.0}
+
+    # 同一根K线的时间延伸，指标缓存失效
+    last = bars[499]
+    part = RawBar(symbol=last.symbol, id=last.id, dt=last.dt, freq=last.freq, open=last.open, close=last.open,
+                  high=last.high, low=last.low, vol=last.vol / 2, amount=last.amount / 2)
+    c.update(part)
+    assert 'SMA#5' not in c.bars_raw[-1].cache and 'SMA#5' in c.bars_raw[-2].cache
+
+    # bars_raw 裁剪后，指标存储同步裁剪
+    for bar in bars[500:1500]:
+        c.update(bar)
+    assert len(c.indicators) == len(c.bars_raw)
+    assert c.bars_raw[0].cache.index == c.indicators.head
+
+    # cache 为空的K线直接绑定，不复制；同一批K线被多个 CZSC 对象使用时才复制，指标缓存互不影响
+    assert c.bars_raw[-2] is bars[1498]
+    c2 = CZSC(bars[:500])
+    assert c2.bars_raw[-2] is not bars[498] and c2.bars_raw[-2].dt == bars[498].dt
+    assert 'SMA#5' not in c2.bars_raw[-2].cache
+    update_bars_cache(c, 'SMA#5', np.array([x.close for x in c.bars_raw]))
+    c3 = CZSC(c.bars_raw)
+    assert 'SMA#5' not in c3.bars_raw[-2].cache and 'SMA#5' in c.bars_raw[-2].cache
@@ -4,6 +4,7 @@ import pandas as pd
 from tqdm import tqdm
 from czsc.objects import Freq
 from czsc.utils.bar_generator import BarGenerator, freq_end_time, resample_bars, check_freq_and_market, freq_market_times
+from czsc.utils.bar_generator import freq_end_times, resample_bars_multi
 from test.test_analyze import read_1min, read_daily
 
 cur_path = os.path.split(os.path.realpath(__file__))[0]
@@ -299,6 +300,54 @@ def test_resample_bars():
     assert len(_f60_bars) == 3996
 
 
+def test_freq_end_times():
+    """验证向量化计算的周期结束时间与逐个计算的结果一致"""
+    dts = pd.Series([x.dt for x in kline[-5000:]])
+    for freq in ['1分钟', '5分钟', '15分钟', '30分钟', '60分钟', '日线', '周线', '月线', '季线', '年线']:
+        edts = freq_end_times(dts, freq, 'A股')
+        assert list(edts) == [freq_end_time(x, freq, 'A股') for x in dts]
+
+    dts = pd.Series(pd.date_range('2020-12-25', '2022-01-05', freq='D'))
+    for freq in ['周线', '月线', '季线', '年线']:
+        assert list(freq_end_times(dts, freq)) == [freq_end_time(x, freq) for x in dts]
+
+    df = pd.DataFrame(kline[-20000:])
+    bars = resample_bars(df, Freq.F30, raw_bars=True)
+    arrays = resample_bars(df, Freq.F30, columnar=True)
+    assert list(arrays['dt']) == [x.dt for x in bars]
+    assert list(arrays['close']) == [x.close for x in bars]
+    assert [x.id for x in bars] == list(range(1, len(bars) + 1))
+
+
+def test_resample_bars_multi():
+    """验证一次性合成多个周期与逐个周期合成的结果一致"""
+    import numpy as np
+
+    df = pd.DataFrame(kline[-50000:])
+    freqs = ['5分钟', '15分钟', '30分钟', '60分钟', '日线', '周线']
+    res = resample_bars_multi(df, freqs, raw_bars=False)
+    assert list(res.keys()) == freqs
+    for freq in freqs:
+        dfk = resample_bars(df.copy(), freq, raw_bars=False)
+        cols = ['symbol', 'dt', 'open', 'close', 'high', 'low']
+        assert dfk[cols].equals(res[freq][cols])
+        assert np.allclose(dfk['vol'], res[freq]['vol']) and np.allclose(dfk['amount'], res[freq]['amount'])
+
+    bars = resample_bars_multi(df, ['日线', '30分钟'])
+    assert [x.dt for x in bars['30分钟']] == [x.dt for x in resample_bars(df.copy(), '30分钟')]
+
+    # 一次性初始化 BarGenerator 与逐根更新的结果一致
+    bg1 = BarGenerator(base_freq='1分钟', freqs=['日线', '30分钟', '5分钟'], max_count=1000, market='A股')
+    bg2 = BarGenerator(base_freq='1分钟', freqs=['日线', '30分钟', '5分钟'], max_count=1000, market='A股')
+    for bar in kline[-20000:]:
+        bg1.update(bar)
+    bg2.init_bars(kline[-20000:])
+    assert bg1.end_dt == bg2.end_dt
+    for freq in bg1.bars.keys():
+        assert [(x.id, x.dt, x.open, x.close, x.high, x.low) for x in bg1.bars[freq]] == \
+               [(x.id, x.dt, x.open, x.close, x.high, x.low) for x in bg2.bars[freq]]
+
+
 def test_bg_on_f1():
     """验证从1分钟开始生成各周期K线"""
     bg = BarGenerator(base_freq='1分钟', freqs=['周线', '日线', '30分钟', '5分钟'], max_count=2000)
@@ -367,3 +416,29 @@ def test_get_intraday_times():
     assert get_intraday_times(freq='120分钟', market='期货') == ['11:00', '15:00', '23:00', '01:00', '02:30']
     x = ['02:00', '04:00', '06:00', '08:00', '10:00', '12:00', '14:00', '16:00', '18:00', '20:00', '22:00', '00:00']
     assert get_intraday_times(freq='120分钟', market='默认') == x
+
+
+def test_bg_inplace():
+    """验证原地更新模式与默认模式合成的K线一致"""
+    from czsc.utils.bar_generator import freq_edt_map
+
+    for key, edt_map in freq_edt_map.items():
+        freq, market = key.split("_")
+        for hm, edt in list(edt_map.items())[::7]:
+            dt = pd.to_datetime(f"2023-01-05 {hm}")
+            edt_ = freq_end_time(dt, freq, market)
+            assert edt_.strftime("%H:%M") == edt
+            if edt == "00:00" and freq != "1分钟" and hm != "00:00":
+                assert edt_.date() > dt.date()
+
+    freqs = ['周线', '日线', '60分钟', '30分钟', '5分钟']
+    bg1 = BarGenerator(base_freq='1分钟', freqs=freqs, max_count=1000, market='A股')
+    bg2 = BarGenerator(base_freq='1分钟', freqs=freqs, max_count=1000, market='A股', inplace=True)
+    for bar in kline[:20000]:
+        bg1.update(bar)
+        bg2.update(bar)
+        assert bg1.bars['30分钟'][-1].__dict__ == bg2.bars['30分钟'][-1].__dict__
+
+    for freq in bg1.bars.keys():
+        assert len(bg1.bars[freq]) == len(bg2.bars[freq]) <= 1000
+        assert [x.__dict__ for x in bg1.bars[freq]] == [x.__dict__ for x in bg2.bars[freq]]
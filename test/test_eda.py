@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+"""
+describe: 测试探索性分析的函数
+"""
+import numpy as np
+import pandas as pd
+from czsc.eda import remove_beta_effects, cross_sectional_strategy
+
+
+def mock_factor_data(seed=0):
+    rng = np.random.default_rng(seed)
+    dts = pd.date_range("2021-01-01", periods=30, freq="D")
+    df = pd.DataFrame([(dt, f"S{j:03d}") for j in range(50) for dt in dts], columns=["dt", "symbol"])
+    df = df.sample(frac=0.9, random_state=seed).reset_index(drop=True)
+    n = len(df)
+    df["b1"] = rng.normal(0, 1, n)
+    df["b2"] = rng.normal(0, 1, n)
+    df["b3"] = df["b1"] * 2
+    df["factor"] = rng.normal(0, 1, n) + df["b1"] * 0.5
+    df.loc[rng.random(n) < 0.05, "factor"] = np.nan
+    df.loc[rng.random(n) < 0.05, "b2"] = np.nan
+    return df
+
+
+def test_remove_beta_effects():
+    from sklearn.linear_model import Ridge, LinearRegression
+
+    df = mock_factor_data()
+    for linear_model, Model in [("ridge", Ridge), ("linear", LinearRegression)]:
+        for betas in [["b1", "b2"], ["b1", "b2", "b3"]]:
+            dfr = remove_beta_effects(df, factor="factor", betas=betas, linear_model=linear_model)
+
+            # 与逐个截面拟合 sklearn 模型的结果一致
+            rows = []
+            for _, dfg in df.groupby("dt"):
+                dfg = dfg.dropna(subset=["factor"] + betas).copy()
+                model = Model().fit(dfg[betas].values, dfg["factor"].values)
+                dfg["factor"] = dfg["factor"].values - model.predict(dfg[betas].values)
+                rows.append(dfg)
+            expected = pd.concat(rows, ignore_index=True)
+            pd.testing.assert_frame_equal(dfr, expected, check_exact=False, rtol=1e-7, atol=1e-8)
+
+
+def test_cross_sectional_strategy():
+    df = mock_factor_data()
+    for factor_direction in ["positive", "negative"]:
+        dfw = cross_sectional_strategy(df, "factor", factor_direction=factor_direction, long_num=5, short_num=3)
+        assert dfw["factor"].equals(df["factor"] if factor_direction == "positive" else -df["factor"])
+
+        for dt, dfg in dfw.groupby("dt"):
+            x = dfg["factor"]
+            assert dfg["weight"].round(8).tolist() == [round(1 / 5, 8) if v in x.nlargest(5).values else
+                                                       round(-1 / 3, 8) if v in x.nsmallest(3).values else 0
+                                                       for v in x]
+        assert np.isclose(dfw.groupby("dt")["weight"].sum(), 0).all()
+
+    # 截面数据量不足时跳过，权重为 0
+    dfw = cross_sectional_strategy(df, "factor", long_num=30, short_num=30)
+    assert (dfw["weight"] == 0).all()
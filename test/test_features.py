@@ -71,3 +71,164 @@ def test_normalize_corr():
     result = normalize_corr(df, fcol='factor', copy=True, mode='simple')
     corr2 = result['n1b'].corr(result['factor'])
     assert result.shape == df.shape and corr2 == -raw_corr
+
+
+def test_rolling_vectorized():
+    from sklearn.preprocessing import scale, minmax_scale, maxabs_scale, robust_scale
+    from czsc.features.utils import rolling_norm, rolling_qcut, rolling_scale, rolling_slope, rolling_compare
+
+    np.random.seed(42)
+    df = pd.DataFrame({'dt': pd.date_range(start='1/1/2021', periods=600), 'x': np.random.randn(600).cumsum()})
+    df['y'] = df['x'] * 0.5 + np.random.randn(600)
+    df.loc[[50, 400], 'x'] = np.nan
+    df.loc[200:260, 'x'] = 1.0
+
+    def assert_close(a, b):
+        assert np.allclose(a, b, rtol=1e-8, atol=1e-10, equal_nan=True)
+
+    # 与 rolling(...).apply 逐窗口计算的结果一致
+    res = rolling_norm(df.copy(), 'x', window=100)['x_norm']
+    expected = df['x'].rolling(100, min_periods=2).apply(lambda x: (x[-1] - x.mean()) / x.std(), raw=True)
+    assert_close(res, expected.replace([np.inf, -np.inf], np.nan).fillna(0))
+
+    res = rolling_qcut(df.copy(), 'x', window=100, q=5)['x_qcut']
+    expected = df['x'].rolling(100, min_periods=5).apply(
+        lambda x: pd.qcut(x, q=5, labels=False, duplicates="drop")[-1], raw=True)
+    assert res.equals(expected.fillna(-1))
+
+    for method, func in [('scale', scale), ('minmax_scale', lambda x: minmax_scale(x, feature_range=(-1, 1))),
+                         ('maxabs_scale', maxabs_scale), ('robust_scale', robust_scale)]:
+        res = rolling_scale(df.copy(), 'x', window=100, min_periods=50, method=method)['x_scale']
+        expected = df['x'].rolling(100, min_periods=50).apply(lambda x: func(x)[-1])
+        assert_close(res, expected.fillna(0))
+
+    res = rolling_slope(df.copy(), 'y', window=100, min_periods=50)['y_slope_linear']
+    expected = df['y'].rolling(100, min_periods=50).apply(lambda x: np.polyfit(np.arange(len(x)), x, 1)[0], raw=True)
+    assert_close(res, expected.fillna(0))
+
+    for method in ['sub', 'lr_coef', 'lr_intercept']:
+        res = rolling_compare(df.copy(), 'y', 'x', method=method)['compare_y_x']
+        assert res.iloc[:2].eq(0).all() and res.notna().sum() > 500
+
+    # 与逐窗口拟合 LinearRegression 的结果一致；窗口内 x 为常数时回归系数为 0
+    from sklearn.linear_model import LinearRegression
+    dfc = df.copy()
+    dfc['x'] = dfc['x'].ffill()
+    dfc.loc[:20, 'x'] = 1.0
+    coef = rolling_compare(dfc.copy(), 'y', 'x', method='lr_coef')['compare_y_x']
+    intercept = rolling_compare(dfc.copy(), 'y', 'x', method='lr_intercept')['compare_y_x']
+    expected = [[0, 0]] * 2
+    for i in range(2, len(dfc)):
+        dfi = dfc.iloc[max(0, i - 299): i + 1]
+        reg = LinearRegression().fit(dfi[['x']].values, dfi['y'].values)
+        expected.append([reg.coef_[0], reg.intercept_])
+    expected = np.array(expected)
+    assert_close(coef, expected[:, 0])
+    assert_close(intercept, expected[:, 1])
+
+
+def test_cross_sectional_batched():
+    from sklearn.linear_model import LinearRegression
+    from czsc.utils.corr import cross_sectional_ic
+    from czsc.features.utils import feature_returns, feature_sectional_corr
+
+    np.random.seed(42)
+    n = 3000
+    df = pd.DataFrame({'dt': pd.to_datetime('2021-01-01') + pd.to_timedelta(np.random.randint(0, 100, n), 'D')})
+    df['symbol'] = 'x'
+    df['factor'] = np.random.randint(0, 5, n).astype(float)
+    df['n1b'] = df['factor'] * 0.1 + np.random.randn(n)
+    df.loc[np.random.rand(n) < 0.1, 'factor'] = np.nan
+    small = pd.DataFrame({'dt': pd.to_datetime(['2020-12-01'] * 3), 'symbol': 'x', 'factor': [1, 2, 3.0], 'n1b': 0.1})
+    df = pd.concat([df, small], ignore_index=True)
+
+    # 与逐个截面计算的结果一致，样本不足 5 个的截面记为 0
+    for method in ['pearson', 'spearman', 'kendall']:
+        dft, res = feature_sectional_corr(df, 'factor', 'n1b', method=method)
+        expected = []
+        for dt, dfg in df.groupby('dt'):
+            dfg = dfg.dropna(subset=['factor', 'n1b'])
+            expected.append(dfg['factor'].corr(dfg['n1b'], method=method) if len(dfg) >= 5 else 0)
+        assert np.allclose(dft['ic'], expected) and res['IC均值'] == round(np.mean(expected), 4)
+
+        dfi, res = cross_sectional_ic(df, x_col='factor', y_col='n1b', method=method)
+        expected = df.groupby('dt').apply(lambda x: x['factor'].corr(x['n1b'], method=method)).dropna()
+        assert np.allclose(dfi['ic'], expected.values) and dfi['dt'].tolist() == expected.index.tolist()
+
+    for fit_intercept in [False, True]:
+        dft = feature_returns(df, 'factor', 'n1b', fit_intercept=fit_intercept)
+        expected = []
+        for dt, dfg in df.groupby('dt'):
+            dfg = dfg.dropna(subset=['factor', 'n1b'])
+            if len(dfg) < 5:
+                expected.append(0)
+                continue
+            model = LinearRegression(fit_intercept=fit_intercept).fit(dfg[['factor']].values, dfg['n1b'].values)
+            expected.append(model.coef_[0])
+        assert dft.columns.tolist() == ['dt', 'returns'] and np.allclose(dft['returns'], expected)
+
+    # 截面上因子或收益为常数时，pearson 相关系数记为 0（逐截面计算只得到舍入误差），spearman 为空值，回归系数为 0
+    from czsc.utils.corr import _cross_sectional_stats
+    dts = pd.to_datetime(['2022-01-03', '2022-01-04', '2022-01-05', '2022-01-06'])
+    dfc = pd.DataFrame({'dt': np.repeat(dts, 20), 'factor': np.r_[np.full(20, 0.3), np.full(20, 2.0),
+                                                                  np.random.randn(40)]})
+    dfc['n1b'] = np.r_[np.random.randn(40), np.full(20, 0.1 + 0.2), np.random.randn(20)]
+    for method in ['pearson', 'spearman']:
+        dfs = _cross_sectional_stats(dfc, 'factor', 'n1b', method=method, fit_intercept=True)
+        expected = dfc.groupby('dt').apply(lambda x: x['factor'].corr(x['n1b'], method=method))
+        assert not np.isnan(expected.iloc[3]) and np.isclose(dfs['ic'].iloc[3], expected.iloc[3])
+        if method == 'pearson':
+            assert (dfs['ic'].iloc[:3] == 0).all() and (expected.iloc[:3].fillna(0).abs() < 1e-12).all()
+        else:
+            assert dfs['ic'].iloc[:3].isnull().all() and expected.iloc[:3].isnull().all()
+        assert (dfs['beta'].iloc[:2] == 0).all() and dfs['beta'].iloc[2:].ne(0).all()
+
+
+def test_compute_features():
+    import warnings
+    from czsc import features
+    from czsc.features import compute_features, FeatureContext
+
+    np.random.seed(42)
+    close = 100 + np.random.randn(500).cumsum()
+    df = pd.DataFrame({'dt': pd.date_range(start='1/1/2021', periods=500), 'symbol': 'X', 'close': close,
+                       'open': close + np.random.randn(500) * 0.5})
+    df['high'] = df[['open', 'close']].max(axis=1) + np.random.rand(500)
+    df['low'] = df[['open', 'close']].min(axis=1) - np.random.rand(500)
+
+    configs = ['VPF001', ('VPF002', {'num': [3, 5]}), (features.VPF004, {'n': 7, 'tag': 'T'}), 'RET005',
+               ('RET004', {'n': [3, 10]}), ('RET001', {'n': list(range(1, 121))}), 'VPF003']
+    with warnings.catch_warnings():
+        warnings.simplefilter('error', pd.errors.PerformanceWarning)
+        dff = compute_features(df, configs)
+
+    # 批量计算的结果与逐个调用因子函数一致；RET 因子的字段标记默认为 A，参数网格展开时按变化的参数生成，每组参数各占一列
+    dfe = df.copy()
+    features.VPF001(dfe)
+    features.VPF002(dfe, num=3)
+    features.VPF002(dfe, num=5)
+    features.VPF004(dfe, n=7, tag='T')
+    features.RET005(dfe)
+    features.RET004(dfe, n=3, tag='N3')
+    features.RET004(dfe, n=10, tag='N10')
+    for n in range(1, 121):
+        features.RET001(dfe, n=n, tag=f'N{n}')
+    features.VPF003(dfe)
+    assert 'F#VPF004#T' in dff.columns and dff.shape[1] == df.shape[1] + 128
+    assert {'F#RET004#N3', 'F#RET004#N10', 'F#RET005#A', 'F#RET001#N1', 'F#RET001#N120'} <= set(dff.columns)
+    assert not dff['F#RET004#N3'].equals(dff['F#RET004#N10'])
+    assert compute_features(df, ['RET001']).columns[-1] == 'F#RET001#A'
+    pd.testing.assert_frame_equal(dff[dfe.columns], dfe)
+
+    # 不同的因子配置得到相同的字段名时报错，不会静默覆盖
+    for bad in [[('RET001', {'n': [5, 10], 'tag': 'A'})], ['RET001', ('RET001', {'n': 5})]]:
+        try:
+            compute_features(df, bad)
+            assert False, "重复的因子字段应当报错"
+        except ValueError as e:
+            assert 'F#RET001' in str(e)
+    assert df.shape[1] == 6
+
+    # 共享的中间变量只计算一次
+    ctx = FeatureContext(df)
+    assert ctx.get('hl_sum') is ctx.get('hl_sum') and len(ctx.cache) == 1
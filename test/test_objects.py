@@ -278,3 +278,106 @@ def test_event():
         }
     )
     assert len(event.get_signals_config()) == 3
+
+
+def test_slots_objects():
+    """RawBar / NewBar / FX / BI 使用 __slots__，兼容 dataclass 的常见用法"""
+    import pickle
+    import dataclasses
+    import pandas as pd
+    from copy import deepcopy
+    from czsc.analyze import CZSC
+    from czsc.objects import RawBar, NewBar, FX, BI
+    from test.test_analyze import read_daily
+
+    bars = read_daily()[:500]
+    c = CZSC(bars)
+    bi = c.bi_list[-1]
+    for x in [bars[0], c.bars_ubi[0], bi.fx_a, bi]:
+        assert not hasattr(x, '__weakref__')
+        assert dataclasses.is_dataclass(x)
+        assert pickle.loads(pickle.dumps(x)) == x
+        assert deepcopy(x) == x
+        try:
+            x.not_a_field = 1
+            assert False, "slots 对象不允许设置未定义的属性"
+        except AttributeError:
+            pass
+
+    # 没有访问 cache 时不创建字典
+    bar = RawBar(symbol='000001.SH', id=0, dt=pd.Timestamp('2023-01-01'), freq=Freq.D,
+                 open=1, close=2, high=3, low=0.5, vol=100, amount=200)
+    assert bar._cache is None and bar.__dict__['cache'] == {}
+    bar.cache['x'] = 1
+    assert bar.cache == {'x': 1}
+
+    df = pd.DataFrame(bars)
+    assert df['close'].tolist() == [x.close for x in bars]
+    assert pd.DataFrame([x.__dict__ for x in bars]).shape == df.shape
+    assert bi.__dict__['sdt'] == bi.sdt and isinstance(bi.fx_b, FX) and isinstance(bi.bars[0], NewBar)
+
+    # 兼容旧版本 dataclass 对象的序列化结果
+    old = RawBar.__new__(RawBar)
+    old.__setstate__(dict(bars[0].__dict__, cache={'a': 1}))
+    assert old.close == bars[0].close and old.cache == {'a': 1}
+    assert isinstance(pickle.loads(pickle.dumps(c)).bi_list[-1], BI)
+
+
+def test_signals_matcher():
+    """验证编译后的信号匹配结果与 Event.is_match 一致"""
+    import random
+    from czsc.objects import SignalsMatcher
+
+    rnd = random.Random(0)
+    keys = [f"15分钟_D{i}测试_信号V230101" for i in range(6)]
+    values = ["看多", "看空", "任意"]
+
+    def random_signal():
+        v1 = rnd.choice(values)
+        v2 = rnd.choice(["任意", "其他", "强"])
+        return Signal(f"{rnd.choice(keys)}_{v1}_{v2}_任意_{rnd.choice([0, 0, 50, 80])}")
+
+    def random_factor():
+        return Factor(signals_all=[random_signal() for _ in range(rnd.randint(1, 2))],
+                      signals_any=[random_signal() for _ in range(rnd.randint(0, 2))],
+                      signals_not=[random_signal() for _ in range(rnd.randint(0, 1))])
+
+    events = [Event(operate=rnd.choice([Operate.LO, Operate.LE, Operate.SO, Operate.SE]),
+                    factors=[random_factor() for _ in range(rnd.randint(1, 3))],
+                    signals_not=[random_signal() for _ in range(rnd.randint(0, 1))]) for _ in range(30)]
+
+    import pandas as pd
+
+    matcher = SignalsMatcher()
+    compiled = [[matcher.add_event(e) for e in events[i::3]] for i in range(3)]
+    rows = []
+    for _ in range(500):
+        s = {"dt": rnd.random()}
+        s.update({k: f"{rnd.choice(values[:2])}_{rnd.choice(['其他', '强'])}_任意_{rnd.choice([0, 60, 90])}" for k in keys})
+        rows.append(s)
+        for i, ces in enumerate(compiled):
+            expected = (None, None)
+            for e in events[i::3]:
+                m, f = e.is_match(s)
+                if m:
+                    expected = (e, f)
+                    break
+            assert matcher.match_events(ces, s) == expected
+
+    # 在信号 DataFrame 上按列匹配，结果与逐行匹配一致
+    df = pd.DataFrame(rows)
+    for ces in compiled:
+        event_index, factor_index = matcher.match_frame(ces, df)
+        for s, ei, fi in zip(rows, event_index, factor_index):
+            event, name = matcher.match_events(ces, s)
+            if event is None:
+                assert ei == -1
+            else:
+                assert ces[ei][1] is event and event.factors[fi].name == name
+
+    # 信号字典中缺少信号时，与 Signal.is_match 一样抛出异常
+    try:
+        matcher.match_events(compiled[0], {"dt": 0})
+        assert False
+    except ValueError:
+        pass
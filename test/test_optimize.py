@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+"""
+describe: 测试择时策略优化结果的读取与统计
+"""
+import os
+import shutil
+import numpy as np
+import pandas as pd
+import czsc
+from czsc.utils.cache import home_path
+from czsc.traders.optimize import positions_stats, one_position_stats, read_optim_results
+
+
+def write_results(path, symbols=("000001.SH", "000002.SZ", "600000.SH"), pos_names=("A", "B", "C"), seed=0):
+    """按 one_symbol_optim 的格式写入模拟的优化结果：每个标的一个文件夹，pairs、holds 各一个 parquet 文件"""
+    rng = np.random.default_rng(seed)
+    dts = pd.date_range("2021-01-04", periods=120, freq="D")
+    for symbol in symbols:
+        pairs, holds = [], []
+        for pos_name in pos_names:
+            sdt = pd.Series(dts[rng.choice(100, 8, replace=False)]).sort_values().tolist()
+            pairs.append(pd.DataFrame({
+                "标的代码": symbol, "策略标记": pos_name, "交易方向": "多头", "开仓时间": sdt,
+                "平仓时间": [x + pd.Timedelta(days=5) for x in sdt], "开仓价格": 10.0, "平仓价格": 11.0,
+                "持仓K线数": 5, "事件序列": "开多 -> 平多", "持仓天数": 5.0,
+                "盈亏比例": rng.normal(10, 50, 8).round(2), "pos_name": pos_name,
+            }))
+            dfh = pd.DataFrame({"dt": dts, "pos": rng.choice([-1, 0, 1], len(dts)),
+                                "price": 100 * np.exp(np.cumsum(rng.normal(0, 0.01, len(dts))))})
+            dfh["n1b"] = ((dfh["price"].shift(-1) / dfh["price"] - 1) * 10000).fillna(0)
+            dfh["symbol"] = symbol
+            dfh["pos_name"] = pos_name
+            holds.append(dfh)
+        os.makedirs(os.path.join(path, symbol), exist_ok=True)
+        pd.concat(pairs, ignore_index=True).to_parquet(os.path.join(path, symbol, "pairs.parquet"))
+        pd.concat(holds, ignore_index=True).to_parquet(os.path.join(path, symbol, "holds.parquet"))
+
+
+def test_positions_stats():
+    path = os.path.join(home_path, "test_positions_stats")
+    write_results(path)
+
+    all_stats = positions_stats(path, ["C", "A", "B", "X"])
+    assert [x["pos_name"] for x in all_stats] == ["C", "A", "B"]
+
+    # 与逐个策略读取后 groupby('dt').apply 计算的结果一致
+    pairs = read_optim_results(path, "pairs")
+    holds = read_optim_results(path, "holds")
+    for stats in all_stats:
+        pos_name = stats["pos_name"]
+        dfp = pairs[pairs["pos_name"] == pos_name].drop(columns=["pos_name"])
+        dfh = holds[holds["pos_name"] == pos_name]
+        expected = dict(czsc.PairsPerformance(dfp).basic_info)
+        cross = dfh.groupby("dt").apply(lambda x: (x["n1b"] * x["pos"]).sum() / (sum(x["pos"] != 0) + 1)).sum()
+        cross1 = dfh.groupby("dt").apply(lambda x: (x["n1b"] * x["pos"]).mean()).sum()
+        assert {k: stats[k] for k in expected} == expected
+        assert np.isclose(stats["截面等权收益"], cross) and np.isclose(stats["截面品种等权"], cross1)
+        assert one_position_stats(path, pos_name) == stats
+
+    assert one_position_stats(path, "X") is None
+    shutil.rmtree(path)
+
+
+def test_one_symbol_optim_shared_signals():
+    from test.test_analyze import read_1min
+    from czsc.objects import Position, Event, Operate, Factor, Signal
+    from czsc.utils.bar_generator import resample_bars, Freq
+    from czsc.traders.optimize import one_symbol_optim, CzscOpenOptimStrategy
+
+    path = os.path.join(home_path, "test_one_symbol_optim")
+    shutil.rmtree(path, ignore_errors=True)
+    bars = resample_bars(pd.DataFrame(read_1min()), Freq.F15)
+
+    def read_bars(symbol, freq, sdt, edt, fq="后复权", raw_bar=True):
+        assert symbol != "ERROR", "读取K线失败"
+        return [x for x in bars if pd.to_datetime(sdt) <= x.dt <= pd.to_datetime(edt)]
+
+    beta = Position(name="15分钟停顿", symbol="000001.SH", exits=[], interval=0, timeout=20, stop_loss=100, T0=True, opens=[
+        Event(name="开多", operate=Operate.LO, factors=[
+            Factor(name="停顿", signals_all=[Signal("15分钟_D0停顿分型_BE辅助V230106_看多_强_任意_0")])])])
+
+    class BetaStrategy(CzscOpenOptimStrategy):
+        @property
+        def positions(self):
+            return [beta]
+
+    BetaStrategy(symbol="beta", files_position=[]).save_positions(os.path.join(path, "beta"))
+
+    kwargs = dict(files_position=[os.path.join(path, "beta", "15分钟停顿.json")], bar_sdt="20150101",
+                  sdt="20170101", bar_edt="20180101", candidate_signals=["15分钟_D1T10_状态_阳线_任意_任意_0",
+                                                                        "15分钟_D1T10_状态_阴线_任意_任意_0"])
+    poss_path = os.path.join(path, "poss")
+    one_symbol_optim("000001.SH", read_bars, poss_path, optim_type="open", **kwargs)
+    assert len(os.listdir(os.path.join(poss_path, ".signals"))) == 1
+
+    # 全部结果写入成功后才创建标的文件夹，优化失败的标的不会留下文件夹，重新运行时不会被跳过
+    one_symbol_optim("ERROR", read_bars, poss_path, optim_type="open", **kwargs)
+    assert sorted(os.listdir(poss_path)) == [".signals", ".tmp", "000001.SH"] and not os.listdir(os.path.join(poss_path, ".tmp"))
+    assert sorted(os.listdir(os.path.join(poss_path, "000001.SH"))) == ["holds.parquet", "pairs.parquet"]
+
+    # 共享信号表按列评估的结果与逐K线回测一致
+    strategy = CzscOpenOptimStrategy(symbol="000001.SH", **kwargs)
+    trader = strategy.backtest(read_bars("000001.SH", "15分钟", "20150101", "20180101"), sdt="20170101")
+    pairs = read_optim_results(poss_path, "pairs")
+    holds = read_optim_results(poss_path, "holds")
+    assert len(trader.positions) == 3 and pairs["pos_name"].nunique() == len([x for x in trader.positions if x.pairs])
+    for pos in trader.positions:
+        if pos.pairs:
+            dfp = pairs[pairs["pos_name"] == pos.name].drop(columns=["pos_name"]).reset_index(drop=True)
+            pd.testing.assert_frame_equal(dfp, pd.DataFrame(pos.pairs))
+        assert holds[holds["pos_name"] == pos.name]["pos"].tolist() == [x["pos"] for x in pos.holds]
+
+    # 其他进程在本次优化期间写入了该标的的结果时，丢弃本次结果，不抛出异常
+    other_path = os.path.join(path, "other")
+
+    def read_bars_other(symbol, freq, sdt, edt, fq="后复权", raw_bar=True):
+        os.makedirs(os.path.join(other_path, symbol), exist_ok=True)
+        pd.DataFrame({"x": [1]}).to_parquet(os.path.join(other_path, symbol, "pairs.parquet"))
+        return read_bars(symbol, freq, sdt, edt, fq, raw_bar)
+
+    one_symbol_optim("000001.SH", read_bars_other, other_path, optim_type="open", **kwargs)
+    assert os.listdir(os.path.join(other_path, "000001.SH")) == ["pairs.parquet"]
+    assert not os.listdir(os.path.join(other_path, ".tmp"))
+
+    # 再次优化时直接读取信号表缓存；信号函数的代码或者 czsc 版本变化时重新计算
+    shutil.rmtree(os.path.join(poss_path, "000001.SH"))
+    one_symbol_optim("000001.SH", read_bars, poss_path, optim_type="open", **kwargs)
+    pd.testing.assert_frame_equal(read_optim_results(poss_path, "pairs"), pairs)
+    assert len(os.listdir(os.path.join(poss_path, ".signals"))) == 1
+
+    from czsc.utils.cache import DiskCache
+    from czsc.traders.optimize import symbol_signals
+    cache = DiskCache(os.path.join(poss_path, ".signals"))
+    symbol_signals(strategy, read_bars("000001.SH", "15分钟", "20150101", "20180101"), sdt="20170101", cache=cache)
+    assert len(os.listdir(os.path.join(poss_path, ".signals"))) == 1
+    version = czsc.__version__
+    try:
+        czsc.__version__ = version + ".dev"
+        symbol_signals(strategy, read_bars("000001.SH", "15分钟", "20150101", "20180101"), sdt="20170101", cache=cache)
+    finally:
+        czsc.__version__ = version
+    assert len(os.listdir(os.path.join(poss_path, ".signals"))) == 2
+    shutil.rmtree(path)
@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+"""
+describe: 测试传感器
+"""
+import os
+import shutil
+import pandas as pd
+from copy import deepcopy
+from czsc.utils.cache import home_path
+
+
+def test_event_match_sensor():
+    from test.test_analyze import read_1min
+    from czsc.objects import Event, Operate, Factor, Signal
+    from czsc.sensors.event import EventMatchSensor
+    from czsc.traders.base import generate_czsc_signals
+    from czsc.utils.bar_generator import resample_bars, Freq
+
+    bars = resample_bars(pd.DataFrame(read_1min()), Freq.F15)
+
+    def read_bars(symbol, freq, sdt, edt, **kwargs):
+        return [x for x in bars if pd.to_datetime(sdt) <= x.dt <= pd.to_datetime(edt)]
+
+    events = [
+        Event(name="停顿阳线", operate=Operate.LO, factors=[
+            Factor(name="阳线", signals_all=[Signal("15分钟_D1T10_状态_阳线_任意_任意_0")]),
+            Factor(name="停顿", signals_all=[Signal("15分钟_D0停顿分型_BE辅助V230106_看多_任意_任意_0")],
+                   signals_not=[Signal("15分钟_D1T10_状态_阴线_任意_任意_0")]),
+        ]),
+        Event(name="阴线", operate=Operate.SO, signals_not=[Signal("15分钟_D0停顿分型_BE辅助V230106_看空_强_任意_0")],
+              factors=[Factor(name="阴线", signals_all=[Signal("15分钟_D1T10_状态_阴线_任意_任意_0")])]),
+    ]
+    path = os.path.join(home_path, "test_event_match_sensor")
+    ems = EventMatchSensor(events=[e.dump() for e in events], symbols=["000001.SH"], read_bars=read_bars,
+                           results_path=path, refresh=True, bar_sdt="20170101", sdt="20170601", edt="20180101")
+
+    # 按列批量匹配的结果与逐行调用 Event.is_match 一致
+    sigs = generate_czsc_signals(read_bars("000001.SH", "15分钟", "20170101", "20180101"),
+                                 deepcopy(ems.signals_config), sdt="20170601", df=True)
+    df = ems._single_symbol("000001.SH")
+    assert len(df) == len(sigs) > 0
+    assert df.columns.tolist()[:9] == ['symbol', 'dt', 'open', 'close', 'high', 'low', 'vol', 'amount', 'n1b']
+    for event in events:
+        expected = sigs.apply(event.is_match, axis=1, result_type="expand")
+        assert df[event.name].tolist() == expected[0].tolist()
+        assert df[f"{event.name}_F"].tolist() == expected[1].tolist()
+        assert 0 < df[event.name].sum() < len(df)
+        assert ems.data[event.name].tolist() == df[event.name].astype(int).tolist()
+
+    # 每个标的的结果单独写入分区文件；重新运行时跳过已完成的标的，截面匹配次数与合并全部数据后计算的一致
+    file = os.path.join(path, "data", "000001.SH.parquet")
+    mtime = os.path.getmtime(file)
+    ems2 = EventMatchSensor(events=[e.dump() for e in events], symbols=["000001.SH", "000002.SZ"], read_bars=read_bars,
+                            results_path=path, bar_sdt="20170101", sdt="20170601", edt="20180101")
+    assert os.path.getmtime(file) == mtime and len(ems2.files) == 2
+    dfd = ems2.data
+    assert len(dfd) == 2 * len(df)
+    for event in events:
+        expected = dfd[dfd[event.name] == 1].groupby("dt")[event.name].sum().reset_index()
+        pd.testing.assert_frame_equal(ems2.get_event_csc(event.name), expected, check_dtype=False)
+        assert ems2.get_event_csc(event.name)[event.name].tolist() == (2 * ems.get_event_csc(event.name)[event.name]).tolist()
+    shutil.rmtree(path)
+
+
+def test_cta_research_backtest():
+    from test.test_analyze import read_1min
+    from czsc.sensors.cta import CTAResearch
+    from czsc.strategies import CzscStrategyExample2
+    from czsc.utils.bar_generator import resample_bars, Freq
+
+    bars = resample_bars(pd.DataFrame(read_1min()), Freq.F15)
+
+    def read_bars(symbol, freq, sdt, edt, **kwargs):
+        assert symbol != "ERROR", "读取K线失败"
+        return [x for x in bars if pd.to_datetime(sdt) <= x.dt <= pd.to_datetime(edt)]
+
+    results_path = os.path.join(home_path, "test_cta_research")
+    shutil.rmtree(results_path, ignore_errors=True)
+    bot = CTAResearch(CzscStrategyExample2, read_bars, results_path=results_path)
+    symbols = ["000001.SH", "ERROR"]
+    bot.backtest(symbols, max_workers=1, bar_sdt="20170101", sdt="20170601", edt="20180101")
+
+    # 每个品种的结果写入分区文件，失败的品种不写入；绩效汇总直接从分区文件得到
+    path = [os.path.join(results_path, x) for x in os.listdir(results_path) if x.startswith("backtest_")][0]
+    assert os.listdir(os.path.join(path, "stats")) == ["000001.SH.pkl"]
+    trader = CzscStrategyExample2(symbol="000001.SH").backtest(read_bars("000001.SH", "15分钟", "20170101", "20180101"),
+                                                               sdt="20170601")
+    dfs = pd.read_excel(os.path.join(path, "CzscStrategyExample2回测绩效汇总.xlsx"))
+    assert dfs["策略标记"].tolist() == [pos.name for pos in trader.positions]
+    assert dfs["交易次数"].tolist() == [pos.evaluate()["交易次数"] for pos in trader.positions]
+    holds = pd.read_parquet(os.path.join(path, "holds", "000001.SH.parquet"))
+    for pos in trader.positions:
+        assert holds[holds["pos_name"] == pos.name]["pos"].tolist() == [x["pos"] for x in pos.holds]
+
+    # 重新运行时跳过已完成的品种
+    file = os.path.join(path, "stats", "000001.SH.pkl")
+    mtime = os.path.getmtime(file)
+    bot.backtest(symbols, max_workers=1, bar_sdt="20170101", sdt="20170601", edt="20180101")
+    assert os.path.getmtime(file) == mtime
+    shutil.rmtree(results_path)
+
+
+def test_fixed_number_selector():
+    import numpy as np
+    from czsc.sensors.feature import FixedNumberSelector
+
+    rng = np.random.default_rng(0)
+    dts = pd.date_range("2021-01-01", periods=60, freq="D")
+    dfs = pd.DataFrame([(dt, f"S{j:03d}") for j in range(80) for dt in dts], columns=["dt", "symbol"])
+    dfs = dfs.sample(frac=0.98, random_state=0).sort_values(["symbol", "dt"]).reset_index(drop=True)
+    n = len(dfs)
+    dfs["open"] = rng.integers(90, 110, n).astype(float)
+    dfs["close"] = rng.integers(90, 110, n).astype(float)
+    dfs["high"] = np.maximum(dfs["open"], dfs["close"]) + rng.integers(0, 3, n)
+    dfs["low"] = np.minimum(dfs["open"], dfs["close"]) - rng.integers(0, 3, n)
+    dfs["n1b"] = rng.normal(0, 100, n)
+    dfs["score"] = rng.normal(0, 1, n)
+    dfs.loc[rng.random(n) < 0.05, "score"] = np.nan
+
+    k, d, fee = 10, 3, 15
+    fns = FixedNumberSelector(dfs.copy(), k=k, d=d, is_stocks=True, operate_fee=fee)
+    dts = fns.dts
+    assert list(fns.holds) == dts and list(fns.operates) == dts
+
+    first = fns.holds[dts[0]]
+    score = dfs[dfs["dt"] == dts[0]]
+    score = score[~((score["close"] == score["high"]) & (score["high"] >= score["open"]))]
+    score = score[~((score["close"] == score["low"]) & (score["low"] <= score["open"]))]
+    assert first["symbol"].tolist() == score.sort_values("score", ascending=False, kind="stable").head(k)["symbol"].tolist()
+    assert fns.operates[dts[0]]["symbol"].tolist() == first["symbol"].tolist()
+
+    for i, dt in enumerate(dts[1:], 1):
+        last, dfh, ops = fns.holds[dts[i - 1]], fns.holds[dt], fns.operates[dt]
+        assert len(dfh) == k and dfh["dt"].unique().tolist() == [dt]
+        assert dfh["score"].fillna(-np.inf).is_monotonic_decreasing
+        sells = set(last["symbol"]) - set(dfh["symbol"])
+        buys = set(dfh["symbol"]) - set(last["symbol"])
+        assert len(sells) == len(buys) <= d + (~last["symbol"].isin(dfs.loc[dfs["dt"] == dt, "symbol"])).sum()
+
+        # 买入的品种扣除开仓费用，卖出的品种在上一期扣除平仓费用
+        if ops.empty:
+            assert not buys
+        else:
+            assert set(ops[ops["action"] == "buy"]["symbol"]) == buys
+            assert set(ops[ops["action"] == "sell"]["symbol"]) <= sells
+        edge = dfh["n1b"] - np.where(dfh["symbol"].isin(buys), fee, 0)
+        if i + 1 < len(dts):
+            edge -= np.where(~dfh["symbol"].isin(fns.holds[dts[i + 1]]["symbol"]), fee, 0)
+        assert np.allclose(dfh["edge"], edge)
@@ -32,6 +32,13 @@ def test_czsc_strategy_example2():
     trader3 = strategy.dummy(sigs, sleep_time=0.1)
     assert len(trader3.positions) == 2
 
+    # 使用信号 DataFrame 按列回测，结果与逐行回测一致
+    trader4 = strategy.dummy(pd.DataFrame(sigs))
+    for pos2, pos4 in zip(trader2.positions, trader4.positions):
+        assert pos2.operates == pos4.operates
+        assert pos2.holds == pos4.holds
+    assert trader2.end_dt == trader4.end_dt and trader2.get_ensemble_pos() == trader4.get_ensemble_pos()
+
     for i in [0, 1]:
         pos1 = trader1.positions[i]
         assert trader1.positions[i].evaluate()['日胜率'] == trader2.positions[i].evaluate()['日胜率']
@@ -37,3 +37,34 @@ def test_make_it_daily():
     # Check if the result DataFrame has daily data
     result = czsc.resample_to_daily(df, only_trade_date=False)
     assert (result['dt'].diff().dt.days <= 1).iloc[1:].all(), "Result should have daily data"
+
+
+def test_update_nxb():
+    dts = pd.date_range(start='2022-01-01', periods=50, freq='D')
+    df = pd.DataFrame([(dt, symbol) for symbol in ['A', 'B', 'C'] for dt in dts], columns=['dt', 'symbol'])
+    df['price'] = np.random.uniform(10, 20, len(df))
+
+    # 多品种、bp=True 时每个品种的收益都只放大一次
+    dfn = czsc.update_nxb(df.copy(), nseq=(1, 5), bp=True)
+    assert dfn['dt'].is_monotonic_increasing and dfn.columns.tolist() == ['dt', 'symbol', 'price', 'n1b', 'n5b']
+    for symbol, dfg in dfn.groupby('symbol'):
+        for n in (1, 5):
+            expected = ((dfg['price'].shift(-n) / dfg['price'] - 1) * 10000).fillna(0)
+            assert np.allclose(dfg[f'n{n}b'], expected)
+
+    czsc.update_tbars(dfn, event_col='price')
+    assert np.allclose(dfn['t5b'], dfn['n5b'] * dfn['price'])
+
+
+def test_resample_to_daily_rows():
+    dts = pd.date_range(start='2022-01-01', end='2022-02-28', freq='W')
+    df = pd.DataFrame([(dt, symbol) for dt in dts for symbol in ['A', 'B']], columns=['dt', 'symbol'])
+    df['value'] = np.random.random(len(df))
+
+    # 每个自然日复制最近一个周频日期的全部行
+    result = czsc.resample_to_daily(df, only_trade_date=False)
+    assert len(result) == 2 * len(pd.date_range(dts[0], dts[-1], freq='D'))
+    for dt, dfg in result.groupby('dt'):
+        last = df[df['dt'] == df['dt'][df['dt'] <= dt].max()]
+        assert dfg['symbol'].tolist() == last['symbol'].tolist()
+        assert dfg['value'].tolist() == last['value'].tolist()
@@ -329,3 +329,35 @@ def test_overlap():
 
     # 验证结果
     assert result["col_overlap"].tolist() == [1, 2, 1, 2, 1]
+
+
+def test_incremental_indicators():
+    """IndicatorStore 中的增量指标与全量计算的结果一致"""
+    from test.test_analyze import read_daily
+    from czsc.analyze import CZSC
+    from czsc.objects import RawBar
+    from czsc.utils.ta import MACD, IncrementalSMA, IncrementalMACD, IncrementalRSI, IncrementalKDJ
+
+    bars = read_daily()
+    c = CZSC(bars[:200])
+    keys = []
+    for bar in bars[200:800]:
+        part = RawBar(symbol=bar.symbol, id=bar.id, dt=bar.dt, freq=bar.freq, open=bar.open, close=bar.open,
+                      high=bar.high, low=bar.low, vol=bar.vol / 2, amount=bar.amount / 2)
+        for b in [part, bar]:
+            c.update(b)
+            keys = [c.indicators.ensure(x) for x in [IncrementalMACD(), IncrementalSMA(5), IncrementalRSI(6),
+                                                     IncrementalKDJ()]]
+
+    close = np.array([x.close for x in c.bars_raw])
+    dif, dea, macd = MACD(close)
+    assert np.array_equal([x.cache[keys[0]]['dif'] for x in c.bars_raw], dif)
+    assert np.array_equal([x.cache[keys[0]]['macd'] for x in c.bars_raw], macd)
+    assert np.allclose([x.cache[keys[1]] for x in c.bars_raw], pd.Series(close).rolling(5).mean(), equal_nan=True)
+
+    # 增量计算与一次性全量计算的结果完全一致
+    c2 = CZSC(bars[:800])
+    for key, x in zip(keys, [IncrementalMACD(), IncrementalSMA(5), IncrementalRSI(6), IncrementalKDJ()]):
+        c2.indicators.ensure(x)
+        field = x.fields[-1] if x.fields else None
+        np.testing.assert_array_equal(c2.indicators.column(key, field), c.indicators.column(key, field))
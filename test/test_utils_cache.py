@@ -82,3 +82,52 @@ def test_disk_cache():
     file_xlsx = [x for x in files if x.endswith("xlsx")][0]
     df = pd.read_excel(os.path.join(temp_path, f"run_func_y/{file_xlsx}"))
     assert isinstance(df, pd.DataFrame)
+
+
+def test_disk_cache_content_key():
+    import numpy as np
+    from czsc.utils.cache import hash_args
+
+    calls = []
+
+    @disk_cache(path=temp_path, suffix="pkl")
+    def run_sum(df):
+        calls.append(1)
+        return df["a"].sum()
+
+    # repr 相同但内容不同的 DataFrame 使用不同的缓存 key
+    df1 = pd.DataFrame({"a": np.arange(1000.0)})
+    df2 = df1.copy()
+    df2.loc[500, "a"] = -1
+    with pd.option_context("display.max_rows", 10):
+        assert repr(df1) == repr(df2) and hash_args(df1) != hash_args(df2)
+    assert hash_args(df1) == hash_args(df1.copy())
+    assert run_sum(df1) == df1["a"].sum() and run_sum(df2) == df2["a"].sum()
+    assert run_sum(df1.copy()) == df1["a"].sum() and len(calls) == 2
+    assert run_sum.cache.stats["hits"] == 1 and run_sum.cache.stats["misses"] == 2
+
+    # 缓存文件损坏时删除并重新计算
+    files = [x for x in os.listdir(run_sum.cache.path)]
+    assert len(files) == 2 and not any(x.startswith(".") for x in files)
+    for file in files:
+        with open(os.path.join(run_sum.cache.path, file), "wb") as f:
+            f.write(b"broken")
+    assert run_sum(df1) == df1["a"].sum() and len(calls) == 3 and run_sum.cache.stats["errors"] == 1
+
+
+def test_disk_cache_evict():
+    from czsc.utils.cache import DiskCache
+
+    dc = DiskCache(path=os.path.join(temp_path, "evict"))
+    for i in range(4):
+        dc.set(f"k{i}", "x" * 1000, suffix="txt")
+        os.utime(dc.path / f"k{i}.txt", (i, i))
+
+    # 按最近访问时间淘汰，最近读取过的缓存文件会被保留
+    assert dc.get("k0", suffix="txt") == "x" * 1000
+    dc.max_bytes = 3000
+    dc.set("k4", "x" * 1000, suffix="txt")
+    assert sorted(os.listdir(dc.path)) == ["k0.txt", "k3.txt", "k4.txt"]
+    dc.evict(max_bytes=2000)
+    assert sorted(os.listdir(dc.path)) == ["k0.txt", "k4.txt"]
+    assert dc.nbytes == 2000 and dc.stats["evictions"] == 3 and dc.stats["bytes_written"] == 5000
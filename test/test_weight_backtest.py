@@ -0,0 +1,195 @@
+# -*- coding: utf-8 -*-
+"""
+author: zengbin93
+email: zeng_bin8888@163.com
+create_dt: 2024/10/18 10:20
+describe: 测试持仓权重回测
+"""
+import os
+import shutil
+import pickle
+import numpy as np
+import pandas as pd
+from czsc.utils.cache import home_path
+from czsc.traders.weight_backtest import WeightBacktest, iter_symbol_weights
+
+
+def get_dfw(n=1200, symbols=("SFIC9001", "DLi9001", "ZZSF9001", "SEag9001"), seed=0):
+    """构造多个品种交错排列的持仓权重数据"""
+    rng = np.random.default_rng(seed)
+    dts = pd.date_range("2021-01-04 09:30", periods=n, freq="30min")
+    rows = []
+    for symbol in symbols:
+        weight = np.clip(np.cumsum(rng.choice([-0.3, 0, 0, 0, 0.3], n)), -1, 1) * rng.random()
+        price = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, n)))
+        rows.append(pd.DataFrame({"dt": dts, "symbol": symbol, "weight": weight, "price": price}))
+    return pd.concat(rows).sort_values(["dt", "symbol"]).reset_index(drop=True)
+
+
+def test_weight_backtest_daily():
+    dfw = get_dfw()
+    wb = WeightBacktest(dfw, digits=2, fee_rate=0.0002, n_jobs=1)
+    assert wb.symbols == dfw["symbol"].unique().tolist()
+
+    # 与逐品种筛选计算的结果对比
+    rows = []
+    for symbol in sorted(wb.symbols):
+        dfs = dfw[dfw["symbol"] == symbol].copy()
+        dfs["weight"] = dfs["weight"].round(2)
+        dfs["n1b"] = dfs["price"].shift(-1) / dfs["price"] - 1
+        dfs["edge"] = dfs["weight"] * dfs["n1b"]
+        dfs["turnover"] = abs(dfs["weight"].shift(1) - dfs["weight"])
+        dfs["cost"] = dfs["turnover"] * 0.0002
+        dfs["return"] = dfs["edge"] - dfs["cost"]
+        daily = dfs.groupby(dfs["dt"].dt.date)[["n1b", "edge", "return", "cost", "turnover"]].sum().reset_index()
+        daily["symbol"] = symbol
+        daily.rename(columns={"dt": "date"}, inplace=True)
+        rows.append(daily[["date", "symbol", "n1b", "edge", "return", "cost", "turnover"]])
+    expected = pd.concat(rows, ignore_index=True)
+    pd.testing.assert_frame_equal(wb.dailys, expected)
+    pd.testing.assert_frame_equal(wb.get_symbol_daily("DLi9001"), expected[expected["symbol"] == "DLi9001"])
+    pd.testing.assert_frame_equal(wb.results["DLi9001"]["daily"], wb.get_symbol_daily("DLi9001"))
+
+    # 多进程只传递单个品种的数据切片，结果与单进程一致
+    wb2 = WeightBacktest(dfw, digits=2, fee_rate=0.0002, n_jobs=2)
+    assert wb2.stats == wb.stats
+    for symbol in wb.symbols:
+        pd.testing.assert_frame_equal(wb2.results[symbol]["pairs"], wb.results[symbol]["pairs"])
+
+
+def test_weight_backtest_pairs():
+    dts = pd.date_range("2021-01-04", periods=7, freq="D")
+    dfw = pd.DataFrame(
+        {
+            "dt": dts,
+            "symbol": "X",
+            "weight": [0.2, 0.3, 0.1, -0.2, -0.2, 0, 0.1],
+            "price": [100, 101, 102, 100, 98, 99, 100.0],
+        }
+    )
+    wb = WeightBacktest(dfw, digits=1, fee_rate=0.0002, n_jobs=1)
+    dfp = wb.get_symbol_pairs("X")
+
+    # 后进先出、部分平仓：第3根K线平掉后开的1手与先开的1手，第4根K线平掉剩余1手并反手开空2手
+    assert dfp["交易方向"].tolist() == ["多头", "多头", "多头", "空头", "空头"]
+    assert dfp["开仓时间"].tolist() == [dts[1], dts[0], dts[0], dts[3], dts[3]]
+    assert dfp["平仓时间"].tolist() == [dts[2], dts[2], dts[3], dts[5], dts[5]]
+    assert dfp["持仓K线数"].tolist() == [2, 3, 4, 3, 3]
+    assert dfp["持仓天数"].tolist() == [1, 2, 3, 2, 2]
+    assert dfp["事件序列"].tolist() == ["开多 -> 平多"] * 3 + ["开空 -> 平空"] * 2
+    assert dfp["盈亏比例"].tolist() == [99.01, 200.0, 0.0, 100.0, 100.0]
+    assert dfp["标的代码"].unique().tolist() == ["X"]
+
+
+def test_weight_backtest_stream():
+    dfw = get_dfw()
+    wb = WeightBacktest(dfw, digits=2, fee_rate=0.0002, n_jobs=1)
+
+    path = os.path.join(home_path, "test_weight_backtest_stream")
+    os.makedirs(path, exist_ok=True)
+    dfw.to_parquet(os.path.join(path, "dfw.parquet"))
+    dfw.to_feather(os.path.join(path, "dfw.feather"))
+
+    sources = [
+        os.path.join(path, "dfw.parquet"),
+        os.path.join(path, "dfw.feather"),
+        (dfw[dfw["symbol"] == symbol] for symbol in dfw["symbol"].unique()),
+    ]
+    for source in sources:
+        ws = WeightBacktest.from_stream(source, digits=2, fee_rate=0.0002)
+        assert ws.stats == wb.stats
+        pd.testing.assert_frame_equal(ws.dailys, wb.dailys)
+        pd.testing.assert_frame_equal(ws.daily_return, wb.daily_return)
+        for symbol in wb.symbols:
+            pd.testing.assert_frame_equal(ws.results[symbol]["pairs"], wb.results[symbol]["pairs"])
+
+    # 一个品种的数据分散在多个行组中，单次扫描按品种拆分后的结果与原始数据一致
+    dfw.to_parquet(os.path.join(path, "dfw_rg.parquet"), row_group_size=500)
+    items = list(iter_symbol_weights(os.path.join(path, "dfw_rg.parquet")))
+    assert [x[0] for x in items] == sorted(wb.symbols)
+    for symbol, dfs in items:
+        expected = dfw[dfw["symbol"] == symbol][["dt", "symbol", "weight", "price"]].reset_index(drop=True)
+        pd.testing.assert_frame_equal(dfs, expected)
+
+    # 品种结果逐个写入文件，results 中不再保留 pairs
+    ws = WeightBacktest.from_stream(os.path.join(path, "dfw.parquet"), digits=2, res_path=path)
+    assert ws.stats == wb.stats and "pairs" not in ws.results["DLi9001"]
+    res = pd.read_pickle(os.path.join(path, "symbols", "DLi9001.pkl"))
+    pd.testing.assert_frame_equal(res["pairs"], wb.results["DLi9001"]["pairs"])
+
+    # get_symbol_pairs / process_symbol 从品种结果文件中读取 pairs
+    for symbol in wb.symbols:
+        pd.testing.assert_frame_equal(ws.get_symbol_pairs(symbol), wb.get_symbol_pairs(symbol))
+        pd.testing.assert_frame_equal(ws.process_symbol(symbol)[1]["pairs"], wb.results[symbol]["pairs"])
+    ws.report(os.path.join(path, "report"))
+    assert os.path.exists(os.path.join(path, "report", "stats.json"))
+    shutil.rmtree(path)
+
+
+def test_weight_backtest_append():
+    dfw = get_dfw()
+    dfn = get_dfw(n=400, symbols=("NEW",), seed=1)
+    dfn["dt"] = dfn["dt"] + pd.Timedelta(days=10)
+    dfw = pd.concat([dfw, dfn]).sort_values(["dt", "symbol"]).reset_index(drop=True)
+    wb = WeightBacktest(dfw, digits=2, fee_rate=0.0002, n_jobs=1)
+
+    # 分三段增量回测，切分点落在交易日中间；新品种在增量数据中首次出现
+    file = os.path.join(home_path, "test_weight_backtest_append.pkl")
+    dts = dfw["dt"].unique()
+    dt1, dt2 = dts[len(dts) // 3] + pd.Timedelta(minutes=1), dts[len(dts) * 2 // 3]
+    wi = WeightBacktest(dfw[dfw["dt"] < dt1], digits=2, fee_rate=0.0002, n_jobs=1)
+    assert "NEW" not in wi.symbols
+    for dfs in [dfw[(dfw["dt"] >= dt1) & (dfw["dt"] < dt2)], dfw[dfw["dt"] >= dt2]]:
+        wi.save(file)
+        wi = WeightBacktest.load(file)
+        assert wi.dfw is None
+        wi.append(dfs)
+
+    assert wi.stats == wb.stats
+    pd.testing.assert_frame_equal(wi.dailys, wb.dailys)
+    pd.testing.assert_frame_equal(wi.daily_return, wb.daily_return)
+    for symbol in wb.symbols:
+        pd.testing.assert_frame_equal(wi.results[symbol]["daily"], wb.results[symbol]["daily"])
+        pd.testing.assert_frame_equal(wi.get_symbol_pairs(symbol), wb.results[symbol]["pairs"])
+
+    # 新增数据的时间必须晚于已有数据
+    try:
+        wi.append(dfw.tail(5))
+        assert False, "append 旧数据应该报错"
+    except ValueError:
+        pass
+    os.remove(file)
+
+    # 保存时不包含 dfw，普通的 pickle 不受影响
+    assert pickle.loads(pickle.dumps(wb)).dfw.equals(wb.dfw)
+
+
+def test_weight_backtest_append_stream():
+    dfw = get_dfw()
+    dfn = get_dfw(n=400, symbols=("NEW",), seed=1)
+    dfn["dt"] = dfn["dt"] + pd.Timedelta(days=10)
+    dfw = pd.concat([dfw, dfn]).sort_values(["dt", "symbol"]).reset_index(drop=True)
+    wb = WeightBacktest(dfw, digits=2, fee_rate=0.0002, n_jobs=1)
+
+    # 流式回测的结果写入 res_path，增量回测新增的 pairs 追加写入新的文件，新品种同样只保存在文件中
+    path = os.path.join(home_path, "test_weight_backtest_append_stream")
+    dts = dfw["dt"].unique()
+    dt1 = dts[len(dts) // 3] + pd.Timedelta(minutes=1)
+    wi = WeightBacktest.from_stream([dfw[dfw["dt"] < dt1]], digits=2, fee_rate=0.0002, res_path=path)
+    assert "NEW" not in wi.symbols
+    wi.save(os.path.join(path, "wb.pkl"))
+    wi = WeightBacktest.load(os.path.join(path, "wb.pkl"))
+    wi.append(dfw[dfw["dt"] >= dt1])
+
+    assert wi.stats == wb.stats
+    pd.testing.assert_frame_equal(wi.dailys, wb.dailys)
+    pd.testing.assert_frame_equal(wi.daily_return, wb.daily_return)
+    for symbol in wb.symbols:
+        assert "pairs" not in wi.results[symbol]
+        pd.testing.assert_frame_equal(wi.results[symbol]["daily"], wb.results[symbol]["daily"])
+        pd.testing.assert_frame_equal(wi.get_symbol_pairs(symbol), wb.results[symbol]["pairs"])
+
+    # 已有品种的结果文件不会被重写，新增部分保存在 {symbol}.append1.pkl 中
+    files = sorted(os.listdir(os.path.join(path, "symbols")))
+    assert files == sorted([f"{s}.pkl" for s in wb.symbols] + [f"{s}.append1.pkl" for s in wb.symbols if s != "NEW"])
+    shutil.rmtree(path)